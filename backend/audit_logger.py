@@ -3,11 +3,13 @@ Audit Trail Logger
 Logs all critical operations for compliance and tracking
 """
 
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
 from models import AuditLog
+from audit_writer import audit_writer
 from datetime import datetime
 import json
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
 
 def log_action(
@@ -24,8 +26,12 @@ def log_action(
     """
     Log an action to the audit trail
     
+    The row is handed to audit_writer: it is buffered and written in a batch
+    over the audit connection (LOGIN / FAILED_LOGIN / DELETE are written
+    before returning). The caller's session is not used or committed.
+    
     Args:
-        db: Database session
+        db: Database session (unused; kept for existing callers)
         user_id: ID of the user performing the action
         username: Username of the user
         action: Action performed (CREATE, UPDATE, DELETE, VIEW, LOGIN, LOGOUT)
@@ -36,26 +42,20 @@ def log_action(
         ip_address: IP address of the user
     """
     try:
-        audit_log = AuditLog(
-            user_id=user_id,
-            username=username,
-            action=action,
-            module=module,
-            record_id=str(record_id),
-            record_type=record_type,
-            changes=json.dumps(changes) if changes else None,
-            ip_address=ip_address,
-            timestamp=datetime.utcnow()
-        )
-        
-        db.add(audit_log)
-        db.commit()
-        
-        return True
+        return audit_writer.write({
+            "user_id": user_id,
+            "username": username,
+            "action": action,
+            "module": module,
+            "record_id": str(record_id),
+            "record_type": record_type,
+            "changes": json.dumps(changes, default=str) if changes else None,
+            "ip_address": ip_address,
+            "timestamp": datetime.utcnow()
+        })
         
     except Exception as e:
         print(f"Error logging audit action: {str(e)}")
-        db.rollback()
         return False
 
 
@@ -149,8 +149,32 @@ def log_view(db: Session, user_id: int, username: str, module: str,
     )
 
 
+def parse_cursor(before: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """Parse a "<iso timestamp>,<id>" pagination cursor; raises ValueError if malformed"""
+    if not before:
+        return None
+    timestamp, _, log_id = before.rpartition(",")
+    return datetime.fromisoformat(timestamp), int(log_id)
+
+
+def make_cursor(log) -> str:
+    """Cursor pointing just past this log entry (pass back as before=...)"""
+    return f"{log.timestamp.isoformat()},{log.id}"
+
+
+def apply_cursor(query, cursor: Optional[Tuple[datetime, int]]):
+    """Keyset page: newest first, strictly older than the cursor"""
+    if cursor:
+        timestamp, log_id = cursor
+        query = query.filter(
+            AuditLog.timestamp <= timestamp,  # Plain bound so PostgreSQL prunes newer partitions
+            tuple_(AuditLog.timestamp, AuditLog.id) < tuple_(timestamp, log_id)
+        )
+    return query.order_by(AuditLog.timestamp.desc(), AuditLog.id.desc())
+
+
 def get_audit_logs(db: Session, module: str = None, user_id: int = None, 
-                   action: str = None, limit: int = 100):
+                   action: str = None, limit: int = 100, before: Optional[str] = None):
     """
     Retrieve audit logs with filters
     
@@ -160,11 +184,12 @@ def get_audit_logs(db: Session, module: str = None, user_id: int = None,
         user_id: Filter by user ID
         action: Filter by action type
         limit: Maximum number of logs to return
+        before: Cursor from make_cursor() of the last log of the previous page
     
     Returns:
-        List of audit log records
+        List of audit log records, newest first
     """
-    query = db.query(AuditLog).order_by(AuditLog.timestamp.desc())
+    query = db.query(AuditLog)
     
     if module:
         query = query.filter(AuditLog.module == module)
@@ -175,7 +200,7 @@ def get_audit_logs(db: Session, module: str = None, user_id: int = None,
     if action:
         query = query.filter(AuditLog.action == action)
     
-    return query.limit(limit).all()
+    return apply_cursor(query, parse_cursor(before)).limit(limit).all()
 
 
 def get_record_history(db: Session, module: str, record_id: str):
@@ -193,4 +218,4 @@ def get_record_history(db: Session, module: str, record_id: str):
     return db.query(AuditLog).filter(
         AuditLog.module == module,
         AuditLog.record_id == str(record_id)
-    ).order_by(AuditLog.timestamp.desc()).all()
+    ).order_by(AuditLog.timestamp.desc(), AuditLog.id.desc()).all()
@@ -0,0 +1,291 @@
+"""
+Audit Log Partitions
+Monthly range partitions for audit_logs on PostgreSQL, plus the archival job
+that moves old months out of the database into gzip files.
+
+- scripts/migrations/partition_audit_logs.py converts audit_logs into a table
+  PARTITION BY RANGE (timestamp) with one partition per month
+  (audit_logs_yYYYYmMM) and a default partition.
+- ensure_partitions() creates the next AUDIT_PARTITION_MONTHS_AHEAD months,
+  each in its own transaction. Rows already sitting in the default
+  partition for a new month's range (clock skew, backdated imports) would
+  make CREATE ... PARTITION OF fail, so they are moved into the new
+  partition, which is then attached.
+- archive_audit_logs() handles months older than AUDIT_RETENTION_MONTHS:
+  PostgreSQL COPYs the still-attached partition to
+  AUDIT_ARCHIVE_DIR/audit_logs_yYYYYmMM.csv.gz and, once the file is
+  fsynced, detaches and drops it in the same transaction; a failed export
+  leaves the partition attached. Rows of the default partition older than
+  the cutoff (including undated legacy rows parked at the epoch) go to
+  audit_logs_default_<run time>.csv.gz. Other databases (SQLite dev) export
+  each month's rows to the same monthly file and delete them.
+- Both run monthly from the scheduler (leader only), independently: a
+  failure in one does not skip the other.
+"""
+
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Iterator, List, Optional, Tuple
+import csv
+import gzip
+import logging
+import os
+import re
+
+from sqlalchemy import delete, func, select, text
+
+from database import engine
+from models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+AUDIT_PARTITION_MONTHS_AHEAD = int(os.getenv("AUDIT_PARTITION_MONTHS_AHEAD", "3"))
+AUDIT_RETENTION_MONTHS = int(os.getenv("AUDIT_RETENTION_MONTHS", "12"))
+AUDIT_ARCHIVE_DIR = os.getenv(
+    "AUDIT_ARCHIVE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive", "audit_logs")
+)
+ARCHIVE_CHUNK_SIZE = 5000
+
+AUDIT_COLUMNS = [column.name for column in AuditLog.__table__.columns]
+PARTITION_NAME = re.compile(r"^audit_logs_y(\d{4})m(\d{2})$")
+
+
+def month_start(day: date, offset: int = 0) -> date:
+    """First day of the month `offset` months after day's month"""
+    index = day.year * 12 + day.month - 1 + offset
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"audit_logs_y{month.year}m{month.month:02d}"
+
+
+def is_partitioned(conn) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return bool(conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = 'audit_logs'"
+    )).scalar())
+
+
+def create_partition_sql(month: date) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF audit_logs "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{month_start(month, 1).isoformat()}')"
+    )
+
+
+def _create_partition(conn, month: date) -> bool:
+    """Create one monthly partition, moving matching default-partition rows into it"""
+    name = partition_name(month)
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+        return False
+    bounds = {"start": month, "end": month_start(month, 1)}
+    in_range = "FROM audit_logs_default WHERE timestamp >= :start AND timestamp < :end"
+    stray = conn.execute(text(f"SELECT count(*) {in_range}"), bounds).scalar()
+    if not stray:
+        conn.execute(text(create_partition_sql(month)))
+        return True
+
+    # CREATE ... PARTITION OF fails while the default partition holds rows of the
+    # new range: build the month as a plain table, move the rows, then attach it
+    logger.warning(f"⚠️ Moving {stray} audit rows for {month:%Y-%m} out of audit_logs_default into {name}")
+    columns = ", ".join(AUDIT_COLUMNS)
+    conn.execute(text(f"CREATE TABLE {name} (LIKE audit_logs INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    conn.execute(text(f"INSERT INTO {name} ({columns}) SELECT {columns} {in_range}"), bounds)
+    conn.execute(text(f"DELETE {in_range}"), bounds)
+    conn.execute(text(
+        f"ALTER TABLE audit_logs ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{month_start(month, 1).isoformat()}')"
+    ))
+    return True
+
+
+def ensure_partitions(months_ahead: int = AUDIT_PARTITION_MONTHS_AHEAD) -> List[str]:
+    """Create partitions for the current month and the next months_ahead months"""
+    created = []
+    with engine.connect() as conn:
+        if not is_partitioned(conn):
+            return created
+    this_month = month_start(datetime.utcnow().date())
+    for offset in range(months_ahead + 1):
+        month = month_start(this_month, offset)
+        # One transaction per month, so a failing month does not undo the others
+        try:
+            with engine.begin() as conn:
+                if _create_partition(conn, month):
+                    created.append(partition_name(month))
+        except Exception as e:
+            logger.error(
+                f"❌ Could not create audit partition {partition_name(month)}: {e}. "
+                f"Move audit_logs_default rows from {month:%Y-%m} into it by hand and re-run."
+            )
+    return created
+
+
+def _monthly_partitions(conn) -> List[Tuple[date, str]]:
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'audit_logs'"
+    )).scalars().all()
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions.append((date(int(match.group(1)), int(match.group(2)), 1), name))
+    return sorted(partitions)
+
+
+def _archive_path(month: date) -> str:
+    os.makedirs(AUDIT_ARCHIVE_DIR, exist_ok=True)
+    return os.path.join(AUDIT_ARCHIVE_DIR, f"{partition_name(month)}.csv.gz")
+
+
+@contextmanager
+def _archive_file(path: str):
+    """gzip text stream that only appears at path once fully written and fsynced"""
+    partial = f"{path}.partial"
+    try:
+        with open(partial, "wb") as raw_file:
+            with gzip.open(raw_file, "wt", newline="") as archive:
+                yield archive
+            raw_file.flush()
+            os.fsync(raw_file.fileno())
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+def _archive_partition(month: date, name: str) -> str:
+    """COPY one partition to a gzip CSV, then detach and drop it in the same transaction"""
+    path = _archive_path(month)
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        # Block writes so everything that gets dropped is in the archive
+        cursor.execute(f"LOCK TABLE {name} IN SHARE MODE")
+        with _archive_file(path) as archive:
+            cursor.copy_expert(f"COPY {name} ({', '.join(AUDIT_COLUMNS)}) TO STDOUT WITH CSV HEADER", archive)
+        cursor.execute(f"ALTER TABLE audit_logs DETACH PARTITION {name}")
+        cursor.execute(f"DROP TABLE {name}")
+        cursor.close()
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+    return path
+
+
+def _archive_default_partition(cutoff: date) -> Optional[Tuple[str, int]]:
+    """COPY default-partition rows older than cutoff to a gzip CSV, then delete them"""
+    where = f"FROM audit_logs_default WHERE timestamp < '{cutoff.isoformat()}'"
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.execute("LOCK TABLE audit_logs_default IN SHARE MODE")
+        cursor.execute(f"SELECT count(*) {where}")
+        count = cursor.fetchone()[0]
+        if not count:
+            raw.rollback()
+            return None
+        os.makedirs(AUDIT_ARCHIVE_DIR, exist_ok=True)
+        path = os.path.join(AUDIT_ARCHIVE_DIR, f"audit_logs_default_{datetime.utcnow():%Y%m%d%H%M%S}.csv.gz")
+        with _archive_file(path) as archive:
+            cursor.copy_expert(
+                f"COPY (SELECT {', '.join(AUDIT_COLUMNS)} {where} ORDER BY timestamp, id) TO STDOUT WITH CSV HEADER",
+                archive
+            )
+        cursor.execute(f"DELETE {where}")
+        cursor.close()
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+    return path, count
+
+
+def _rows_before(conn, start: datetime, end: datetime) -> Iterator[tuple]:
+    result = conn.execution_options(yield_per=ARCHIVE_CHUNK_SIZE).execute(
+        select(*AuditLog.__table__.columns)
+        .where(AuditLog.timestamp >= start, AuditLog.timestamp < end)
+        .order_by(AuditLog.timestamp, AuditLog.id)
+    )
+    for row in result:
+        yield tuple(row)
+
+
+def _archive_month_rows(month: date) -> Tuple[str, int]:
+    """Unpartitioned fallback: export one month to a gzip CSV, then delete it"""
+    start = datetime.combine(month, datetime.min.time())
+    end = datetime.combine(month_start(month, 1), datetime.min.time())
+    path = _archive_path(month)
+    count = 0
+    with engine.begin() as conn:
+        with _archive_file(path) as archive:
+            writer = csv.writer(archive)
+            writer.writerow(AUDIT_COLUMNS)
+            for row in _rows_before(conn, start, end):
+                writer.writerow(row)
+                count += 1
+        conn.execute(delete(AuditLog).where(AuditLog.timestamp >= start, AuditLog.timestamp < end))
+    return path, count
+
+
+def archive_audit_logs(retention_months: int = AUDIT_RETENTION_MONTHS) -> List[str]:
+    """Move months older than retention_months out of audit_logs; returns archive paths"""
+    cutoff = month_start(datetime.utcnow().date(), -retention_months)
+    archived = []
+    with engine.connect() as conn:
+        partitioned = is_partitioned(conn)
+        if partitioned:
+            old = [(month, name) for month, name in _monthly_partitions(conn) if month < cutoff]
+        else:
+            oldest = conn.execute(select(func.min(AuditLog.timestamp))).scalar()
+            old = []
+            if oldest is not None:
+                month = month_start(oldest.date())
+                while month < cutoff:
+                    old.append((month, None))
+                    month = month_start(month, 1)
+
+    for month, name in old:
+        if partitioned:
+            path = _archive_partition(month, name)
+            logger.info(f"📦 Archived partition {name} to {path}")
+        else:
+            path, count = _archive_month_rows(month)
+            if not count:
+                os.remove(path)
+                continue
+            logger.info(f"📦 Archived {count} audit rows for {month:%Y-%m} to {path}")
+        archived.append(path)
+
+    if partitioned:
+        result = _archive_default_partition(cutoff)
+        if result:
+            path, count = result
+            logger.info(f"📦 Archived {count} audit rows from audit_logs_default to {path}")
+            archived.append(path)
+    return archived
+
+
+def run_audit_maintenance():
+    """Scheduler job: create upcoming partitions, archive expired months"""
+    created, archived = [], []
+    try:
+        created = ensure_partitions()
+    except Exception as e:
+        logger.error(f"❌ Error creating audit partitions: {str(e)}")
+    try:
+        archived = archive_audit_logs()
+    except Exception as e:
+        logger.error(f"❌ Error archiving audit logs: {str(e)}")
+    logger.info(f"✅ Audit maintenance: {len(created)} partitions created, {len(archived)} archives written")
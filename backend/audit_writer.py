@@ -0,0 +1,228 @@
+"""
+Buffered Audit Writer
+Takes audit rows off the request path: audit_logger.log_action enqueues them
+into a bounded ring buffer and a background thread writes them in batches.
+
+- Batches flush when AUDIT_BATCH_SIZE rows are waiting or every
+  AUDIT_FLUSH_INTERVAL seconds, as one multi-row INSERT over the dedicated
+  audit_engine connection (never the caller's session/transaction).
+- AUDIT_DURABLE_ACTIONS (LOGIN, FAILED_LOGIN, DELETE by default) are written
+  synchronously before log_action returns.
+- When the buffer is full the oldest pending row is dropped and counted;
+  stats() reports drops, pending rows and flush lag.
+- A batch that fails on a lost/unavailable connection is put back and
+  retried with backoff. A batch the database rejects (IntegrityError /
+  DataError, or any other error AUDIT_MAX_BATCH_RETRIES times in a row) is
+  retried one row at a time; rows that still fail are logged with their
+  content and dropped (counted as rejected), so one bad row cannot block
+  the buffer.
+- close() (app shutdown) drains the buffer.
+"""
+
+from collections import deque
+from datetime import datetime
+from threading import Condition, Thread
+from typing import List, Optional
+import logging
+import os
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, DBAPIError, DisconnectionError, IntegrityError, InterfaceError, OperationalError
+
+from database import audit_engine
+from models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+AUDIT_BUFFER_SIZE = int(os.getenv("AUDIT_BUFFER_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1.0"))  # seconds
+AUDIT_MAX_BATCH_RETRIES = int(os.getenv("AUDIT_MAX_BATCH_RETRIES", "3"))  # then split the batch
+AUDIT_DURABLE_ACTIONS = frozenset(
+    action.strip() for action in os.getenv("AUDIT_DURABLE_ACTIONS", "LOGIN,FAILED_LOGIN,DELETE").split(",") if action.strip()
+)
+
+
+class AuditWriter:
+    """Ring buffer of pending audit rows drained by one daemon thread"""
+
+    def __init__(self, engine=audit_engine, capacity: int = AUDIT_BUFFER_SIZE,
+                 batch_size: int = AUDIT_BATCH_SIZE, flush_interval: float = AUDIT_FLUSH_INTERVAL):
+        self._engine = engine
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # (enqueued_at monotonic, row)
+        self._buffer = deque(maxlen=capacity)
+        self._cond = Condition()
+        self._thread: Optional[Thread] = None
+        self._closed = False
+        self.enqueued = 0
+        self.written = 0
+        self.durable_writes = 0
+        self.dropped = 0
+        self.failed_batches = 0
+        self.rejected = 0
+        self.flushes = 0
+        self._batch_failures = 0  # Consecutive non-connection failures of the batch at the front
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+
+    # ---- writing ----------------------------------------------------------
+
+    def _insert(self, rows: List[dict]):
+        with self._engine.begin() as conn:
+            conn.execute(insert(AuditLog).values(rows))
+
+    def write(self, row: dict) -> bool:
+        """Queue a row (or write it now for durable actions); never touches the caller's session"""
+        row.setdefault("timestamp", datetime.utcnow())
+        if row.get("action") in AUDIT_DURABLE_ACTIONS or self._closed:
+            try:
+                self._insert([row])
+                self.durable_writes += 1
+                return True
+            except Exception as e:
+                logger.error(f"❌ Durable audit write failed: {e}")
+                return False
+
+        with self._cond:
+            if len(self._buffer) == self.capacity:
+                self.dropped += 1  # deque(maxlen) evicts the oldest row
+            self._buffer.append((time.monotonic(), row))
+            self.enqueued += 1
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+        self._ensure_started()
+        return True
+
+    def _take_batch(self) -> list:
+        batch = []
+        while self._buffer and len(batch) < self.batch_size:
+            batch.append(self._buffer.popleft())
+        return batch
+
+    @staticmethod
+    def _connection_error(error: Exception) -> bool:
+        if isinstance(error, (OperationalError, InterfaceError, DisconnectionError)):
+            return True
+        return isinstance(error, DBAPIError) and error.connection_invalidated
+
+    def _requeue(self, batch: list):
+        with self._cond:
+            # Put the rows back in order; anything beyond capacity is dropped
+            room = self.capacity - len(self._buffer)
+            requeue = batch[-room:] if room > 0 else []
+            self.dropped += len(batch) - len(requeue)
+            self._buffer.extendleft(reversed(requeue))
+
+    def _record_flush(self, batch: list):
+        now = time.monotonic()
+        self.written += len(batch)
+        self.flushes += 1
+        self.last_lag_ms = (now - batch[0][0]) * 1000
+        self.max_lag_ms = max(self.max_lag_ms, self.last_lag_ms)
+
+    def _flush_batch(self, batch: list):
+        try:
+            self._insert([row for _, row in batch])
+        except Exception as e:
+            self.failed_batches += 1
+            if self._connection_error(e):
+                logger.error(f"❌ Audit batch of {len(batch)} failed, will retry: {e}")
+                self._requeue(batch)
+                return False
+            self._batch_failures += 1
+            if not isinstance(e, (IntegrityError, DataError)) and self._batch_failures < AUDIT_MAX_BATCH_RETRIES:
+                logger.error(f"❌ Audit batch of {len(batch)} failed ({self._batch_failures}/{AUDIT_MAX_BATCH_RETRIES}): {e}")
+                self._requeue(batch)
+                return False
+            logger.warning(f"⚠️ Audit batch of {len(batch)} rejected, writing it row by row: {e}")
+            return self._flush_rows(batch)
+        self._batch_failures = 0
+        self._record_flush(batch)
+        return True
+
+    def _flush_rows(self, batch: list):
+        """Insert one row at a time, dropping the rows the database rejects"""
+        written = []
+        for position, (enqueued_at, row) in enumerate(batch):
+            try:
+                self._insert([row])
+            except Exception as e:
+                if self._connection_error(e):
+                    logger.error(f"❌ Audit row write failed, will retry: {e}")
+                    if written:
+                        self._record_flush(written)
+                    self._requeue(batch[position:])
+                    return False
+                self.rejected += 1
+                logger.error(f"❌ Audit row rejected and dropped: {e}; row={row}")
+                continue
+            written.append((enqueued_at, row))
+        self._batch_failures = 0
+        if written:
+            self._record_flush(written)
+        return True
+
+    def flush(self):
+        """Write everything pending now (used by close() and tests/scripts)"""
+        while True:
+            with self._cond:
+                batch = self._take_batch()
+            if not batch or not self._flush_batch(batch):
+                return
+
+    # ---- background thread ------------------------------------------------
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._buffer) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                if self._closed:
+                    return
+                batch = self._take_batch()
+            if batch and not self._flush_batch(batch):
+                time.sleep(self.flush_interval)  # Back off while the database is unavailable
+
+    def _ensure_started(self):
+        if self._thread is None and not self._closed:
+            with self._cond:
+                if self._thread is None:
+                    self._thread = Thread(target=self._run, name="audit-writer", daemon=True)
+                    self._thread.start()
+
+    def close(self):
+        """Stop the thread and drain the buffer; later writes go straight to the database"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._cond:
+            pending = len(self._buffer)
+            oldest = self._buffer[0][0] if self._buffer else None
+        return {
+            "pending": pending,
+            "capacity": self.capacity,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "durable_writes": self.durable_writes,
+            "dropped": self.dropped,
+            "failed_batches": self.failed_batches,
+            "rejected": self.rejected,
+            "flushes": self.flushes,
+            "oldest_pending_ms": round((time.monotonic() - oldest) * 1000, 3) if oldest else 0.0,
+            "last_lag_ms": round(self.last_lag_ms, 3),
+            "max_lag_ms": round(self.max_lag_ms, 3),
+            "durable_actions": sorted(AUDIT_DURABLE_ACTIONS),
+        }
+
+
+audit_writer = AuditWriter()
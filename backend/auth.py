@@ -4,11 +4,15 @@ from typing import Optional
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import models
 import schemas
-from database import get_db
-import bcrypt
+from database import get_db, get_async_db
+from principal_cache import principal_cache
+from rbac import ADMIN_PERMISSIONS, authorize, rbac
+from password_hashing import BCRYPT_ROUNDS, hashing_pool, needs_rehash, PasswordPoolBusy
 
 # Security configuration
 SECRET_KEY = "yamini_infotech_secret_key_2025"  # In production, use environment variable
@@ -19,38 +23,34 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24 hours
 pwd_context = CryptContext(
     schemes=["bcrypt"],
     deprecated="auto",
-    bcrypt__rounds=12,
+    bcrypt__rounds=BCRYPT_ROUNDS,
     bcrypt__ident="2b"
 )
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="api/auth/login", auto_error=False)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify using bcrypt directly to avoid passlib backend detection issues on some platforms."""
-    if isinstance(plain_password, str):
-        plain_pw_bytes = plain_password.encode('utf-8')
-    else:
-        plain_pw_bytes = plain_password
-
-    # Bcrypt has a 72-byte limit
-    if len(plain_pw_bytes) > 72:
-        plain_pw_bytes = plain_pw_bytes[:72]
-
+    """Verify using bcrypt directly (on the bounded hashing pool) to avoid passlib backend detection issues."""
     try:
-        return bcrypt.checkpw(plain_pw_bytes, hashed_password.encode('utf-8'))
+        return hashing_pool.checkpw(plain_password, hashed_password)
+    except PasswordPoolBusy:
+        raise
     except Exception as e:
         # Fall back to passlib if bcrypt direct fails (keep safe error log)
         print(f"ERROR: bcrypt.checkpw failed: {e}")
         return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    # Bcrypt has a 72-byte limit on passwords
-    pw_bytes = password.encode('utf-8')
-    if len(pw_bytes) > 72:
-        pw_bytes = pw_bytes[:72]
-    # Use bcrypt directly to avoid passlib backend issues
-    hashed = bcrypt.hashpw(pw_bytes, bcrypt.gensalt(rounds=12))
-    return hashed.decode('utf-8')
+    # Bcrypt has a 72-byte limit on passwords (truncated by the pool)
+    return hashing_pool.hashpw(password, BCRYPT_ROUNDS)
+
+def password_pool_busy(detail: str = "Password service busy, please retry") -> HTTPException:
+    """503 + Retry-After for PasswordPoolBusy, raised by routes that hash or verify passwords"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=detail,
+        headers={"Retry-After": "1"},
+    )
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -63,12 +63,34 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def decode_token_claims(token: str):
+    """Return (username, token_version) from a valid JWT, or None"""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    username = payload.get("sub")
+    if username is None:
+        return None
+    return username, int(payload.get("ver", 0))
+
+def _principal_matches(user: Optional[models.User], token_version: int) -> bool:
+    """Tokens issued before the user's token_version was bumped are revoked"""
+    return user is not None and (user.token_version or 0) == token_version
+
 def authenticate_user(db: Session, username: str, password: str):
     user = db.query(models.User).filter(models.User.username == username).first()
     if not user:
         return False
     if not verify_password(password, user.hashed_password):
         return False
+    if needs_rehash(user.hashed_password):
+        # BCRYPT_ROUNDS changed since this hash was made - upgrade it while we have the plain password
+        try:
+            user.hashed_password = get_password_hash(password)
+            db.commit()
+        except PasswordPoolBusy:
+            db.rollback()
     return user
 
 async def get_current_user(
@@ -81,18 +103,49 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
+    claims = decode_token_claims(token)
+    if claims is None:
         raise credentials_exception
+    username, token_version = claims
+    
+    # Common path: principal cached, no query
+    user = principal_cache.get_user(username, token_version)
+    if user is not None:
+        return user
     
     user = db.query(models.User).filter(models.User.username == username).first()
-    if user is None:
+    if not _principal_matches(user, token_version):
+        raise credentials_exception
+    
+    principal_cache.put_user(user, token_version)
+    return user
+
+async def get_current_user_async(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+) -> models.User:
+    """Same as get_current_user, for async routes running on AsyncSession"""
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    
+    claims = decode_token_claims(token)
+    if claims is None:
+        raise credentials_exception
+    username, token_version = claims
+    
+    user = principal_cache.get_user(username, token_version)
+    if user is not None:
+        return user
+    
+    result = await db.execute(select(models.User).where(models.User.username == username))
+    user = result.scalars().first()
+    if not _principal_matches(user, token_version):
         raise credentials_exception
     
+    principal_cache.put_user(user, token_version)
     return user
 
 async def get_current_user_optional(
@@ -102,16 +155,21 @@ async def get_current_user_optional(
     """Get current user if authenticated, None otherwise (for public endpoints)"""
     if not token:
         return None
-        
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            return None
-    except JWTError:
+    
+    claims = decode_token_claims(token)
+    if claims is None:
         return None
+    username, token_version = claims
+    
+    user = principal_cache.get_user(username, token_version)
+    if user is not None:
+        return user
     
     user = db.query(models.User).filter(models.User.username == username).first()
+    if not _principal_matches(user, token_version):
+        return None
+    
+    principal_cache.put_user(user, token_version)
     return user
 
 # 🔒 SALESPERSON DISCIPLINE ENFORCEMENT
@@ -132,21 +190,26 @@ async def require_attendance_today(
     from datetime import date, time
     today = date.today()
     
-    # Check if attendance exists for today
-    attendance = db.query(models.Attendance).filter(
-        models.Attendance.employee_id == current_user.id,
-        models.Attendance.date >= datetime.combine(today, datetime.min.time()),
-        models.Attendance.date < datetime.combine(today, datetime.max.time())
-    ).first()
-    
-    if not attendance:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="⏰ Attendance not marked – work access blocked. Please mark attendance first."
-        )
+    # Once marked, today's attendance cannot disappear - cache the positive result
+    attendance_id = principal_cache.get_attendance(current_user.id, today)
+    if attendance_id is None:
+        # Check if attendance exists for today
+        attendance = db.query(models.Attendance.id).filter(
+            models.Attendance.employee_id == current_user.id,
+            models.Attendance.date >= datetime.combine(today, datetime.min.time()),
+            models.Attendance.date < datetime.combine(today, datetime.max.time())
+        ).first()
+        
+        if not attendance:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="⏰ Attendance not marked – work access blocked. Please mark attendance first."
+            )
+        attendance_id = attendance.id
+        principal_cache.put_attendance(current_user.id, today, attendance_id)
     
     # Store attendance in current_user for access in routes
-    current_user.today_attendance = attendance
+    current_user.today_attendance_id = attendance_id
     
     return current_user
 
@@ -178,79 +241,13 @@ def block_salesman_actions(action_name: str):
         return current_user
     return dependency
 
-def check_permission(user: models.User, permission: str) -> bool:
+def check_permission(user: models.User, permission: str):
     """Check if user has specific permission - DEPRECATED, use check_resource_permission"""
-    
-    permissions = {
-        models.UserRole.ADMIN: {
-            "access_mif": True,
-            "view_all_customers": True,
-            "manage_employees": True,
-            "manage_reception": True,
-            "view_reports": True,
-            "manage_products": True,
-            "manage_services": True,
-            "view_financials": True,
-            "create_invoice": True,
-            "approve_orders": True,
-            "update_stock": True,
-        },
-        models.UserRole.RECEPTION: {
-            "access_mif": "READ_ONLY",  # VIEW ONLY per matrix
-            "view_all_customers": True,
-            "manage_employees": False,
-            "manage_reception": True,
-            "view_reports": True,  # Collection/monitoring only
-            "manage_products": False,
-            "manage_services": False,
-            "view_financials": "READ_ONLY",  # Summary only
-            "create_invoice": False,  # CANNOT create invoices
-            "approve_orders": False,  # CANNOT approve orders
-            "update_stock": False,  # CANNOT change stock
-        },
-        models.UserRole.SALESMAN: {
-            "access_mif": False,
-            "view_all_customers": False,
-            "manage_employees": False,
-            "manage_reception": False,
-            "view_reports": False,
-            "manage_products": False,
-            "manage_services": False,
-            "view_financials": False,
-            "create_invoice": False,
-            "approve_orders": False,
-            "update_stock": False,
-        },
-        models.UserRole.SERVICE_ENGINEER: {
-            "access_mif": False,
-            "view_all_customers": False,
-            "manage_employees": False,
-            "manage_reception": False,
-            "view_reports": False,
-            "manage_products": False,
-            "manage_services": False,
-            "view_financials": False,
-            "create_invoice": False,
-            "approve_orders": False,
-            "update_stock": False,
-        },
-        models.UserRole.CUSTOMER: {
-            "access_mif": False,
-            "view_all_customers": False,
-            "manage_employees": False,
-            "manage_reception": False,
-            "view_reports": False,
-            "manage_products": False,
-            "manage_services": False,
-            "view_financials": False,
-            "create_invoice": False,
-            "approve_orders": False,
-            "update_stock": False,
-        },
-    }
-    
-    role_permissions = permissions.get(user.role, {})
-    return role_permissions.get(permission, False)
+    if not authorize(user, 'capability', permission):
+        return False
+    if rbac.is_read_only(user, permission):
+        return "READ_ONLY"
+    return True
 
 def require_permission(permission: str):
     """Decorator to require specific permission"""
@@ -263,20 +260,20 @@ def require_permission(permission: str):
         return current_user
     return permission_checker
 
-def require_mif_access(current_user: models.User = Depends(get_current_user)):
-    """Require MIF access permission (Admin full, Reception read-only)"""
-    if current_user.role == models.UserRole.ADMIN:
-        return current_user  # Full access
-    elif current_user.role == models.UserRole.RECEPTION:
-        return current_user  # Read-only access (enforced at route level)
-    else:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="MIF access denied. Only Admin and Reception can access MIF data."
-        )
+def _require(resource: str, action: str, detail: str):
+    """Build a dependency that raises 403 with `detail` unless authorize() allows it"""
+    def permission_checker(current_user: models.User = Depends(get_current_user)):
+        if not authorize(current_user, resource, action):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=detail
+            )
+        return current_user
+    return permission_checker
 
 # ============================================================================
 # PHASE 3: ENHANCED RBAC - RESOURCE-ACTION PERMISSION MATRIX
+# Matrix lives in rbac.py (compiled once into per-role bitsets)
 # ============================================================================
 
 def check_resource_permission(user: models.User, resource: str, action: str) -> bool:
@@ -288,75 +285,13 @@ def check_resource_permission(user: models.User, resource: str, action: str) ->
     
     Returns True if user has permission, False otherwise
     """
-    
-    # Permission matrix aligned with MASTER ROLE MATRIX
-    PERMISSION_MATRIX = {
-        models.UserRole.ADMIN: {
-            'order': ['read', 'write', 'approve', 'delete'],
-            'product': ['read', 'write', 'delete'],
-            'enquiry': ['read', 'write', 'assign', 'delete'],
-            'mif': ['read', 'write', 'delete'],
-            'stock': ['read', 'write'],
-            'invoice': ['read', 'write'],
-            'report': ['read', 'write'],
-            'notification': ['read', 'write', 'send'],
-            'user': ['read', 'write', 'delete'],
-        },
-        models.UserRole.RECEPTION: {
-            'order': ['read'],  # View only, NO approve
-            'product': ['read'],  # View only, NO edit
-            'enquiry': ['read', 'write', 'assign'],  # Can create & assign
-            'mif': ['read'],  # VIEW ONLY per matrix
-            'stock': ['read'],  # View only, NO updates
-            'invoice': ['read'],  # View only, NO create
-            'report': ['read'],  # Collection/monitoring only
-            'notification': ['read', 'send'],
-            'user': ['read'],
-        },
-        models.UserRole.SALESMAN: {
-            'order': ['read', 'write'],  # Create only, NO approve
-            'product': ['read'],  # Public view only
-            'enquiry': ['read', 'write'],  # Only assigned enquiries
-            'mif': [],  # NO ACCESS
-            'stock': [],  # NO ACCESS to cost/profit
-            'invoice': [],  # NO ACCESS
-            'report': ['write'],  # Submit daily reports only
-            'notification': ['read'],
-            'user': [],
-        },
-        models.UserRole.SERVICE_ENGINEER: {
-            'order': [],
-            'product': ['read'],
-            'enquiry': [],
-            'mif': [],
-            'stock': [],
-            'invoice': [],
-            'report': ['write'],  # Service reports only
-            'notification': ['read'],
-            'user': [],
-        },
-        models.UserRole.CUSTOMER: {
-            'order': ['read'],  # Own orders only
-            'product': ['read'],  # Public catalog only
-            'enquiry': ['write'],  # Can create enquiries
-            'mif': [],
-            'stock': [],
-            'invoice': ['read'],  # Own invoices only
-            'report': [],
-            'notification': ['read'],
-            'user': [],
-        },
-    }
-    
-    role_permissions = PERMISSION_MATRIX.get(user.role, {})
-    resource_permissions = role_permissions.get(resource, [])
-    return action in resource_permissions
+    return authorize(user, resource, action)
 
 
 def require_resource_permission(resource: str, action: str):
     """Dependency to enforce resource-action permission"""
     def permission_checker(current_user: models.User = Depends(get_current_user)):
-        if not check_resource_permission(current_user, resource, action):
+        if not authorize(current_user, resource, action):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Permission denied: {action.upper()} access to {resource} not allowed for {current_user.role.value}"
@@ -366,44 +301,35 @@ def require_resource_permission(resource: str, action: str):
 
 
 # Specific permission checkers for common operations
-def require_order_approval(current_user: models.User = Depends(get_current_user)):
-    """Require order approval permission (Admin only per matrix)"""
-    if not check_resource_permission(current_user, 'order', 'approve'):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Order approval denied. Only Admin can approve orders."
-        )
-    return current_user
-
-
-def require_stock_write(current_user: models.User = Depends(get_current_user)):
-    """Require stock write permission (Admin only per matrix)"""
-    if not check_resource_permission(current_user, 'stock', 'write'):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Stock update denied. Only Admin can update stock."
-        )
-    return current_user
+require_mif_access = _require(
+    'mif', 'read',
+    "MIF access denied. Only Admin and Reception can access MIF data."
+)  # Admin full, Reception read-only (enforced at route level)
+
+require_mif_write = _require(
+    'mif', 'write',
+    "MIF write access denied. Only Admin can create or update MIF records."
+)
 
+require_order_approval = _require(
+    'order', 'approve',
+    "Order approval denied. Only Admin can approve or reject orders."
+)
 
-def require_product_write(current_user: models.User = Depends(get_current_user)):
-    """Require product write permission (Admin only per matrix)"""
-    if not check_resource_permission(current_user, 'product', 'write'):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Product modification denied. Only Admin can modify products."
-        )
-    return current_user
+require_stock_write = _require(
+    'stock', 'write',
+    "Stock update denied. Only Admin can modify stock quantities."
+)
 
+require_product_write = _require(
+    'product', 'write',
+    "Product management denied. Only Admin can create or update products."
+)
 
-def require_enquiry_write(current_user: models.User = Depends(get_current_user)):
-    """Require enquiry write permission (Admin + Reception per matrix)"""
-    if not check_resource_permission(current_user, 'enquiry', 'write'):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Enquiry modification denied. Only Admin and Reception can modify enquiries."
-        )
-    return current_user
+require_enquiry_write = _require(
+    'enquiry', 'manage',
+    "Enquiry management denied. Only Admin and Reception can manage enquiries."
+)
 
 
 def filter_enquiries_by_role(user: models.User, query):
@@ -419,55 +345,6 @@ def filter_enquiries_by_role(user: models.User, query):
         return query.filter(models.Enquiry.id == -1)
 
 
-def require_mif_write(current_user: models.User = Depends(get_current_user)):
-    """Require MIF write access (Admin only)"""
-    if current_user.role != models.UserRole.ADMIN:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="MIF write access denied. Only Admin can create or update MIF records."
-        )
-    return current_user
-
-# ============================================================================
-# PHASE 3: GRANULAR PERMISSION FUNCTIONS (Resource-Specific RBAC)
-# ============================================================================
-
-def require_order_approval(current_user: models.User = Depends(get_current_user)):
-    """Require order approval permission (Admin only)"""
-    if current_user.role != models.UserRole.ADMIN:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Order approval denied. Only Admin can approve or reject orders."
-        )
-    return current_user
-
-def require_stock_write(current_user: models.User = Depends(get_current_user)):
-    """Require stock update permission (Admin only)"""
-    if current_user.role != models.UserRole.ADMIN:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Stock update denied. Only Admin can modify stock quantities."
-        )
-    return current_user
-
-def require_product_write(current_user: models.User = Depends(get_current_user)):
-    """Require product write permission (Admin only)"""
-    if current_user.role != models.UserRole.ADMIN:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Product management denied. Only Admin can create or update products."
-        )
-    return current_user
-
-def require_enquiry_write(current_user: models.User = Depends(get_current_user)):
-    """Require enquiry write permission (Admin + Reception)"""
-    if current_user.role not in [models.UserRole.ADMIN, models.UserRole.RECEPTION]:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Enquiry management denied. Only Admin and Reception can manage enquiries."
-        )
-    return current_user
-
 def check_enquiry_access(current_user: models.User, enquiry, db: Session):
     """Check if user can access specific enquiry"""
     if current_user.role in [models.UserRole.ADMIN, models.UserRole.RECEPTION]:
@@ -481,33 +358,16 @@ def check_enquiry_access(current_user: models.User, enquiry, db: Session):
 # ADMIN PERMISSION SYSTEM (NEW)
 # ============================================
 
-# Define admin permissions per module
-ADMIN_PERMISSIONS = {
-    "employees": ["create", "edit", "disable", "activate", "reset_password", "mark_attendance"],
-    "products": ["create", "edit", "toggle", "disable"],
-    "stock": ["in", "out", "correct", "view"],
-    "enquiries": ["assign", "reassign", "change_priority"],
-    "orders": ["create", "edit", "approve", "reject", "status", "correct"],
-    "invoices": ["create", "edit", "export", "view"],
-    "outstanding": ["create", "update", "track"],
-    "service": ["assign", "reassign", "view_sla", "view_feedback"],
-    "mif": ["create", "edit"],
-    "attendance": ["view", "correct", "approve", "mark"],
-    "reports": ["view", "compare", "export"],
-    "audit": ["view", "filter"],
-    "settings": ["manage_roles", "configure"],
-}
-
 def admin_can(module: str, action: str) -> bool:
     """Check if action is allowed for admin in module"""
-    return action in ADMIN_PERMISSIONS.get(module, [])
+    return rbac.policy.allows(models.UserRole.ADMIN.value, f"admin.{module}", action)
 
 
 async def require_admin(
     current_user: models.User = Depends(get_current_user)
 ) -> models.User:
     """Require user to be admin"""
-    if current_user.role != models.UserRole.ADMIN:
+    if not authorize(current_user, 'admin', 'access'):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Admin access required"
@@ -519,7 +379,7 @@ async def require_admin_or_reception(
     current_user: models.User = Depends(get_current_user)
 ) -> models.User:
     """Require user to be admin or reception"""
-    if current_user.role not in [models.UserRole.ADMIN, models.UserRole.RECEPTION]:
+    if not authorize(current_user, 'front_office', 'access'):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Admin or Reception access required"
@@ -529,17 +389,16 @@ async def require_admin_or_reception(
 
 def verify_admin_action(user: models.User, module: str, action: str):
     """Verify if admin can perform specific action"""
-    if user.role != models.UserRole.ADMIN:
+    if not authorize(user, 'admin', 'access'):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Admin access required"
         )
     
-    if not admin_can(module, action):
+    if not authorize(user, f"admin.{module}", action):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail=f"Admin cannot perform '{action}' on '{module}'"
         )
     
     return True
-
@@ -3,6 +3,7 @@ from datetime import datetime, timedelta
 import models
 import schemas
 from auth import get_password_hash
+from recipient_directory import recipient_directory
 import random
 import string
 
@@ -29,6 +30,7 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    recipient_directory.invalidate()
     return db_user
 
 def get_user_by_username(db: Session, username: str):
@@ -1,9 +1,16 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import models
-from database import engine
-from scheduler import start_scheduler, stop_scheduler
+from auth import require_admin
+from database import engine, get_pool_stats
+from password_hashing import hashing_pool
+from rbac import rbac
+from sla_timer import sla_timer
+from scheduler import scheduler, start_scheduler, stop_scheduler
+from scheduler_leader import elector
+from audit_writer import audit_writer
+from services.chatbot_ai import CHATBOT_PRELOAD, chatbot_warmup
 from contextlib import asynccontextmanager
 from pathlib import Path
 
@@ -42,13 +49,18 @@ async def lifespan(app: FastAPI):
     # Startup
     print("Starting Yamini Infotech ERP System...")
     models.Base.metadata.create_all(bind=engine)
+    rbac.reload()
     start_scheduler()
     print("Scheduler started - Automated reminders active!")
+    if CHATBOT_PRELOAD:
+        chatbot_warmup.start()  # Background thread; /api/chatbot/ready reports progress
     yield
     # Shutdown
     print("Shutting down...")
     stop_scheduler()
     print("Scheduler stopped")
+    hashing_pool.shutdown()
+    audit_writer.close()
 
 
 app = FastAPI(
@@ -72,6 +84,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # Keyset pagination (/api/audit/logs)
 )
 
 # Include routers
@@ -119,4 +132,37 @@ def read_root():
 async def health():
     return {"status": "ok"}
 
+# Detailed health endpoints expose pool sizes, leader identity and queue depths: admin only.
+# /api/health stays public as the liveness probe.
+@app.get("/api/health/db-pool")
+def db_pool_health(current_user = Depends(require_admin)):
+    """Connection pool occupancy and checkout/wait metrics for sizing workers"""
+    return get_pool_stats()
+
+@app.get("/api/health/sla-timer")
+def sla_timer_health(current_user = Depends(require_admin)):
+    """Pending SLA deadlines, fired/sent counts and worst firing lag"""
+    return sla_timer.stats()
+
+@app.get("/api/health/scheduler")
+def scheduler_health(current_user = Depends(require_admin)):
+    """Whether this worker is the scheduler leader, and the next run of each job"""
+    return {
+        **elector.status(),
+        "jobs": [
+            {"id": job.id, "name": job.name, "next_run_time": job.next_run_time}
+            for job in scheduler.get_jobs()
+        ],
+    }
+
+@app.get("/api/health/audit-writer")
+def audit_writer_health(current_user = Depends(require_admin)):
+    """Buffered audit rows: pending, written, dropped and flush lag"""
+    return audit_writer.stats()
+
+@app.get("/api/health/password-hashing")
+def password_hashing_health(current_user = Depends(require_admin)):
+    """bcrypt worker pool queue depth, rejections and wait/run timings"""
+    return hashing_pool.stats()
+
 # To run: uvicorn main:app --reload --port 8000
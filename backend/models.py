@@ -1,4 +1,5 @@
-from sqlalchemy import Boolean, Column, Integer, String, Float, DateTime, Date, Text, ForeignKey, Enum
+from sqlalchemy import Boolean, Column, Integer, String, Float, DateTime, Date, Text, ForeignKey, Enum, Index
+from sqlalchemy import event
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime, date
@@ -22,6 +23,7 @@ class User(Base):
     role = Column(Enum(UserRole), nullable=False)
     department = Column(String)
     is_active = Column(Boolean, default=True)
+    token_version = Column(Integer, default=0, nullable=False)  # Bump to revoke issued JWTs
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Personal Information
@@ -115,6 +117,10 @@ class Enquiry(Base):
     # Explicitly define the order relationships to avoid ambiguity
     orders = relationship("Order", foreign_keys="Order.enquiry_id", back_populates="enquiry")
     converted_order = relationship("Order", foreign_keys=[order_id], back_populates="source_enquiry")
+    
+    __table_args__ = (
+        Index('ix_enquiries_status_next_follow_up', 'status', 'next_follow_up'),  # Follow-up reminder job
+    )
 
 # FollowUpHistory removed - using SalesFollowUp as single source of truth
 
@@ -159,6 +165,7 @@ class Complaint(Base):
     sla_time = Column(DateTime)  # When SLA expires
     sla_warning_sent = Column(Boolean, default=False)
     sla_breach_sent = Column(Boolean, default=False)  # Updated field name for consistency
+    sla_touched_at = Column(DateTime, index=True)  # Last status/priority/created_at change (SLA sweep marker)
     
     # Service completion fields
     completed_at = Column(DateTime)
@@ -174,6 +181,62 @@ class Complaint(Base):
     # Relationships
     customer = relationship("Customer", back_populates="complaints")
     assigned_engineer = relationship("User", back_populates="complaints")
+    
+    __table_args__ = (
+        # SLA sweep: open tickets with a flag still unset, ordered by age
+        Index("ix_complaints_sla_sweep", "status", "sla_warning_sent", "sla_breach_sent", "created_at"),
+    )
+
+
+@event.listens_for(Complaint.status, "set")
+@event.listens_for(Complaint.priority, "set")
+@event.listens_for(Complaint.created_at, "set")
+def _touch_sla(target, value, oldvalue, initiator):
+    """Reopened / reprioritised / backdated tickets can be past a threshold already;
+    the incremental SLA sweep picks up anything touched since its last run"""
+    if value != oldvalue:
+        target.sla_touched_at = datetime.utcnow()
+
+class SLASweepRun(Base):
+    """Watermark and counters for each SLA sweep (sla_utils.check_and_send_sla_notifications)"""
+    __tablename__ = "sla_sweep_runs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    watermark = Column(DateTime, nullable=False, index=True)  # Thresholds up to this instant were processed
+    full_sweep = Column(Boolean, default=False)  # True when the run ignored the previous watermark
+    candidates = Column(Integer, default=0)
+    warnings_sent = Column(Integer, default=0)
+    breaches_sent = Column(Integer, default=0)
+    duration_ms = Column(Float, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class SchedulerJobRun(Base):
+    """One execution of a scheduler job on the elected leader (scheduler_leader.leader_only)"""
+    __tablename__ = "scheduler_job_runs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String, nullable=False)
+    worker = Column(String)  # hostname:pid of the leader that ran it
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime)
+    duration_ms = Column(Float, default=0)
+    status = Column(String, default="success")  # success, error
+    error = Column(Text, nullable=True)
+    
+    __table_args__ = (
+        Index('ix_scheduler_job_runs_job_started', 'job_id', 'started_at'),
+    )
+
+class SchedulerCheckpoint(Base):
+    """Resume point of a chunked scheduler job, committed together with each chunk"""
+    __tablename__ = "scheduler_checkpoints"
+    
+    job_id = Column(String, primary_key=True)
+    last_id = Column(Integer, default=0)  # Keyset position: rows with id <= last_id are done
+    processed = Column(Integer, default=0)  # Rows handled by the current run
+    started_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    completed_at = Column(DateTime, nullable=True)  # NULL while a run is in progress
 
 class Feedback(Base):
     __tablename__ = "feedback"
@@ -392,6 +455,15 @@ class AuditLog(Base):
     timestamp = Column(DateTime, default=datetime.utcnow)
     
     user = relationship("User")
+    
+    # On PostgreSQL the table is range-partitioned by month on timestamp
+    # (scripts/migrations/partition_audit_logs.py, audit_partitions.py)
+    __table_args__ = (
+        Index('ix_audit_logs_timestamp_id', 'timestamp', 'id'),
+        Index('ix_audit_logs_module_timestamp', 'module', 'timestamp'),
+        Index('ix_audit_logs_user_timestamp', 'user_id', 'timestamp'),
+        Index('ix_audit_logs_module_record_timestamp', 'module', 'record_id', 'timestamp'),
+    )
 
 class ServiceEngineerHierarchy(Base):
     __tablename__ = "service_engineer_hierarchy"
@@ -486,6 +558,11 @@ class DailyReport(Base):
     
     # Relationship
     salesman = relationship("User", foreign_keys=[salesman_id])
+    
+    __table_args__ = (
+        # Missing-report anti-join probes (salesman_id, report_date)
+        Index("ix_daily_reports_salesman_date", "salesman_id", "report_date"),
+    )
 
 class Visitor(Base):
     """Visitor Log - Reception desk visitor tracking"""
@@ -7,16 +7,25 @@ PHASE 4: NOTIFICATION SYSTEM ALIGNMENT
 - Role-based notification routing
 - Priority-based alerting
 - Action URL generation
+- Bulk fan-out: recipients resolved in one query, rows written with one
+  multi-row INSERT in one transaction (notify_many / notify_roles)
 """
 
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from datetime import datetime
-from typing import Optional, List
+from typing import Dict, Iterable, List, Optional
 import models
 import logging
+from recipient_directory import recipient_directory
 
 logger = logging.getLogger(__name__)
 
+# Rows per INSERT statement (keeps bind parameters under driver limits)
+INSERT_CHUNK_SIZE = 1000
+
+PAYLOAD_FIELDS = ("title", "message", "notification_type", "priority", "module", "action_url")
+
 
 class NotificationService:
     """Centralized notification service for the ERP system"""
@@ -69,6 +78,116 @@ class NotificationService:
             logger.error(f"Failed to create notification: {e}")
             raise
     
+    @staticmethod
+    def resolve_recipients(
+        db: Session,
+        roles: Iterable[models.UserRole]
+    ) -> Dict[models.UserRole, List[int]]:
+        """
+        Resolve active user IDs for several roles from the recipient directory
+        (one query on a cold cache, none otherwise)
+        
+        Returns:
+            {role: [user_id, ...]} with an entry for every requested role
+        """
+        return {
+            role: list(user_ids)
+            for role, user_ids in recipient_directory.resolve(db, roles).items()
+        }
+    
+    @staticmethod
+    def build_rows(recipients: Iterable[int], payload: dict) -> List[dict]:
+        """Expand one payload into notification rows, skipping empty/duplicate recipients"""
+        now = datetime.utcnow()
+        base = {field: payload.get(field) for field in PAYLOAD_FIELDS}
+        if not base["priority"]:
+            base["priority"] = "medium"
+        rows = []
+        seen = set()
+        for user_id in recipients:
+            if user_id is None or user_id in seen:
+                continue
+            seen.add(user_id)
+            rows.append({**base, "user_id": user_id, "read_status": False, "created_at": now})
+        return rows
+    
+    @staticmethod
+    def insert_rows(db: Session, rows: List[dict], commit: bool = True) -> List[int]:
+        """
+        Write prepared notification rows with multi-row INSERT ... VALUES ... RETURNING id
+        
+        Args:
+            db: Database session
+            rows: Rows from build_rows (may mix several payloads)
+            commit: Commit when done; pass False to join the caller's transaction
+        
+        Returns:
+            IDs of the created notifications, in row order
+        """
+        if not rows:
+            return []
+        try:
+            ids: List[int] = []
+            if db.get_bind().dialect.insert_returning:
+                for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+                    chunk = rows[start:start + INSERT_CHUNK_SIZE]
+                    result = db.execute(
+                        insert(models.Notification).values(chunk).returning(models.Notification.id)
+                    )
+                    ids.extend(result.scalars().all())
+            else:
+                notifications = [models.Notification(**row) for row in rows]
+                db.add_all(notifications)
+                db.flush()
+                ids = [notification.id for notification in notifications]
+            if commit:
+                db.commit()
+            return ids
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to create {len(rows)} notifications: {e}")
+            raise
+    
+    @staticmethod
+    def notify_many(
+        db: Session,
+        recipients: Iterable[int],
+        payload: dict,
+        commit: bool = True
+    ) -> List[int]:
+        """
+        Send the same notification to many users in one INSERT / one transaction
+        
+        Args:
+            db: Database session
+            recipients: Target user IDs
+            payload: title, message, notification_type, priority, module, action_url
+            commit: Commit when done; pass False to join the caller's transaction
+        
+        Returns:
+            IDs of the created notifications
+        """
+        return NotificationService.insert_rows(
+            db, NotificationService.build_rows(recipients, payload), commit=commit
+        )
+    
+    @staticmethod
+    def notify_roles(
+        db: Session,
+        roles: Iterable[models.UserRole],
+        payload: dict,
+        exclude: Iterable[int] = (),
+        commit: bool = True
+    ) -> List[int]:
+        """Role-targeted bulk path: resolve every active user in `roles` and notify them at once"""
+        audience = NotificationService.resolve_recipients(db, roles)
+        excluded = set(exclude)
+        recipients = [
+            user_id for user_ids in audience.values() for user_id in user_ids
+            if user_id not in excluded
+        ]
+        return NotificationService.notify_many(db, recipients, payload, commit=commit)
+    
     @staticmethod
     def notify_enquiry_created(
         db: Session,
@@ -80,66 +199,50 @@ class NotificationService:
         - Notify assigned salesman
         - Notify admin
         """
-        notifications_created = []
+        audience = NotificationService.resolve_recipients(
+            db, [models.UserRole.ADMIN, models.UserRole.RECEPTION]
+        )
+        rows = []
         
         # Notify assigned salesman
         if enquiry.assigned_to:
-            notification = NotificationService.create_notification(
-                db=db,
-                user_id=enquiry.assigned_to,
-                title=f"New Enquiry Assigned: {enquiry.customer_name}",
-                message=f"A new enquiry from {enquiry.customer_name} has been assigned to you by {created_by_name}. "
-                       f"Priority: {enquiry.priority}. Follow up required.",
-                notification_type="enquiry",
-                priority="high" if enquiry.priority == "HOT" else "medium",
-                module="enquiries",
-                action_url=f"/enquiries/{enquiry.id}"
-            )
-            notifications_created.append(notification)
+            rows += NotificationService.build_rows([enquiry.assigned_to], {
+                "title": f"New Enquiry Assigned: {enquiry.customer_name}",
+                "message": f"A new enquiry from {enquiry.customer_name} has been assigned to you by {created_by_name}. "
+                           f"Priority: {enquiry.priority}. Follow up required.",
+                "notification_type": "enquiry",
+                "priority": "high" if enquiry.priority == "HOT" else "medium",
+                "module": "enquiries",
+                "action_url": f"/enquiries/{enquiry.id}"
+            })
         
         # Notify admin about new enquiry
-        admin_users = db.query(models.User).filter(
-            models.User.role == models.UserRole.ADMIN
-        ).all()
-        
-        for admin in admin_users:
-            notification = NotificationService.create_notification(
-                db=db,
-                user_id=admin.id,
-                title=f"New Enquiry: {enquiry.customer_name}",
-                message=f"New enquiry created by {created_by_name}. "
+        rows += NotificationService.build_rows(audience[models.UserRole.ADMIN], {
+            "title": f"New Enquiry: {enquiry.customer_name}",
+            "message": f"New enquiry created by {created_by_name}. "
                        f"Assigned to: {enquiry.assigned_to or 'Unassigned'}. "
                        f"Priority: {enquiry.priority}",
-                notification_type="enquiry",
-                priority="low",
-                module="enquiries",
-                action_url=f"/enquiries/{enquiry.id}"
-            )
-            notifications_created.append(notification)
+            "notification_type": "enquiry",
+            "priority": "low",
+            "module": "enquiries",
+            "action_url": f"/enquiries/{enquiry.id}"
+        })
         
         # Notify RECEPTION role (office staff) about new enquiry
-        reception_users = db.query(models.User).filter(
-            models.User.role == models.UserRole.RECEPTION,
-            models.User.is_active == True
-        ).all()
-        
-        for reception in reception_users:
-            notification = NotificationService.create_notification(
-                db=db,
-                user_id=reception.id,
-                title=f"New Enquiry: {enquiry.customer_name}",
-                message=f"New enquiry submitted by {created_by_name}. "
+        rows += NotificationService.build_rows(audience[models.UserRole.RECEPTION], {
+            "title": f"New Enquiry: {enquiry.customer_name}",
+            "message": f"New enquiry submitted by {created_by_name}. "
                        f"Customer: {enquiry.customer_name}, Phone: {enquiry.phone}. "
                        f"Priority: {enquiry.priority}. Please review and assign.",
-                notification_type="enquiry",
-                priority="high" if created_by_name == "Website Visitor" else "medium",
-                module="enquiries",
-                action_url=f"/enquiries/{enquiry.id}"
-            )
-            notifications_created.append(notification)
-        
-        logger.info(f"Created {len(notifications_created)} notifications for enquiry {enquiry.id}")
-        return notifications_created
+            "notification_type": "enquiry",
+            "priority": "high" if created_by_name == "Website Visitor" else "medium",
+            "module": "enquiries",
+            "action_url": f"/enquiries/{enquiry.id}"
+        })
+        
+        notification_ids = NotificationService.insert_rows(db, rows)
+        logger.info(f"Created {len(notification_ids)} notifications for enquiry {enquiry.id}")
+        return notification_ids
     
     @staticmethod
     def notify_order_created(
@@ -152,44 +255,34 @@ class NotificationService:
         - Notify admin for approval
         - Notify salesman (if different from creator)
         """
-        notifications_created = []
+        admin_ids = NotificationService.resolve_recipients(db, [models.UserRole.ADMIN])[models.UserRole.ADMIN]
         
         # Notify admin for order approval
-        admin_users = db.query(models.User).filter(
-            models.User.role == models.UserRole.ADMIN
-        ).all()
-        
-        for admin in admin_users:
-            notification = NotificationService.create_notification(
-                db=db,
-                user_id=admin.id,
-                title=f"New Order Pending Approval: #{order.id}",
-                message=f"Order created by {created_by_user.full_name} for customer ID {order.customer_id}. "
+        rows = NotificationService.build_rows(admin_ids, {
+            "title": f"New Order Pending Approval: #{order.id}",
+            "message": f"Order created by {created_by_user.full_name} for customer ID {order.customer_id}. "
                        f"Amount: ₹{order.total_amount:.2f}. Requires approval.",
-                notification_type="order",
-                priority="high",
-                module="orders",
-                action_url=f"/orders/{order.id}/approve"
-            )
-            notifications_created.append(notification)
+            "notification_type": "order",
+            "priority": "high",
+            "module": "orders",
+            "action_url": f"/orders/{order.id}/approve"
+        })
         
         # Notify salesman if order was created by someone else
         if order.salesman_id and order.salesman_id != created_by_user.id:
-            notification = NotificationService.create_notification(
-                db=db,
-                user_id=order.salesman_id,
-                title=f"Order Created for Your Customer: #{order.id}",
-                message=f"An order has been created by {created_by_user.full_name} "
-                       f"for customer ID {order.customer_id}. Amount: ₹{order.total_amount:.2f}",
-                notification_type="order",
-                priority="medium",
-                module="orders",
-                action_url=f"/orders/{order.id}"
-            )
-            notifications_created.append(notification)
-        
-        logger.info(f"Created {len(notifications_created)} notifications for order {order.id}")
-        return notifications_created
+            rows += NotificationService.build_rows([order.salesman_id], {
+                "title": f"Order Created for Your Customer: #{order.id}",
+                "message": f"An order has been created by {created_by_user.full_name} "
+                           f"for customer ID {order.customer_id}. Amount: ₹{order.total_amount:.2f}",
+                "notification_type": "order",
+                "priority": "medium",
+                "module": "orders",
+                "action_url": f"/orders/{order.id}"
+            })
+        
+        notification_ids = NotificationService.insert_rows(db, rows)
+        logger.info(f"Created {len(notification_ids)} notifications for order {order.id}")
+        return notification_ids
     
     @staticmethod
     def notify_order_approved(
@@ -202,25 +295,19 @@ class NotificationService:
         - Notify salesman
         - Notify customer (if email available)
         """
-        notifications_created = []
-        
         # Notify salesman
-        if order.salesman_id:
-            notification = NotificationService.create_notification(
-                db=db,
-                user_id=order.salesman_id,
-                title=f"Order Approved: #{order.id}",
-                message=f"Your order #{order.id} has been approved by {approved_by.full_name}. "
+        notification_ids = NotificationService.notify_many(db, [order.salesman_id], {
+            "title": f"Order Approved: #{order.id}",
+            "message": f"Your order #{order.id} has been approved by {approved_by.full_name}. "
                        f"Invoice: {order.invoice_number}. Stock deducted.",
-                notification_type="order",
-                priority="high",
-                module="orders",
-                action_url=f"/orders/{order.id}"
-            )
-            notifications_created.append(notification)
-        
-        logger.info(f"Created {len(notifications_created)} notifications for order approval {order.id}")
-        return notifications_created
+            "notification_type": "order",
+            "priority": "high",
+            "module": "orders",
+            "action_url": f"/orders/{order.id}"
+        })
+        
+        logger.info(f"Created {len(notification_ids)} notifications for order approval {order.id}")
+        return notification_ids
     
     @staticmethod
     def notify_order_rejected(
@@ -233,25 +320,32 @@ class NotificationService:
         Notify when an order is rejected
         - Notify salesman
         """
-        notifications_created = []
-        
         # Notify salesman
-        if order.salesman_id:
-            notification = NotificationService.create_notification(
-                db=db,
-                user_id=order.salesman_id,
-                title=f"Order Rejected: #{order.id}",
-                message=f"Your order #{order.id} has been rejected by {rejected_by.full_name}. "
+        notification_ids = NotificationService.notify_many(db, [order.salesman_id], {
+            "title": f"Order Rejected: #{order.id}",
+            "message": f"Your order #{order.id} has been rejected by {rejected_by.full_name}. "
                        f"Reason: {reason}",
-                notification_type="order",
-                priority="high",
-                module="orders",
-                action_url=f"/orders/{order.id}"
-            )
-            notifications_created.append(notification)
-        
-        logger.info(f"Created {len(notifications_created)} notifications for order rejection {order.id}")
-        return notifications_created
+            "notification_type": "order",
+            "priority": "high",
+            "module": "orders",
+            "action_url": f"/orders/{order.id}"
+        })
+        
+        logger.info(f"Created {len(notification_ids)} notifications for order rejection {order.id}")
+        return notification_ids
+    
+    @staticmethod
+    def daily_report_missing_payload(date: datetime) -> dict:
+        """Salesman reminder for a missing daily report (also used by the scheduler's bulk insert)"""
+        return {
+            "title": f"Missing Daily Report for {date.strftime('%Y-%m-%d')}",
+            "message": f"You have not submitted your daily report for {date.strftime('%B %d, %Y')}. "
+                       f"Please submit it as soon as possible.",
+            "notification_type": "reminder",
+            "priority": "high",
+            "module": "reports",
+            "action_url": "/salesman/daily-report"
+        }
     
     @staticmethod
     def notify_daily_report_missing(
@@ -262,20 +356,12 @@ class NotificationService:
         """
         Notify salesman about missing daily report
         """
-        notification = NotificationService.create_notification(
-            db=db,
-            user_id=salesman.id,
-            title=f"Missing Daily Report for {date.strftime('%Y-%m-%d')}",
-            message=f"You have not submitted your daily report for {date.strftime('%B %d, %Y')}. "
-                   f"Please submit it as soon as possible.",
-            notification_type="reminder",
-            priority="high",
-            module="reports",
-            action_url="/salesman/daily-report"
+        notification_ids = NotificationService.notify_many(
+            db, [salesman.id], NotificationService.daily_report_missing_payload(date)
         )
         
         logger.info(f"Sent missing report notification to salesman {salesman.id}")
-        return notification
+        return notification_ids
     
     @staticmethod
     def notify_followup_due(
@@ -293,20 +379,18 @@ class NotificationService:
         if not enquiry:
             return None
         
-        notification = NotificationService.create_notification(
-            db=db,
-            user_id=salesman.id,
-            title=f"Follow-up Due: {enquiry.customer_name}",
-            message=f"Follow-up is due for {enquiry.customer_name}. "
-                   f"Status: {followup.status}. Temperature: {enquiry.temperature}",
-            notification_type="reminder",
-            priority="high" if enquiry.temperature == "HOT" else "medium",
-            module="enquiries",
-            action_url=f"/enquiries/{enquiry.id}/followups"
-        )
+        notification_ids = NotificationService.notify_many(db, [salesman.id], {
+            "title": f"Follow-up Due: {enquiry.customer_name}",
+            "message": f"Follow-up is due for {enquiry.customer_name}. "
+                       f"Status: {followup.status}. Temperature: {enquiry.temperature}",
+            "notification_type": "reminder",
+            "priority": "high" if enquiry.temperature == "HOT" else "medium",
+            "module": "enquiries",
+            "action_url": f"/enquiries/{enquiry.id}/followups"
+        })
         
         logger.info(f"Sent follow-up reminder to salesman {salesman.id}")
-        return notification
+        return notification_ids
     
     @staticmethod
     def notify_role_based(
@@ -318,7 +402,7 @@ class NotificationService:
         priority: str = "medium",
         module: str = None,
         action_url: str = None
-    ) -> List[models.Notification]:
+    ) -> List[int]:
         """
         Send notifications to all users with specific roles
         
@@ -333,37 +417,26 @@ class NotificationService:
             action_url: Action URL
         
         Returns:
-            List of created notifications
+            IDs of the created notifications
         """
-        notifications_created = []
-        
-        users = db.query(models.User).filter(
-            models.User.role.in_(roles),
-            models.User.is_active == True
-        ).all()
-        
-        for user in users:
-            notification = NotificationService.create_notification(
-                db=db,
-                user_id=user.id,
-                title=title,
-                message=message,
-                notification_type=notification_type,
-                priority=priority,
-                module=module,
-                action_url=action_url
-            )
-            notifications_created.append(notification)
-        
-        logger.info(f"Created {len(notifications_created)} role-based notifications for roles {roles}")
-        return notifications_created
+        notification_ids = NotificationService.notify_roles(db, roles, {
+            "title": title,
+            "message": message,
+            "notification_type": notification_type,
+            "priority": priority,
+            "module": module,
+            "action_url": action_url
+        })
+        
+        logger.info(f"Created {len(notification_ids)} role-based notifications for roles {roles}")
+        return notification_ids
 
     @staticmethod
     def notify_service_assigned(
         db: Session,
         service: models.Complaint,
         engineer_id: int
-    ) -> models.Notification:
+    ) -> List[int]:
         """
         Notify service engineer when a service request is assigned
         
@@ -373,17 +446,43 @@ class NotificationService:
             engineer_id: Engineer user ID
         
         Returns:
-            Created notification
+            IDs of the created notifications
         """
         priority_label = service.priority or "NORMAL"
         
-        return NotificationService.create_notification(
+        return NotificationService.notify_many(db, [engineer_id], {
+            "title": f"New {priority_label} Service Assigned",
+            "message": f"Service Request #{service.id} has been assigned to you. Customer: {service.customer_name}, Issue: {service.complaint_text[:100]}...",
+            "notification_type": "service_assigned",
+            "priority": "high" if priority_label == "CRITICAL" else "medium",
+            "module": "service_engineer",
+            "action_url": f"/service-requests/{service.id}"
+        })
+
+    @staticmethod
+    def notify_service_updated(
+        db: Session,
+        service: models.Complaint,
+        engineer_name: str
+    ) -> List[int]:
+        """
+        Notify admin and reception when an engineer changes a job's status
+        
+        Args:
+            db: Database session
+            service: Service request/complaint object
+            engineer_name: Name of the engineer who updated the job
+        
+        Returns:
+            IDs of the created notifications
+        """
+        return NotificationService.notify_role_based(
             db=db,
-            user_id=engineer_id,
-            title=f"New {priority_label} Service Assigned",
-            message=f"Service Request #{service.id} has been assigned to you. Customer: {service.customer_name}, Issue: {service.complaint_text[:100]}...",
-            notification_type="service_assigned",
-            priority="high" if priority_label == "CRITICAL" else "medium",
+            roles=[models.UserRole.ADMIN, models.UserRole.RECEPTION],
+            title=f"Service Request #{service.id} Updated",
+            message=f"Engineer {engineer_name} changed status to {service.status} for {service.customer_name}.",
+            notification_type="service_updated",
+            priority="low",
             module="service_engineer",
             action_url=f"/service-requests/{service.id}"
         )
@@ -393,7 +492,7 @@ class NotificationService:
         db: Session,
         service: models.Complaint,
         engineer_name: str
-    ) -> List[models.Notification]:
+    ) -> List[int]:
         """
         Notify admin and reception when a service is completed
         
@@ -403,7 +502,7 @@ class NotificationService:
             engineer_name: Name of the engineer who completed the service
         
         Returns:
-            List of created notifications
+            IDs of the created notifications
         """
         return NotificationService.notify_role_based(
             db=db,
@@ -420,7 +519,7 @@ class NotificationService:
     def notify_sla_breach(
         db: Session,
         service: models.Complaint
-    ) -> List[models.Notification]:
+    ) -> List[int]:
         """
         Notify admin and reception when SLA is breached
         
@@ -429,7 +528,7 @@ class NotificationService:
             service: Service request/complaint object
         
         Returns:
-            List of created notifications
+            IDs of the created notifications
         """
         engineer_name = "Unassigned"
         if service.assigned_to:
@@ -453,7 +552,7 @@ class NotificationService:
         db: Session,
         service: models.Complaint,
         feedback
-    ) -> List[models.Notification]:
+    ) -> List[int]:
         """
         Notify admin and reception when negative feedback is received
         
@@ -463,7 +562,7 @@ class NotificationService:
             feedback: Feedback object with rating
         
         Returns:
-            List of created notifications
+            IDs of the created notifications
         """
         engineer_name = "Unknown"
         if service.assigned_to:
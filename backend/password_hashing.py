@@ -0,0 +1,172 @@
+"""
+Password Hashing Pool
+Runs bcrypt hashing/verification on a dedicated, size-limited process pool so a
+login burst cannot monopolise the request threads.
+
+- At most HASH_POOL_WORKERS bcrypt calls run at once; up to HASH_POOL_MAX_QUEUE
+  more may wait. Anything beyond that is rejected with PasswordPoolBusy
+  (routes turn it into 503 + Retry-After via auth.password_pool_busy).
+- BCRYPT_ROUNDS is the target cost; needs_rehash() reports hashes made with
+  another cost so they can be upgraded transparently on the next login.
+
+This module must stay free of app imports: pool workers are started with
+the 'spawn' method and import it on their own.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import BoundedSemaphore, Lock
+from typing import Optional
+import multiprocessing
+import os
+import time
+
+import bcrypt
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_POOL_WORKERS = int(os.getenv("HASH_POOL_WORKERS", str(min(2, os.cpu_count() or 1))))
+HASH_POOL_MAX_QUEUE = int(os.getenv("HASH_POOL_MAX_QUEUE", "32"))
+HASH_POOL_QUEUE_TIMEOUT = float(os.getenv("HASH_POOL_QUEUE_TIMEOUT", "5"))  # seconds
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when the hashing queue is full"""
+
+
+def _truncate(password) -> bytes:
+    pw_bytes = password.encode('utf-8') if isinstance(password, str) else password
+    # Bcrypt has a 72-byte limit
+    return pw_bytes[:72]
+
+
+# Worker functions (executed in pool processes)
+
+def _checkpw(pw_bytes: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(pw_bytes, hashed)
+
+
+def _hashpw(pw_bytes: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(pw_bytes, bcrypt.gensalt(rounds=rounds))
+
+
+def _timed(func, *args):
+    """Return (wall-clock start, result) so the caller can split queue wait from run time"""
+    return time.time(), func(*args)
+
+
+class PasswordHashingPool:
+    """Bounded process pool with queueing/backpressure metrics"""
+
+    def __init__(self, workers: int, max_queue: int, queue_timeout: float):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = BoundedSemaphore(max(workers, 1) + max_queue)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.pool_restarts = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.total_wait = 0.0
+        self.total_run = 0.0
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+        return self._executor
+
+    def _run(self, func, *args):
+        submitted_at = time.time()
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordPoolBusy("Password hashing queue is full")
+
+        with self._lock:
+            self.submitted += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            executor = self._get_executor()
+            if executor is None:
+                started_at, result = _timed(func, *args)
+            else:
+                try:
+                    started_at, result = executor.submit(_timed, func, *args).result()
+                except BrokenProcessPool as e:
+                    # A worker died; hash inline this time and start a fresh pool next call
+                    print(f"WARNING: password hashing pool broken, recreating: {e}")
+                    self._reset_executor(executor)
+                    started_at, result = _timed(func, *args)
+            finished_at = time.time()
+            with self._lock:
+                self.completed += 1
+                self.total_wait += max(started_at - submitted_at, 0.0)
+                self.total_run += max(finished_at - started_at, 0.0)
+            return result
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    def checkpw(self, password, hashed: str) -> bool:
+        return self._run(_checkpw, _truncate(password), hashed.encode('utf-8'))
+
+    def hashpw(self, password, rounds: int = BCRYPT_ROUNDS) -> str:
+        return self._run(_hashpw, _truncate(password), rounds).decode('utf-8')
+
+    def _reset_executor(self, broken: ProcessPoolExecutor):
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+                self.pool_restarts += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            done = self.completed or 1
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "bcrypt_rounds": BCRYPT_ROUNDS,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "pool_restarts": self.pool_restarts,
+                "in_flight": self.in_flight,
+                "queued": max(self.in_flight - self.workers, 0),
+                "peak_in_flight": self.peak_in_flight,
+                "avg_wait_ms": round(self.total_wait / done * 1000, 3),
+                "avg_run_ms": round(self.total_run / done * 1000, 3),
+            }
+
+
+def get_bcrypt_cost(hashed_password: str) -> Optional[int]:
+    """Read the cost factor from a $2a$/$2b$/$2y$ hash"""
+    try:
+        return int(hashed_password.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    return get_bcrypt_cost(hashed_password) != BCRYPT_ROUNDS
+
+
+hashing_pool = PasswordHashingPool(HASH_POOL_WORKERS, HASH_POOL_MAX_QUEUE, HASH_POOL_QUEUE_TIMEOUT)
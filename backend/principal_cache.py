@@ -0,0 +1,135 @@
+"""
+Principal Cache
+In-process TTL/LRU cache for authenticated users so the common request path
+does not query the users / attendance tables.
+
+- Principals are keyed by (username, token_version). Bumping a user's
+  token_version revokes every token issued before the bump.
+- Writes in routers/users.py call invalidate_user() so this worker drops the
+  cached row immediately; other workers pick up the change within PRINCIPAL_CACHE_TTL.
+- Only positive "attendance marked today" results are cached, so a salesman who
+  checks in is let through on the next request.
+"""
+
+from collections import OrderedDict
+from datetime import date
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, Optional
+import os
+import time
+
+import models
+
+PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", "60"))  # seconds
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "2048"))
+
+_USER_COLUMNS = [column.key for column in models.User.__table__.columns]
+
+
+class TTLCache:
+    """Small thread-safe LRU cache with per-entry expiry"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        with self._lock:
+            stale = [key for key, (_, value) in self._data.items() if predicate(key, value)]
+            for key in stale:
+                del self._data[key]
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class PrincipalCache:
+    """Caches user snapshots and today's attendance status"""
+
+    def __init__(self, maxsize: int = PRINCIPAL_CACHE_SIZE, ttl: float = PRINCIPAL_CACHE_TTL):
+        self.principals = TTLCache(maxsize, ttl)
+        self.attendance = TTLCache(maxsize, ttl)
+
+    # ---- principals -------------------------------------------------------
+
+    def get_user(self, username: str, token_version: int) -> Optional[models.User]:
+        snapshot = self.principals.get((username, token_version))
+        if snapshot is None:
+            return None
+        # Fresh transient object per request, so per-request attributes never leak
+        return models.User(**snapshot)
+
+    def put_user(self, user: models.User, token_version: int):
+        snapshot = {key: getattr(user, key) for key in _USER_COLUMNS}
+        self.principals.set((user.username, token_version), snapshot)
+
+    def invalidate_user(self, user_id: Optional[int] = None, username: Optional[str] = None):
+        """Drop cached principal + attendance entries for a user (call after any write)"""
+        self.principals.discard_where(
+            lambda key, snapshot: snapshot["id"] == user_id or key[0] == username
+        )
+        if user_id is not None:
+            self.attendance.discard_where(lambda key, _: key[0] == user_id)
+
+    # ---- attendance -------------------------------------------------------
+
+    def get_attendance(self, user_id: int, day: date) -> Optional[int]:
+        return self.attendance.get((user_id, day))
+
+    def put_attendance(self, user_id: int, day: date, attendance_id: int):
+        self.attendance.set((user_id, day), attendance_id)
+
+    # ---- housekeeping -----------------------------------------------------
+
+    def clear(self):
+        self.principals.clear()
+        self.attendance.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "principals": {
+                "size": len(self.principals),
+                "hits": self.principals.hits,
+                "misses": self.principals.misses,
+            },
+            "attendance": {
+                "size": len(self.attendance),
+                "hits": self.attendance.hits,
+                "misses": self.attendance.misses,
+            },
+            "ttl_seconds": self.principals.ttl,
+        }
+
+
+principal_cache = PrincipalCache()
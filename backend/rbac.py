@@ -0,0 +1,353 @@
+"""
+RBAC Decision Engine
+Compiles the static role matrix and the DB-backed roles/role_permissions rows
+into one frozen bitset per role, so a permission check is a dict lookup and a
+bit test instead of rebuilding nested dicts or querying on every request.
+
+- authorize(user, resource, action) is the single entry point; every
+  require_* dependency in auth.py goes through it.
+- Product-management permission codes (ADD_PRODUCT, VIEW_INTERNAL_DATA, ...)
+  live under the "permission" resource and are merged with role_permissions.
+- Call invalidate() after changing roles/role_permissions; the policy is
+  recompiled on next use. Other workers recompile within RBAC_RELOAD_SECONDS:
+  a stale policy keeps being served while one background thread reloads it,
+  so request threads and the event loop never wait on role_permissions.
+"""
+
+from dataclasses import dataclass
+from threading import Lock, Thread
+from types import MappingProxyType
+from typing import Dict, FrozenSet, List, Mapping, Optional, Tuple
+import logging
+import os
+import time
+
+from sqlalchemy import text
+
+from models import UserRole
+
+logger = logging.getLogger(__name__)
+
+RBAC_RELOAD_SECONDS = int(os.getenv("RBAC_RELOAD_SECONDS", "300"))
+RBAC_RELOAD_RETRY_SECONDS = 30  # After a failed background reload
+
+ADMIN = UserRole.ADMIN.value
+RECEPTION = UserRole.RECEPTION.value
+SALESMAN = UserRole.SALESMAN.value
+SERVICE_ENGINEER = UserRole.SERVICE_ENGINEER.value
+CUSTOMER = UserRole.CUSTOMER.value
+
+# Product-management permission codes (also stored in role_permissions)
+PERMISSION_CODES = [
+    "VIEW_PRODUCT",
+    "VIEW_PRICING",
+    "ADD_PRODUCT",
+    "EDIT_PRODUCT",
+    "DELETE_PRODUCT",
+    "VIEW_INTERNAL_DATA",
+    "MANAGE_STOCK",
+    "MANAGE_PRICING",
+    "MANAGE_SERVICES",
+]
+
+# Permission matrix aligned with MASTER ROLE MATRIX
+PERMISSION_MATRIX: Dict[str, Dict[str, List[str]]] = {
+    ADMIN: {
+        'order': ['read', 'write', 'approve', 'delete'],
+        'product': ['read', 'write', 'delete'],
+        'enquiry': ['read', 'write', 'assign', 'manage', 'delete'],
+        'mif': ['read', 'write', 'delete'],
+        'stock': ['read', 'write'],
+        'invoice': ['read', 'write'],
+        'report': ['read', 'write'],
+        'notification': ['read', 'write', 'send'],
+        'user': ['read', 'write', 'delete'],
+        'admin': ['access'],
+        'front_office': ['access'],
+        'permission': PERMISSION_CODES,  # ADMIN GOD MODE
+    },
+    RECEPTION: {
+        'order': ['read'],  # View only, NO approve
+        'product': ['read'],  # View only, NO edit
+        'enquiry': ['read', 'write', 'assign', 'manage'],  # Can create & assign
+        'mif': ['read'],  # VIEW ONLY per matrix
+        'stock': ['read'],  # View only, NO updates
+        'invoice': ['read'],  # View only, NO create
+        'report': ['read'],  # Collection/monitoring only
+        'notification': ['read', 'send'],
+        'user': ['read'],
+        'front_office': ['access'],
+        'permission': ['VIEW_PRODUCT', 'VIEW_PRICING'],
+    },
+    SALESMAN: {
+        'order': ['read', 'write'],  # Create only, NO approve
+        'product': ['read'],  # Public view only
+        'enquiry': ['read', 'write'],  # Only assigned enquiries
+        'report': ['write'],  # Submit daily reports only
+        'notification': ['read'],
+        'permission': ['VIEW_PRODUCT', 'VIEW_PRICING'],
+    },
+    SERVICE_ENGINEER: {
+        'product': ['read'],
+        'report': ['write'],  # Service reports only
+        'notification': ['read'],
+    },
+    CUSTOMER: {
+        'order': ['read'],  # Own orders only
+        'product': ['read'],  # Public catalog only
+        'enquiry': ['write'],  # Can create enquiries
+        'invoice': ['read'],  # Own invoices only
+        'notification': ['read'],
+    },
+}
+
+# Legacy feature flags (auth.check_permission); "READ_ONLY" grants are kept as such
+CAPABILITIES: Dict[str, Dict[str, object]] = {
+    ADMIN: {
+        "access_mif": True,
+        "view_all_customers": True,
+        "manage_employees": True,
+        "manage_reception": True,
+        "view_reports": True,
+        "manage_products": True,
+        "manage_services": True,
+        "view_financials": True,
+        "create_invoice": True,
+        "approve_orders": True,
+        "update_stock": True,
+    },
+    RECEPTION: {
+        "access_mif": "READ_ONLY",  # VIEW ONLY per matrix
+        "view_all_customers": True,
+        "manage_reception": True,
+        "view_reports": True,  # Collection/monitoring only
+        "view_financials": "READ_ONLY",  # Summary only
+    },
+}
+
+# Define admin permissions per module
+ADMIN_PERMISSIONS: Dict[str, List[str]] = {
+    "employees": ["create", "edit", "disable", "activate", "reset_password", "mark_attendance"],
+    "products": ["create", "edit", "toggle", "disable"],
+    "stock": ["in", "out", "correct", "view"],
+    "enquiries": ["assign", "reassign", "change_priority"],
+    "orders": ["create", "edit", "approve", "reject", "status", "correct"],
+    "invoices": ["create", "edit", "export", "view"],
+    "outstanding": ["create", "update", "track"],
+    "service": ["assign", "reassign", "view_sla", "view_feedback"],
+    "mif": ["create", "edit"],
+    "attendance": ["view", "correct", "approve", "mark"],
+    "reports": ["view", "compare", "export"],
+    "audit": ["view", "filter"],
+    "settings": ["manage_roles", "configure"],
+}
+
+ROLE_PERMISSIONS_SQL = """
+    SELECT r.role_name, rp.permission_code
+    FROM roles r
+    JOIN role_permissions rp ON rp.role_id = r.id
+"""
+
+
+def _role_key(role) -> Optional[str]:
+    return getattr(role, "value", role)
+
+
+@dataclass(frozen=True)
+class Policy:
+    """Immutable compiled policy: one bit per (resource, action), one int per role"""
+    index: Mapping[Tuple[str, str], int]
+    role_bits: Mapping[str, int]
+    read_only: FrozenSet[Tuple[str, str]]
+    db_rows: int
+    compiled_at: float
+
+    def allows(self, role: Optional[str], resource: str, action: str) -> bool:
+        bit = self.index.get((resource, action))
+        if bit is None:
+            return False
+        return bool(self.role_bits.get(role, 0) >> bit & 1)
+
+    def actions_for(self, role: Optional[str], resource: str) -> List[str]:
+        bits = self.role_bits.get(role, 0)
+        return [
+            action for (res, action), bit in self.index.items()
+            if res == resource and bits >> bit & 1
+        ]
+
+
+def compile_policy(db_grants: Optional[Dict[str, List[str]]] = None) -> Policy:
+    """Build the frozen policy from the static tables plus role_permissions grants"""
+    grants: Dict[str, set] = {}
+
+    def grant(role: str, resource: str, action: str):
+        grants.setdefault(role, set()).add((resource, action))
+
+    for role, resources in PERMISSION_MATRIX.items():
+        for resource, actions in resources.items():
+            for action in actions:
+                grant(role, resource, action)
+
+    read_only = set()
+    for role, flags in CAPABILITIES.items():
+        for flag, value in flags.items():
+            if value:
+                grant(role, 'capability', flag)
+            if value == "READ_ONLY":
+                read_only.add((role, flag))
+
+    for module, actions in ADMIN_PERMISSIONS.items():
+        for action in actions:
+            grant(ADMIN, f'admin.{module}', action)
+
+    db_rows = 0
+    for role, codes in (db_grants or {}).items():
+        for code in codes:
+            grant(role, 'permission', code)
+            db_rows += 1
+
+    # Admin holds every permission code, including ones only defined in the DB
+    for role_grants in list(grants.values()):
+        for resource, action in list(role_grants):
+            if resource == 'permission':
+                grant(ADMIN, resource, action)
+
+    index: Dict[Tuple[str, str], int] = {}
+    for key in sorted(set().union(*grants.values())):
+        index[key] = len(index)
+
+    role_bits = {
+        role: sum(1 << index[key] for key in keys)
+        for role, keys in grants.items()
+    }
+
+    return Policy(
+        index=MappingProxyType(index),
+        role_bits=MappingProxyType(role_bits),
+        read_only=frozenset(read_only),
+        db_rows=db_rows,
+        compiled_at=time.time(),
+    )
+
+
+def load_db_grants(db) -> Dict[str, List[str]]:
+    """Read role_permissions; returns {} if the tables do not exist yet"""
+    try:
+        rows = db.execute(text(ROLE_PERMISSIONS_SQL)).fetchall()
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️  RBAC: role_permissions not loaded ({e.__class__.__name__}), using static matrix only")
+        return {}
+    grants: Dict[str, List[str]] = {}
+    for role_name, code in rows:
+        grants.setdefault(str(role_name).upper(), []).append(code)
+    return grants
+
+
+class RBACEngine:
+    """Holds the current compiled Policy and swaps it atomically on reload"""
+
+    def __init__(self, reload_seconds: float = RBAC_RELOAD_SECONDS):
+        self.reload_seconds = reload_seconds
+        self._policy: Optional[Policy] = None
+        self._lock = Lock()
+        self._reload_lock = Lock()  # Held by the one caller / thread compiling a policy
+        self._retry_at = 0.0
+        self.reloads = 0
+        self.invalidations = 0
+        self.reload_failures = 0
+
+    @staticmethod
+    def _load_grants(db=None):
+        if db is not None:
+            return load_db_grants(db)
+        from database import SessionLocal
+        session = SessionLocal()
+        try:
+            return load_db_grants(session)
+        finally:
+            session.close()
+
+    def reload(self, db=None) -> Policy:
+        """Recompile from the static matrix + role_permissions (opens a session if none given)"""
+        policy = compile_policy(self._load_grants(db))
+        with self._lock:
+            self._policy = policy
+            self.reloads += 1
+        return policy
+
+    def invalidate(self):
+        """Invalidation hook: drop the compiled policy so the next check recompiles"""
+        with self._lock:
+            self._policy = None
+            self.invalidations += 1
+
+    def _refresh(self, generation: int):
+        try:
+            policy = compile_policy(self._load_grants())
+            with self._lock:
+                # An invalidate() since the start means these grants may predate the change
+                if self.invalidations == generation:
+                    self._policy = policy
+                    self.reloads += 1
+        except Exception as e:
+            self._retry_at = time.time() + RBAC_RELOAD_RETRY_SECONDS
+            self.reload_failures += 1
+            logger.error(f"❌ RBAC policy reload failed, serving the previous policy: {e}")
+        finally:
+            self._reload_lock.release()
+
+    def _refresh_in_background(self):
+        """Recompile a stale policy on one thread; callers keep the old one meanwhile"""
+        if time.time() < self._retry_at or not self._reload_lock.acquire(blocking=False):
+            return  # A reload is already running (or just failed)
+        Thread(target=self._refresh, args=(self.invalidations,), name="rbac-reload", daemon=True).start()
+
+    @property
+    def policy(self) -> Policy:
+        policy = self._policy
+        if policy is None:
+            # Nothing to serve yet (startup or invalidate()): one caller compiles, the rest wait
+            with self._reload_lock:
+                policy = self._policy
+                if policy is None:
+                    policy = self.reload()
+            return policy
+        if self.reload_seconds and time.time() - policy.compiled_at > self.reload_seconds:
+            self._refresh_in_background()
+        return policy
+
+    def authorize(self, user, resource: str, action: str) -> bool:
+        if user is None or not user.role:
+            return False
+        return self.policy.allows(_role_key(user.role), resource, action)
+
+    def is_read_only(self, user, capability: str) -> bool:
+        return (_role_key(user.role), capability) in self.policy.read_only
+
+    def actions_for(self, role, resource: str) -> List[str]:
+        return self.policy.actions_for(_role_key(role), resource)
+
+    def stats(self) -> dict:
+        policy = self._policy
+        return {
+            "compiled": policy is not None,
+            "bits": len(policy.index) if policy else 0,
+            "db_grants": policy.db_rows if policy else 0,
+            "compiled_at": policy.compiled_at if policy else None,
+            "reloads": self.reloads,
+            "reload_failures": self.reload_failures,
+            "invalidations": self.invalidations,
+        }
+
+
+rbac = RBACEngine()
+
+
+def authorize(user, resource: str, action: str) -> bool:
+    """Single RBAC decision point: may `user` perform `action` on `resource`?"""
+    return rbac.authorize(user, resource, action)
+
+
+def invalidate():
+    rbac.invalidate()
@@ -0,0 +1,84 @@
+"""
+Recipient Directory
+In-memory map of role -> active user IDs used to target notifications, so
+fan-out code and scheduler jobs do not query the users table per event.
+
+- The whole map is loaded with one query and kept for RECIPIENT_DIRECTORY_TTL.
+- Writes in routers/users.py (and registration in crud.py) call invalidate();
+  other workers pick up the change within the TTL.
+"""
+
+from threading import Lock
+from typing import Dict, Iterable, Optional, Tuple
+import os
+import time
+
+from sqlalchemy.orm import Session
+
+import models
+
+RECIPIENT_DIRECTORY_TTL = int(os.getenv("RECIPIENT_DIRECTORY_TTL", "300"))  # seconds
+
+
+class RecipientDirectory:
+    """Role -> tuple of active user IDs, reloaded lazily after invalidation/expiry"""
+
+    def __init__(self, ttl: float = RECIPIENT_DIRECTORY_TTL):
+        self.ttl = ttl
+        self._by_role: Optional[Dict[models.UserRole, Tuple[int, ...]]] = None
+        self._loaded_at = 0.0
+        self._lock = Lock()
+        self.loads = 0
+        self.hits = 0
+        self.invalidations = 0
+
+    def _load(self, db: Session) -> Dict[models.UserRole, Tuple[int, ...]]:
+        rows = db.query(models.User.id, models.User.role).filter(
+            models.User.is_active == True
+        ).order_by(models.User.id).all()
+        grouped: Dict[models.UserRole, list] = {role: [] for role in models.UserRole}
+        for user_id, role in rows:
+            if role in grouped:
+                grouped[role].append(user_id)
+        by_role = {role: tuple(ids) for role, ids in grouped.items()}
+        with self._lock:
+            self._by_role = by_role
+            self._loaded_at = time.monotonic()
+            self.loads += 1
+        return by_role
+
+    def _snapshot(self, db: Session) -> Dict[models.UserRole, Tuple[int, ...]]:
+        by_role = self._by_role
+        if by_role is None or time.monotonic() - self._loaded_at > self.ttl:
+            return self._load(db)
+        self.hits += 1
+        return by_role
+
+    def get(self, db: Session, role: models.UserRole) -> Tuple[int, ...]:
+        """Active user IDs for one role"""
+        return self._snapshot(db).get(role, ())
+
+    def resolve(self, db: Session, roles: Iterable[models.UserRole]) -> Dict[models.UserRole, Tuple[int, ...]]:
+        """Active user IDs for several roles: {role: (user_id, ...)}"""
+        by_role = self._snapshot(db)
+        return {role: by_role.get(role, ()) for role in roles}
+
+    def invalidate(self):
+        """Call after creating users or changing role / is_active"""
+        with self._lock:
+            self._by_role = None
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        by_role = self._by_role
+        return {
+            "loaded": by_role is not None,
+            "roles": {role.value: len(ids) for role, ids in by_role.items()} if by_role else {},
+            "loads": self.loads,
+            "hits": self.hits,
+            "invalidations": self.invalidations,
+            "ttl_seconds": self.ttl,
+        }
+
+
+recipient_directory = RecipientDirectory()
@@ -0,0 +1,72 @@
+"""
+Daily Report Utilities
+Shared "who has not submitted" query used by the scheduler and the reports API
+"""
+from datetime import date, timedelta
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import Date, and_, func, literal, select, union_all
+from sqlalchemy.orm import Session
+
+from models import DailyReport, User, UserRole
+
+# Longest range accepted by get_missing_reports (days are inlined into the query)
+MAX_RANGE_DAYS = 366
+
+
+class MissingReport(NamedTuple):
+    report_date: date
+    salesman_id: int
+    full_name: Optional[str]
+    username: str
+
+
+def _days_table(start_date: date, end_date: date):
+    days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    selects = [select(literal(day, Date).label("day")) for day in days]
+    if len(selects) == 1:
+        return selects[0].subquery("days")
+    return union_all(*selects).subquery("days")
+
+
+def get_missing_reports(db: Session, start_date: date, end_date: Optional[date] = None) -> List[MissingReport]:
+    """
+    Active salesmen without a submitted daily report, per day in [start_date, end_date]
+
+    One query: salesmen x days LEFT JOIN daily_reports, keeping rows with no
+    submitted report (anti-join). Ordered by date, then salesman ID.
+    """
+    end_date = end_date or start_date
+    if end_date < start_date:
+        return []
+    if (end_date - start_date).days >= MAX_RANGE_DAYS:
+        raise ValueError(f"Date range too large (max {MAX_RANGE_DAYS} days)")
+
+    days = _days_table(start_date, end_date)
+    query = (
+        select(days.c.day, User.id, User.full_name, User.username)
+        .select_from(User)
+        .join(days, literal(True))
+        .outerjoin(
+            DailyReport,
+            and_(
+                DailyReport.salesman_id == User.id,
+                DailyReport.report_date == days.c.day,
+                DailyReport.report_submitted == True
+            )
+        )
+        .where(
+            User.role == UserRole.SALESMAN,
+            User.is_active == True,
+            DailyReport.id.is_(None)
+        )
+        .order_by(days.c.day, User.id)
+    )
+    return [MissingReport(*row) for row in db.execute(query).all()]
+
+
+def count_active_salesmen(db: Session) -> int:
+    return db.query(func.count(User.id)).filter(
+        User.role == UserRole.SALESMAN,
+        User.is_active == True
+    ).scalar() or 0
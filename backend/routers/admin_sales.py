@@ -6,7 +6,7 @@ from datetime import datetime, timedelta, date
 import schemas
 import models
 import auth
-from database import get_db
+from database import get_read_db
 
 router = APIRouter(prefix="/api/admin/sales-performance", tags=["Admin Sales Performance"])
 
@@ -16,7 +16,7 @@ def get_salesman_performance(
     end_date: Optional[str] = None,
     product_id: Optional[int] = None,
     priority: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
     """Get performance metrics for all salesmen - Admin and Reception only"""
@@ -105,7 +105,7 @@ def get_sales_funnel(
     salesman_id: Optional[int] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
     """Get sales funnel data - Admin and Reception only"""
@@ -147,7 +147,7 @@ def get_single_salesman_performance(
     salesman_id: int,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
     """Get detailed performance for a specific salesman"""
@@ -224,7 +224,7 @@ def get_single_salesman_performance(
 def get_all_daily_reports(
     date: Optional[str] = None,
     salesman_id: Optional[int] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
     """Get revenue report - Admin and Reception only"""
@@ -245,7 +245,7 @@ def get_all_daily_reports(
 
 @router.get("/missing-reports")
 def get_missing_reports(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
     """Get salesmen who haven't submitted today's report"""
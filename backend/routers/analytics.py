@@ -5,7 +5,7 @@ Provides derived analytics for service engineers and admin
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import func, case
-from database import get_db
+from database import get_read_db
 from auth import get_current_user
 from models import User, UserRole, Complaint, Feedback, Attendance, ServiceEngineerDailyReport
 from datetime import datetime, timedelta, date
@@ -24,7 +24,7 @@ def get_my_performance(
     start_date: Optional[str] = Query(None),
     end_date: Optional[str] = Query(None),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get performance analytics for logged-in engineer
@@ -172,7 +172,7 @@ def get_all_engineers_performance(
     engineer_id: Optional[int] = Query(None),
     priority: Optional[str] = Query(None),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get performance analytics for all engineers (Admin only)
@@ -284,7 +284,7 @@ def get_sla_status(
     priority: Optional[str] = Query(None),
     engineer_id: Optional[int] = Query(None),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get current SLA status for all active service requests (Admin/Reception)
@@ -351,7 +351,7 @@ def get_sla_status(
 def get_sla_daily_summary(
     date_param: Optional[str] = Query(None, alias="date"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get daily SLA summary for admin dashboard
@@ -395,7 +395,7 @@ def get_sla_daily_summary(
 @router.get("/dashboard")
 def get_admin_dashboard_analytics(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get analytics for admin dashboard
@@ -2,16 +2,19 @@
 Attendance Management Router
 Handles employee attendance check-in/check-out and status tracking
 """
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, func, select
 from datetime import datetime, date, timedelta
 from typing import List, Optional
 import pytz
 import models
 import schemas
 import crud
-from auth import get_current_user, get_db
+from auth import get_current_user, get_current_user_async, get_db
+from database import get_async_db, run_in_session
 import os
 import shutil
 from pathlib import Path
@@ -28,14 +31,15 @@ UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
 @router.post("/check-in")
 async def check_in_with_photo(
+    background_tasks: BackgroundTasks,
     photo: UploadFile = File(...),
     latitude: float = Form(...),
     longitude: float = Form(...),
     attendance_status: str = Form(...),
     time: str = Form(...),
     location: str = Form(...),
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: models.User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Check in for the day with photo upload
@@ -47,10 +51,11 @@ async def check_in_with_photo(
     today_ist = now_ist.date()
     
     # Check if already checked in today (using attendance_date)
-    existing_attendance = db.query(models.Attendance).filter(
+    result = await db.execute(select(models.Attendance.id).where(
         models.Attendance.employee_id == current_user.id,
         models.Attendance.attendance_date == today_ist
-    ).first()
+    ).limit(1))
+    existing_attendance = result.first()
     
     if existing_attendance:
         raise HTTPException(
@@ -63,8 +68,11 @@ async def check_in_with_photo(
     photo_filename = f"{current_user.id}_{now_ist.strftime('%Y%m%d_%H%M%S')}{file_extension}"
     photo_path = UPLOAD_DIR / photo_filename
     
-    with photo_path.open("wb") as buffer:
-        shutil.copyfileobj(photo.file, buffer)
+    def _save_photo():
+        with photo_path.open("wb") as buffer:
+            shutil.copyfileobj(photo.file, buffer)
+    
+    await run_in_threadpool(_save_photo)
     
     # 📘 DISCIPLINE: Check cutoff time (9:30 AM IST)
     cutoff_time = now_ist.replace(hour=9, minute=30, second=0, microsecond=0)
@@ -85,24 +93,22 @@ async def check_in_with_photo(
     )
     
     db.add(db_attendance)
-    db.commit()
-    db.refresh(db_attendance)
+    await db.commit()
+    await db.refresh(db_attendance)
     
-    # 🔔 Notify admin if late
+    # 🔔 Notify admin if late (sync notification service, runs after the response)
     if is_late:
-        try:
-            from notification_service import NotificationService
-            NotificationService.create_notification(
-                db=db,
-                title=f"⚠️ Late Attendance: {current_user.full_name}",
-                message=f"Checked in at {now_ist.strftime('%I:%M %p')} (after 9:30 AM cutoff)",
-                type="ALERT",
-                user_id=None,
-                role=models.UserRole.ADMIN
-            )
-        except Exception as e:
-            import logging
-            logging.error(f"Failed to send late attendance alert: {e}")
+        from notification_service import NotificationService
+        background_tasks.add_task(
+            run_in_session,
+            NotificationService.notify_role_based,
+            roles=[models.UserRole.ADMIN],
+            title=f"⚠️ Late Attendance: {current_user.full_name}",
+            message=f"Checked in at {now_ist.strftime('%I:%M %p')} (after 9:30 AM cutoff)",
+            notification_type="ALERT",
+            priority="high",
+            module="attendance"
+        )
     
     return {
         "id": db_attendance.id,
@@ -211,14 +217,13 @@ def check_in(
     # 🔔 Notify admin if late
     if is_late:
         try:
-            NotificationService.create_notification(
-                db=db,
-                title=f"⚠️ Late Attendance: {current_user.full_name}",
-                message=f"Checked in at {now.strftime('%I:%M %p')} (after 9:30 AM cutoff)",
-                type="ALERT",
-                user_id=None,
-                role=models.UserRole.ADMIN
-            )
+            NotificationService.notify_roles(db, [models.UserRole.ADMIN], {
+                "title": f"⚠️ Late Attendance: {current_user.full_name}",
+                "message": f"Checked in at {now.strftime('%I:%M %p')} (after 9:30 AM cutoff)",
+                "notification_type": "ALERT",
+                "priority": "high",
+                "module": "attendance"
+            })
         except Exception as e:
             import logging
             logging.error(f"Failed to send late attendance alert: {e}")
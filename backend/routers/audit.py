@@ -3,13 +3,19 @@ Audit Logs Router
 View audit trail of all system actions
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List, Optional
+from sqlalchemy import func, select
+from typing import Iterator, List, Literal, Optional
 from datetime import datetime
-from database import get_db
+import csv
+import io
+import json
+import zlib
+from database import get_read_db
 from models import AuditLog, User, UserRole
+from audit_logger import apply_cursor, make_cursor, parse_cursor
 from auth import get_current_user
 from pydantic import BaseModel
 
@@ -18,6 +24,14 @@ router = APIRouter(
     tags=["Audit Logs"]
 )
 
+MAX_PAGE_SIZE = 500
+
+# Export streaming: rows fetched per server-side cursor round trip, bytes per chunk sent
+EXPORT_FETCH_SIZE = 1000
+EXPORT_CHUNK_BYTES = 64 * 1024
+EXPORT_COLUMNS = ["id", "timestamp", "user_id", "username", "action", "module",
+                  "record_id", "record_type", "changes", "ip_address"]
+
 
 # Schemas
 class AuditLogResponse(BaseModel):
@@ -38,14 +52,21 @@ class AuditLogResponse(BaseModel):
 
 @router.get("/logs", response_model=List[AuditLogResponse])
 def get_audit_logs(
+    response: Response,
     module: Optional[str] = None,
     user_id: Optional[int] = None,
     action: Optional[str] = None,
-    limit: int = 100,
-    db: Session = Depends(get_db),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[str] = Query(None, description="Cursor '<timestamp>,<id>' from X-Next-Cursor"),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get audit logs (Admin and Reception only)"""
+    """
+    Get audit logs (Admin and Reception only)
+    
+    Newest first, keyset-paginated: pass the X-Next-Cursor header of one page
+    as ?before= to get the next one.
+    """
     
     if current_user.role not in [UserRole.ADMIN, UserRole.RECEPTION]:
         raise HTTPException(
@@ -53,7 +74,15 @@ def get_audit_logs(
             detail="Only admin and reception can view audit logs"
         )
     
-    query = db.query(AuditLog).order_by(AuditLog.timestamp.desc())
+    try:
+        cursor = parse_cursor(before)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor, expected before=<timestamp>,<id>"
+        )
+    
+    query = db.query(AuditLog)
     
     if module:
         query = query.filter(AuditLog.module == module)
@@ -64,7 +93,10 @@ def get_audit_logs(
     if action:
         query = query.filter(AuditLog.action == action)
     
-    logs = query.limit(limit).all()
+    logs = apply_cursor(query, cursor).limit(limit).all()
+    
+    if len(logs) == limit:
+        response.headers["X-Next-Cursor"] = make_cursor(logs[-1])
     
     return logs
 
@@ -73,7 +105,7 @@ def get_audit_logs(
 def get_record_history(
     module: str,
     record_id: str,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get complete history of a specific record (Admin and Reception only)"""
@@ -87,14 +119,14 @@ def get_record_history(
     logs = db.query(AuditLog).filter(
         AuditLog.module == module,
         AuditLog.record_id == record_id
-    ).order_by(AuditLog.timestamp.desc()).all()
+    ).order_by(AuditLog.timestamp.desc(), AuditLog.id.desc()).all()
     
     return logs
 
 
 @router.get("/stats")
 def get_audit_stats(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get audit statistics (Admin only)"""
@@ -131,3 +163,115 @@ def get_audit_stats(
         "modules": [{"module": m[0], "count": m[1]} for m in modules],
         "top_users": [{"username": u[0], "count": u[1]} for u in top_users]
     }
+
+
+def _export_rows(filters: list) -> Iterator[tuple]:
+    """Stream matching rows oldest first through a server-side cursor (own session)"""
+    sessions = get_read_db()
+    db = next(sessions)
+    try:
+        columns = [getattr(AuditLog, name) for name in EXPORT_COLUMNS]
+        result = db.execute(
+            select(*columns)
+            .where(*filters)
+            .order_by(AuditLog.timestamp, AuditLog.id)
+            .execution_options(yield_per=EXPORT_FETCH_SIZE)
+        )
+        for row in result:
+            yield row
+    finally:
+        sessions.close()
+
+
+def _encode_csv(rows: Iterator[tuple]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        writer.writerow([value.isoformat() if isinstance(value, datetime) else value for value in row])
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _encode_ndjson(rows: Iterator[tuple]) -> Iterator[str]:
+    lines = []
+    size = 0
+    for row in rows:
+        line = json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=str) + "\n"
+        lines.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield "".join(lines)
+            lines, size = [], 0
+    yield "".join(lines)
+
+
+def _bytes(chunks: Iterator[str], compress: bool) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None  # wbits 31 = gzip container
+    for chunk in chunks:
+        data = chunk.encode("utf-8")
+        if compressor:
+            data = compressor.compress(data)
+        if data:
+            yield data
+    if compressor:
+        yield compressor.flush()
+
+
+@router.get("/export")
+def export_audit_logs(
+    format: Literal["csv", "ndjson"] = "csv",
+    module: Optional[str] = None,
+    user_id: Optional[int] = None,
+    action: Optional[str] = None,
+    start: Optional[datetime] = Query(None, description="Include entries at or after this time"),
+    end: Optional[datetime] = Query(None, description="Include entries before this time"),
+    gzip: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Export the audit trail as CSV or NDJSON (Admin only)
+    
+    Rows are streamed oldest first from a server-side cursor, so memory use does
+    not grow with the export size; gzip=true compresses on the fly.
+    """
+    
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admin can export audit logs"
+        )
+    
+    if start and end and end <= start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end must be after start"
+        )
+    
+    filters = []
+    if module:
+        filters.append(AuditLog.module == module)
+    if user_id:
+        filters.append(AuditLog.user_id == user_id)
+    if action:
+        filters.append(AuditLog.action == action)
+    if start:
+        filters.append(AuditLog.timestamp >= start)
+    if end:
+        filters.append(AuditLog.timestamp < end)
+    
+    encode = _encode_csv if format == "csv" else _encode_ndjson
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"audit_logs_{datetime.utcnow():%Y%m%d_%H%M%S}.{format}"
+    if gzip:
+        media_type = "application/gzip"
+        filename += ".gz"
+    
+    return StreamingResponse(
+        _bytes(encode(_export_rows(filters)), gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
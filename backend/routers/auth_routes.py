@@ -18,7 +18,10 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
             status_code=400,
             detail="Username already registered"
         )
-    return crud.create_user(db=db, user=user)
+    try:
+        return crud.create_user(db=db, user=user)
+    except auth.PasswordPoolBusy:
+        raise auth.password_pool_busy()
 
 @router.post("/login", response_model=schemas.Token)
 def login(
@@ -26,7 +29,10 @@ def login(
     db: Session = Depends(get_db)
 ):
     """Login and get access token"""
-    user = auth.authenticate_user(db, form_data.username, form_data.password)
+    try:
+        user = auth.authenticate_user(db, form_data.username, form_data.password)
+    except auth.PasswordPoolBusy:
+        raise auth.password_pool_busy("Too many login attempts in progress, please retry")
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -36,7 +42,8 @@ def login(
     
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username, "ver": user.token_version or 0},
+        expires_delta=access_token_expires
     )
     
     return {
@@ -3,9 +3,9 @@ Chatbot API Router - Customer Support Chatbot
 Production-ready endpoints for Yamini Infotech ERP
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, update
 from typing import List, Optional
 from datetime import datetime, timedelta
 import uuid
@@ -19,8 +19,11 @@ from services.chatbot_ai import (
     get_vector_store,
     get_mistral_service,
     get_language_detector,
-    get_intent_detector
+    get_intent_detector,
+    knowledge_version,
+    chatbot_warmup
 )
+from services.chatbot_cache import CachedReply, chat_response_cache
 
 router = APIRouter(prefix="/api/chatbot", tags=["chatbot"])
 
@@ -40,6 +43,7 @@ def send_chat_message(
     PUBLIC ENDPOINT - No auth required (customers can chat anonymously)
     """
     print(f"🤖 [CHATBOT] Received message: '{request.message}' from {request.customer_name or 'Anonymous'}")
+    chatbot_warmup.start()  # First chatbot traffic on this worker starts the model load
     
     try:
         print("  Step 1: Getting or creating session...")
@@ -64,10 +68,24 @@ def send_chat_message(
             db.flush()
         print(f"  ✓ Session ID: {session.session_id}")
         
+        # Repeat questions are answered from the response cache (exact text first).
+        # Only on a session's first turn: later replies depend on the conversation
+        # history sent to Mistral, which the cache key does not cover.
+        first_turn = not db.query(models.ChatMessage.id).filter(
+            models.ChatMessage.session_id == session.id
+        ).first()
+        kb_version = knowledge_version(db)
+        cached = None
+        if first_turn:
+            cached = chat_response_cache.get(request.message, request.language, kb_version)
+        
         print("  Step 2: Detecting language...")
         # 2. Detect language if not specified
         lang_detector = get_language_detector()
-        language = request.language or lang_detector.detect_language(request.message)
+        if cached:
+            language = cached.language
+        else:
+            language = request.language or lang_detector.detect_language(request.message)
         print(f"  ✓ Language: {language}")
         
         # Update session language if changed
@@ -85,22 +103,39 @@ def send_chat_message(
         db.add(customer_msg)
         print("  ✓ Message saved")
         
+        # Semantic cache: a close enough earlier question in the same language.
+        # Skipped until the embedding model is loaded so it never blocks a request.
+        query_embedding = None
+        if first_turn and not cached:
+            if chatbot_warmup.ready:
+                try:
+                    query_embedding = get_vector_store().embedding_service.encode(request.message)
+                    cached = chat_response_cache.get_semantic(query_embedding, language, kb_version)
+                except Exception as e:
+                    print(f"  ⚠️ Semantic cache lookup failed: {e}")
+            else:
+                chat_response_cache.miss()
+        
         print("  Step 4: Vector search...")
         # 4. Vector search for relevant knowledge
         relevant_docs = []
-        try:
-            # Skip vector search for now - using simple fallback
-            print("  ⚠️ Skipping vector search (using fallback mode)")
-            # vector_store = get_vector_store()
-            # relevant_docs = vector_store.search(
-            #     query=request.message,
-            #     language=language,
-            #     top_k=5
-            # )
-            print(f"  ✓ Using fallback mode (0 vector documents)")
-        except Exception as e:
-            print(f"  ⚠️ Vector search failed: {e}, continuing without context")
-            relevant_docs = []
+        if cached:
+            relevant_docs = [{'id': doc_id} for doc_id in cached.doc_ids]
+            print(f"  ✓ Cached reply ({len(relevant_docs)} vector documents)")
+        else:
+            try:
+                # Skip vector search for now - using simple fallback
+                print("  ⚠️ Skipping vector search (using fallback mode)")
+                # vector_store = get_vector_store()
+                # relevant_docs = vector_store.search(
+                #     query=request.message,
+                #     language=language,
+                #     top_k=5
+                # )
+                print(f"  ✓ Using fallback mode (0 vector documents)")
+            except Exception as e:
+                print(f"  ⚠️ Vector search failed: {e}, continuing without context")
+                relevant_docs = []
         
         print("  Step 5: Getting conversation history...")
         # 5. Get conversation history
@@ -117,14 +152,18 @@ def send_chat_message(
         
         print("  Step 6: Generating AI response with Mistral...")
         # 6. Generate AI response
-        mistral_service = get_mistral_service()
-        reply_text, confidence = mistral_service.generate_response(
-            user_message=request.message,
-            context_docs=relevant_docs,
-            language=language,
-            conversation_history=conversation_history
-        )
-        print(f"  ✓ AI Response generated (confidence: {confidence})")
+        if cached:
+            reply_text, confidence = cached.reply, cached.confidence
+            print(f"  ✓ AI Response from cache (confidence: {confidence})")
+        else:
+            mistral_service = get_mistral_service()
+            reply_text, confidence = mistral_service.generate_response(
+                user_message=request.message,
+                context_docs=relevant_docs,
+                language=language,
+                conversation_history=conversation_history
+            )
+            print(f"  ✓ AI Response generated (confidence: {confidence})")
         
         # 7. Detect intent
         intent_detector = get_intent_detector()
@@ -135,6 +174,21 @@ def send_chat_message(
             request.message, confidence
         )
         
+        # Only confident first-turn answers are reused; handoffs depend on the customer
+        if first_turn and not cached and not should_handoff:
+            chat_response_cache.put(
+                request.message,
+                request.language,
+                CachedReply(
+                    reply=reply_text,
+                    confidence=confidence,
+                    language=language,
+                    doc_ids=[doc['id'] for doc in relevant_docs]
+                ),
+                kb_version,
+                query_embedding
+            )
+        
         # 9. Save bot response
         bot_msg = models.ChatMessage(
             session_id=session.id,
@@ -155,7 +209,7 @@ def send_chat_message(
         
         if intent in ['enquiry', 'service'] and confidence > 0.6:
             enquiry = models.Enquiry(
-                enquiry_id=f"ENQ-CHAT-{datetime.now().strftime('%Y%m%d%H%M%S')}",
+                enquiry_id=f"ENQ-CHAT-{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:4].upper()}",
                 customer_name=request.customer_name or "Chat Customer",
                 phone=request.customer_phone,
                 email=request.customer_email,
@@ -201,14 +255,18 @@ def send_chat_message(
             # Rolling average
             session.avg_confidence = (session.avg_confidence * 0.8) + (confidence * 0.2)
         
-        # 13. Update knowledge usage stats
-        for doc in relevant_docs:
-            kb_doc = db.query(models.ChatbotKnowledge).filter(
-                models.ChatbotKnowledge.id == doc['id']
-            ).first()
-            if kb_doc:
-                kb_doc.usage_count += 1
-                kb_doc.last_used_at = datetime.utcnow()
+        # 13. Update knowledge usage stats (keeps updated_at, so knowledge_version does not move)
+        if relevant_docs:
+            knowledge = models.ChatbotKnowledge
+            db.execute(
+                update(knowledge)
+                .where(knowledge.id.in_({doc['id'] for doc in relevant_docs}))
+                .values(
+                    usage_count=func.coalesce(knowledge.usage_count, 0) + 1,
+                    last_used_at=datetime.utcnow(),
+                    updated_at=knowledge.updated_at
+                )
+            )
         
         db.commit()
         
@@ -277,6 +335,19 @@ def request_handoff(
     return {"message": "Handoff request created", "status": "pending"}
 
 
+@router.get("/ready")
+def chatbot_ready(response: Response):
+    """
+    Readiness probe for the embedding model / vector index
+    
+    Starts the background load on first call; 503 until the model is ready.
+    """
+    chatbot_warmup.start()
+    if not chatbot_warmup.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return chatbot_warmup.status()
+
+
 # ============================================================================
 # ADMIN ENDPOINTS - Knowledge Management
 # ============================================================================
@@ -311,6 +382,7 @@ def create_knowledge(
 ):
     """Create new knowledge document - Admin only"""
     
+    indexed_version = knowledge_version(db)
     kb = models.ChatbotKnowledge(
         **knowledge.dict(),
         created_by=current_user.id,
@@ -320,8 +392,9 @@ def create_knowledge(
     db.commit()
     db.refresh(kb)
     
-    # Rebuild vector index
-    _rebuild_vector_index(db)
+    # Add to vector index
+    _index_knowledge(db, kb, indexed_version)
+    chat_response_cache.invalidate()
     
     return kb
 
@@ -342,6 +415,7 @@ def update_knowledge(
     if not kb:
         raise HTTPException(status_code=404, detail="Knowledge document not found")
     
+    indexed_version = knowledge_version(db)
     for field, value in knowledge.dict(exclude_unset=True).items():
         setattr(kb, field, value)
     
@@ -351,8 +425,9 @@ def update_knowledge(
     db.commit()
     db.refresh(kb)
     
-    # Rebuild vector index
-    _rebuild_vector_index(db)
+    # Re-index this document only
+    _index_knowledge(db, kb, indexed_version)
+    chat_response_cache.invalidate()
     
     return kb
 
@@ -372,11 +447,13 @@ def delete_knowledge(
     if not kb:
         raise HTTPException(status_code=404, detail="Knowledge document not found")
     
+    indexed_version = knowledge_version(db)
     db.delete(kb)
     db.commit()
     
-    # Rebuild vector index
-    _rebuild_vector_index(db)
+    # Remove from vector index
+    _unindex_knowledge(db, kb_id, indexed_version)
+    chat_response_cache.invalidate()
     
     return {"message": "Knowledge document deleted"}
 
@@ -389,8 +466,9 @@ def rebuild_vector_index(
     """Manually rebuild FAISS vector index - Admin only"""
     
     try:
-        _rebuild_vector_index(db)
-        return {"message": "Vector index rebuilt successfully"}
+        vector_store = _rebuild_vector_index(db)
+        chat_response_cache.invalidate()
+        return {"message": "Vector index rebuilt successfully", **vector_store.stats()}
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -402,6 +480,23 @@ def rebuild_vector_index(
 # ADMIN ENDPOINTS - Monitoring & Analytics
 # ============================================================================
 
+@router.get("/cache")
+def get_response_cache_stats(
+    current_user = Depends(require_admin)
+):
+    """Response cache hit / miss counters for this worker - Admin only"""
+    return chat_response_cache.stats()
+
+
+@router.post("/cache/clear")
+def clear_response_cache(
+    current_user = Depends(require_admin)
+):
+    """Drop all cached chatbot replies on this worker - Admin only"""
+    chat_response_cache.invalidate()
+    return {"message": "Response cache cleared", **chat_response_cache.stats()}
+
+
 @router.get("/sessions", response_model=List[schemas.ChatSessionInfo])
 def list_chat_sessions(
     status: Optional[str] = None,
@@ -554,8 +649,20 @@ def get_chatbot_analytics(
 # HELPER FUNCTIONS
 # ============================================================================
 
+def _save_embeddings(db: Session, updates: dict):
+    """Persist re-computed embeddings without touching updated_at"""
+    for kb_id, columns in updates.items():
+        db.execute(
+            update(models.ChatbotKnowledge)
+            .where(models.ChatbotKnowledge.id == kb_id)
+            .values(**columns, updated_at=models.ChatbotKnowledge.updated_at)
+        )
+    if updates:
+        db.commit()
+
+
 def _rebuild_vector_index(db: Session):
-    """Rebuild FAISS vector index from database"""
+    """Rebuild FAISS vector index from database (re-encodes changed documents only)"""
     vector_store = get_vector_store()
     
     # Get all active knowledge documents
@@ -563,22 +670,50 @@ def _rebuild_vector_index(db: Session):
         models.ChatbotKnowledge.is_active == True
     ).all()
     
-    # Convert to dict format
-    doc_list = [
-        {
-            'id': doc.id,
-            'title': doc.title,
-            'content': doc.content,
-            'content_en': doc.content_en,
-            'content_ta': doc.content_ta,
-            'category': doc.category,
-            'keywords': doc.keywords,
-            'is_active': doc.is_active
-        }
-        for doc in docs
-    ]
-    
-    vector_store.rebuild_index(doc_list)
+    _save_embeddings(db, vector_store.rebuild_index(docs))
+    vector_store.save_snapshot(knowledge_version(db))
+    return vector_store
+
+
+def _sync_vector_index(db: Session, indexed_version: str):
+    """
+    Vector store that can take an incremental change on top of indexed_version
+    
+    Returns None when the in-memory index is not at that version (never
+    built, or another worker changed the knowledge base); the caller then
+    maps the newer snapshot or rebuilds instead.
+    """
+    vector_store = get_vector_store()
+    if vector_store.built and vector_store.version == indexed_version:
+        return vector_store
+    if not vector_store.load_snapshot(knowledge_version(db)):
+        _rebuild_vector_index(db)
+    return None
+
+
+def _index_knowledge(db: Session, kb: models.ChatbotKnowledge, indexed_version: str):
+    """Add / replace / drop one document in the vector index after a KB write"""
+    try:
+        vector_store = _sync_vector_index(db, indexed_version)
+        if vector_store is None:
+            return
+        updates = vector_store.upsert_knowledge(kb)
+        _save_embeddings(db, {kb.id: updates} if updates else {})
+        vector_store.save_snapshot(knowledge_version(db))
+    except Exception as e:
+        print(f"⚠️ Vector index update failed for knowledge {kb.id}: {e}")
+
+
+def _unindex_knowledge(db: Session, kb_id: int, indexed_version: str):
+    """Remove a deleted document from the vector index"""
+    try:
+        vector_store = _sync_vector_index(db, indexed_version)
+        if vector_store is None:
+            return
+        vector_store.remove_document(kb_id)
+        vector_store.save_snapshot(knowledge_version(db))
+    except Exception as e:
+        print(f"⚠️ Vector index removal failed for knowledge {kb_id}: {e}")
 
 
 def _generate_suggestions(intent: str, language: str) -> List[str]:
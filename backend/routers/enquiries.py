@@ -162,14 +162,14 @@ def create_followup(
     if pending_count >= 5 and enquiry.status == "NEW":
         # Send alert to reception
         try:
-            NotificationService.create_notification(
-                db=db,
-                title=f"⚠️ Excessive Follow-ups: {enquiry.customer_name}",
-                message=f"Enquiry #{enquiry.enquiry_id} has {pending_count} pending follow-ups without conversion by {current_user.full_name}",
-                type="ALERT",
-                user_id=None,  # To all reception
-                role=models.UserRole.RECEPTION
-            )
+            NotificationService.notify_roles(db, [models.UserRole.RECEPTION], {
+                "title": f"⚠️ Excessive Follow-ups: {enquiry.customer_name}",
+                "message": f"Enquiry #{enquiry.enquiry_id} has {pending_count} pending follow-ups without conversion by {current_user.full_name}",
+                "notification_type": "ALERT",
+                "priority": "high",
+                "module": "enquiries",
+                "action_url": f"/enquiries/{enquiry.id}"
+            })
         except Exception as e:
             import logging
             logging.error(f"Failed to send follow-up alert: {e}")
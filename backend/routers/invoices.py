@@ -11,7 +11,7 @@ from datetime import datetime
 import models
 import schemas
 import auth
-from database import get_db
+from database import get_db, get_read_db
 from audit_logger import log_action
 
 router = APIRouter(prefix="/api/invoices", tags=["Invoices"])
@@ -236,7 +236,7 @@ def export_invoice(
 
 @router.get("/outstanding/summary", response_model=dict)
 def get_outstanding_summary(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(auth.require_admin_or_reception)
 ):
     """Get outstanding payments summary"""
@@ -1,14 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 import shutil
 import os
 from pathlib import Path
 from datetime import datetime
 from pydantic import BaseModel
-from database import get_db
-from models import Product, User, UserRole
-from auth import get_current_user
+from database import get_async_db
+from models import Product, User
+from auth import get_current_user_async
+from rbac import authorize, rbac
 import json
 
 router = APIRouter(prefix="/api/products", tags=["Product Management"])
@@ -63,34 +66,16 @@ class ProductUpdate(BaseModel):
     internal_notes: Optional[str] = None
 
 # Helper function to check permissions
-def has_permission(user: User, permission_code: str, db: Session) -> bool:
-    """Check if user has specific permission based on role"""
-    if not user.role:
-        return False
-    
-    # Admin has all permissions
-    if user.role == UserRole.ADMIN:
-        return True
-    
-    # Office staff has all product permissions
-    if user.role == UserRole.OFFICE_STAFF:
-        return True
-    
-    # Salesman can view but not edit internal data
-    if user.role == UserRole.SALESMAN:
-        if permission_code in ['VIEW_PRODUCT', 'VIEW_PRICING']:
-            return True
-        return False
-    
-    return False
+def has_permission(user: User, permission_code: str) -> bool:
+    """Check if user has specific permission based on role (static matrix + role_permissions)"""
+    return authorize(user, "permission", permission_code)
 
 # Dependency for checking product management permission
 def require_product_permission(permission: str):
     async def permission_checker(
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        current_user: User = Depends(get_current_user_async)
     ):
-        if not has_permission(current_user, permission, db):
+        if not has_permission(current_user, permission):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"You don't have {permission} permission"
@@ -102,7 +87,7 @@ def require_product_permission(permission: str):
 async def create_product(
     product: ProductCreate,
     current_user: User = Depends(require_product_permission("ADD_PRODUCT")),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new product (Admin/Office Staff only)"""
     
@@ -128,22 +113,22 @@ async def create_product(
     )
     
     db.add(new_product)
-    db.commit()
-    db.refresh(new_product)
+    await db.commit()
+    await db.refresh(new_product)
     
     # Add internal data if provided
-    if has_permission(current_user, "VIEW_INTERNAL_DATA", db):
-        db.execute("""
+    if has_permission(current_user, "VIEW_INTERNAL_DATA"):
+        await db.execute(text("""
             INSERT INTO product_internal (product_id, purchase_cost, vendor_name, stock_quantity, internal_notes)
             VALUES (:pid, :cost, :vendor, :stock, :notes)
-        """, {
+        """), {
             "pid": new_product.id,
             "cost": product.purchase_cost,
             "vendor": product.vendor_name,
             "stock": product.stock_quantity,
             "notes": product.internal_notes
         })
-        db.commit()
+        await db.commit()
     
     return {
         "message": "Product created successfully",
@@ -156,12 +141,12 @@ async def update_product(
     product_id: int,
     product: ProductUpdate,
     current_user: User = Depends(require_product_permission("EDIT_PRODUCT")),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update an existing product (Admin/Office Staff only)"""
     
     # Get existing product
-    existing_product = db.query(Product).filter(Product.id == product_id).first()
+    existing_product = await db.get(Product, product_id)
     if not existing_product:
         raise HTTPException(status_code=404, detail="Product not found")
     
@@ -176,11 +161,11 @@ async def update_product(
     for field, value in update_data.items():
         setattr(existing_product, field, value)
     
-    db.commit()
-    db.refresh(existing_product)
+    await db.commit()
+    await db.refresh(existing_product)
     
     # Update internal data if user has permission
-    if has_permission(current_user, "VIEW_INTERNAL_DATA", db):
+    if has_permission(current_user, "VIEW_INTERNAL_DATA"):
         internal_updates = {}
         if product.purchase_cost is not None:
             internal_updates['purchase_cost'] = product.purchase_cost
@@ -193,22 +178,22 @@ async def update_product(
         
         if internal_updates:
             # Check if internal record exists
-            exists = db.execute(
-                "SELECT id FROM product_internal WHERE product_id = :pid",
+            exists = (await db.execute(
+                text("SELECT id FROM product_internal WHERE product_id = :pid"),
                 {"pid": product_id}
-            ).fetchone()
+            )).fetchone()
             
             if exists:
                 set_clause = ", ".join([f"{k} = :{k}" for k in internal_updates.keys()])
-                db.execute(
-                    f"UPDATE product_internal SET {set_clause} WHERE product_id = :pid",
+                await db.execute(
+                    text(f"UPDATE product_internal SET {set_clause} WHERE product_id = :pid"),
                     {**internal_updates, "pid": product_id}
                 )
             else:
-                db.execute("""
+                await db.execute(text("""
                     INSERT INTO product_internal (product_id, purchase_cost, vendor_name, stock_quantity, internal_notes)
                     VALUES (:pid, :cost, :vendor, :stock, :notes)
-                """, {
+                """), {
                     "pid": product_id,
                     "cost": internal_updates.get('purchase_cost'),
                     "vendor": internal_updates.get('vendor_name'),
@@ -216,7 +201,7 @@ async def update_product(
                     "notes": internal_updates.get('internal_notes')
                 })
             
-            db.commit()
+            await db.commit()
     
     return {
         "message": "Product updated successfully",
@@ -227,16 +212,16 @@ async def update_product(
 async def delete_product(
     product_id: int,
     current_user: User = Depends(require_product_permission("DELETE_PRODUCT")),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a product (Admin only)"""
     
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await db.get(Product, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    db.delete(product)
-    db.commit()
+    await db.delete(product)
+    await db.commit()
     
     return {"message": "Product deleted successfully"}
 
@@ -244,15 +229,15 @@ async def delete_product(
 async def get_product_internal_data(
     product_id: int,
     current_user: User = Depends(require_product_permission("VIEW_INTERNAL_DATA")),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get confidential product data (Admin/Office Staff only)"""
     
-    internal_data = db.execute("""
+    internal_data = (await db.execute(text("""
         SELECT purchase_cost, vendor_name, stock_quantity, internal_notes, last_updated
         FROM product_internal
         WHERE product_id = :pid
-    """, {"pid": product_id}).fetchone()
+    """), {"pid": product_id})).fetchone()
     
     if not internal_data:
         return {"message": "No internal data found for this product"}
@@ -271,12 +256,12 @@ async def upload_product_image(
     file: UploadFile = File(...),
     is_primary: bool = Form(False),
     current_user: User = Depends(require_product_permission("EDIT_PRODUCT")),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Upload product image (Admin/Office Staff only)"""
     
     # Verify product exists
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await db.get(Product, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
@@ -292,16 +277,19 @@ async def upload_product_image(
     file_name = f"product_{product_id}_{timestamp}{file_ext}"
     file_path = upload_dir / file_name
     
-    try:
+    def _save_upload():
         with file_path.open("wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
+    
+    try:
+        await run_in_threadpool(_save_upload)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
     
     # Update product image_url
     image_url = f"/assets/products/{file_name}"
     product.image_url = image_url
-    db.commit()
+    await db.commit()
     
     return {
         "message": "Image uploaded successfully",
@@ -310,59 +298,15 @@ async def upload_product_image(
 
 @router.get("/permissions/check")
 async def check_user_permissions(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async)
 ):
     """Get current user's product management permissions"""
     
     if not current_user.role:
         return {"permissions": []}
     
-    # ADMIN GOD MODE - has all permissions
-    if current_user.role == UserRole.ADMIN:
-        return {
-            "permissions": [
-                "ADD_PRODUCT",
-                "EDIT_PRODUCT",
-                "DELETE_PRODUCT",
-                "VIEW_INTERNAL_DATA",
-                "MANAGE_STOCK",
-                "MANAGE_PRICING",
-                "MANAGE_SERVICES"
-            ],
-            "role": "ADMIN"
-        }
-    
-    # Map UserRole enum to role name
-    role_name_map = {
-        "admin": "ADMIN",
-        "reception": "RECEPTION",
-        "salesman": "SALESMAN",
-        "service_engineer": "SERVICE_ENGINEER",
-        "customer": "CUSTOMER"
-    }
-    
-    role_name = role_name_map.get(current_user.role.value, "CUSTOMER")
-    
-    from sqlalchemy import text
-    # Get role_id from role name
-    role_result = db.execute(
-        text("SELECT id FROM roles WHERE role_name = :role_name"),
-        {"role_name": role_name}
-    ).fetchone()
-    
-    if not role_result:
-        return {"permissions": []}
-    
-    role_id = role_result[0]
-    
-    # Get permissions for this role
-    permissions = db.execute(
-        text("SELECT permission_code FROM role_permissions WHERE role_id = :role_id"),
-        {"role_id": role_id}
-    ).fetchall()
-    
+    # ADMIN GOD MODE is compiled into the policy (admin holds every code)
     return {
-        "permissions": [p[0] for p in permissions],
-        "role": role_name
+        "permissions": rbac.actions_for(current_user.role, "permission"),
+        "role": current_user.role.value
     }
@@ -5,12 +5,13 @@ Handles salesman daily report submission and tracking
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from datetime import date, datetime, timedelta
-from database import get_db
+from database import get_db, get_read_db
 from models import DailyReport, User, UserRole
 from auth import get_current_user
 from audit_logger import log_create, log_view
+import report_utils
 from pydantic import BaseModel
 
 router = APIRouter(
@@ -243,10 +244,12 @@ def get_all_reports(
 
 @router.get("/daily/missing")
 def get_missing_reports(
-    db: Session = Depends(get_db),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get salesmen who haven't submitted today's report (Reception/Admin only)"""
+    """Get salesmen who haven't submitted today's (or each day's in a range) report (Reception/Admin only)"""
     
     if current_user.role not in [UserRole.ADMIN, UserRole.RECEPTION]:
         raise HTTPException(
@@ -254,34 +257,29 @@ def get_missing_reports(
             detail="Only admin and reception can check missing reports"
         )
     
-    today = date.today()
-    
-    # Get all active salesmen
-    salesmen = db.query(User).filter(
-        User.role == UserRole.SALESMAN,
-        User.is_active == True
-    ).all()
-    
-    missing_reports = []
-    
-    for salesman in salesmen:
-        # Check if report exists
-        report = db.query(DailyReport).filter(
-            DailyReport.salesman_id == salesman.id,
-            DailyReport.report_date == today
-        ).first()
-        
-        if not report or not report.report_submitted:
-            missing_reports.append({
-                "salesman_id": salesman.id,
-                "salesman_name": salesman.full_name or salesman.username,
-                "username": salesman.username,
-                "status": "Not Submitted"
-            })
+    start_date = start_date or date.today()
+    end_date = end_date or start_date
+    
+    try:
+        missing = report_utils.get_missing_reports(db, start_date, end_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    missing_reports = [
+        {
+            "salesman_id": row.salesman_id,
+            "salesman_name": row.full_name or row.username,
+            "username": row.username,
+            "report_date": row.report_date,
+            "status": "Not Submitted"
+        }
+        for row in missing
+    ]
     
     return {
-        "date": today,
-        "total_salesmen": len(salesmen),
+        "date": start_date,
+        "end_date": end_date,
+        "total_salesmen": report_utils.count_active_salesmen(db),
         "missing_count": len(missing_reports),
         "missing_reports": missing_reports
     }
@@ -290,7 +288,7 @@ def get_missing_reports(
 @router.get("/daily/stats")
 def get_report_stats(
     days: int = 30,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get daily report statistics (Admin/Reception only)"""
@@ -5,15 +5,18 @@ RBAC: Strict enforcement - no access to enquiries, MIF, stock, invoices, or sale
 """
 
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, func, select
 from typing import List, Optional
 from datetime import datetime, date, timedelta
 import schemas
 import models
 import auth
-from database import get_db
+from database import get_async_db, run_in_session
+from principal_cache import principal_cache
 from notification_service import NotificationService
+from sla_timer import sla_timer
 
 router = APIRouter(prefix="/api/service-engineer", tags=["Service Engineer"])
 
@@ -22,7 +25,7 @@ router = APIRouter(prefix="/api/service-engineer", tags=["Service Engineer"])
 # ============================================================================
 
 async def require_service_engineer_role(
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: models.User = Depends(auth.get_current_user_async)
 ):
     """Enforce Service Engineer role"""
     if current_user.role != models.UserRole.SERVICE_ENGINEER:
@@ -34,15 +37,19 @@ async def require_service_engineer_role(
 
 async def require_service_engineer_attendance(
     current_user: models.User = Depends(require_service_engineer_role),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Enforce attendance check for service engineers"""
     today = date.today()
     
-    attendance = db.query(models.Attendance).filter(
+    if principal_cache.get_attendance(current_user.id, today) is not None:
+        return current_user
+    
+    result = await db.execute(select(models.Attendance.id).where(
         models.Attendance.employee_id == current_user.id,
         func.date(models.Attendance.date) == today
-    ).first()
+    ).limit(1))
+    attendance = result.first()
     
     if not attendance:
         raise HTTPException(
@@ -50,6 +57,7 @@ async def require_service_engineer_attendance(
             detail="Please mark your attendance before accessing service jobs"
         )
     
+    principal_cache.put_attendance(current_user.id, today, attendance.id)
     return current_user
 
 # ============================================================================
@@ -58,15 +66,16 @@ async def require_service_engineer_attendance(
 
 @router.get("/dashboard")
 async def get_service_engineer_dashboard(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(require_service_engineer_attendance)
 ):
     """Get Service Engineer dashboard with KPIs and assigned jobs"""
     
     # Get all assigned jobs
-    all_jobs = db.query(models.Complaint).filter(
+    result = await db.execute(select(models.Complaint).where(
         models.Complaint.assigned_to == current_user.id
-    ).all()
+    ))
+    all_jobs = result.scalars().all()
     
     today = datetime.utcnow().date()
     
@@ -117,19 +126,19 @@ async def get_service_engineer_dashboard(
 @router.get("/jobs")
 async def get_assigned_jobs(
     status: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(require_service_engineer_attendance)
 ):
     """Get all jobs assigned to current service engineer"""
     
-    query = db.query(models.Complaint).filter(
+    query = select(models.Complaint).where(
         models.Complaint.assigned_to == current_user.id
     )
     
     if status:
-        query = query.filter(models.Complaint.status == status)
+        query = query.where(models.Complaint.status == status)
     
-    jobs = query.order_by(models.Complaint.sla_time.asc()).all()
+    jobs = (await db.execute(query.order_by(models.Complaint.sla_time.asc()))).scalars().all()
     
     result = []
     for job in jobs:
@@ -169,15 +178,16 @@ async def get_assigned_jobs(
 @router.get("/jobs/{job_id}")
 async def get_job_details(
     job_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(require_service_engineer_attendance)
 ):
     """Get specific job details - only if assigned to current engineer"""
     
-    job = db.query(models.Complaint).filter(
+    result = await db.execute(select(models.Complaint).where(
         models.Complaint.id == job_id,
         models.Complaint.assigned_to == current_user.id
-    ).first()
+    ))
+    job = result.scalars().first()
     
     if not job:
         raise HTTPException(
@@ -227,15 +237,16 @@ async def update_job_status(
     job_id: int,
     update: schemas.ComplaintUpdate,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(require_service_engineer_attendance)
 ):
     """Update job status - only for assigned jobs"""
     
-    job = db.query(models.Complaint).filter(
+    result = await db.execute(select(models.Complaint).where(
         models.Complaint.id == job_id,
         models.Complaint.assigned_to == current_user.id
-    ).first()
+    ))
+    job = result.scalars().first()
     
     if not job:
         raise HTTPException(
@@ -271,13 +282,15 @@ async def update_job_status(
     if update.parts_replaced:
         job.parts_replaced = update.parts_replaced
     
-    db.commit()
-    db.refresh(job)
+    await db.commit()
+    await db.refresh(job)
+    sla_timer.track(job)  # ON_HOLD pauses, resume reschedules, COMPLETED cancels
     
-    # Notify admin/reception of status change
+    # Notify admin/reception of status change (sync service, own session, off the event loop)
     background_tasks.add_task(
+        run_in_session,
         NotificationService.notify_service_updated,
-        db, job, current_user.full_name
+        job, current_user.full_name
     )
     
     return {"message": "Job status updated successfully", "job": job}
@@ -291,15 +304,16 @@ async def complete_job(
     job_id: int,
     completion_data: schemas.ServiceCompleteRequest,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(require_service_engineer_attendance)
 ):
     """Complete job and generate feedback QR/link"""
     
-    job = db.query(models.Complaint).filter(
+    result = await db.execute(select(models.Complaint).where(
         models.Complaint.id == job_id,
         models.Complaint.assigned_to == current_user.id
-    ).first()
+    ))
+    job = result.scalars().first()
     
     if not job:
         raise HTTPException(
@@ -334,21 +348,26 @@ async def complete_job(
     FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
     feedback_url = f"{FRONTEND_URL}/feedback/{job.id}"
     
-    qr = qrcode.make(feedback_url)
-    buffer = BytesIO()
-    qr.save(buffer, format="PNG")
-    feedback_qr = base64.b64encode(buffer.getvalue()).decode()
+    def _render_qr() -> str:
+        qr = qrcode.make(feedback_url)
+        buffer = BytesIO()
+        qr.save(buffer, format="PNG")
+        return base64.b64encode(buffer.getvalue()).decode()
+    
+    feedback_qr = await run_in_threadpool(_render_qr)
     
     job.feedback_url = feedback_url
     job.feedback_qr = feedback_qr
     
-    db.commit()
-    db.refresh(job)
+    await db.commit()
+    await db.refresh(job)
+    sla_timer.cancel(job.id)
     
     # Notify admin and reception
     background_tasks.add_task(
+        run_in_session,
         NotificationService.notify_service_completed,
-        db, job, current_user.full_name
+        job, current_user.full_name
     )
     
     return {
@@ -365,18 +384,19 @@ async def complete_job(
 @router.get("/history")
 async def get_service_history(
     days: int = 30,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(require_service_engineer_attendance)
 ):
     """Get service history for current engineer"""
     
     cutoff_date = datetime.utcnow() - timedelta(days=days)
     
-    jobs = db.query(models.Complaint).filter(
+    result = await db.execute(select(models.Complaint).where(
         models.Complaint.assigned_to == current_user.id,
         models.Complaint.status == "COMPLETED",
         models.Complaint.completed_at >= cutoff_date
-    ).order_by(models.Complaint.completed_at.desc()).all()
+    ).order_by(models.Complaint.completed_at.desc()))
+    jobs = result.scalars().all()
     
     return [
         {
@@ -398,33 +418,27 @@ async def get_service_history(
 
 @router.get("/feedback")
 async def get_my_feedback(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(require_service_engineer_attendance)
 ):
     """Get feedback for jobs completed by current engineer"""
     
-    # Get all completed jobs by this engineer
-    job_ids = db.query(models.Complaint.id).filter(
-        models.Complaint.assigned_to == current_user.id,
-        models.Complaint.status == "COMPLETED"
-    ).all()
-    
-    job_ids = [j[0] for j in job_ids]
-    
-    feedbacks = db.query(models.Feedback).filter(
-        models.Feedback.service_request_id.in_(job_ids)
-    ).order_by(models.Feedback.created_at.desc()).all()
+    # Feedback on completed jobs by this engineer, joined with the ticket number
+    rows = await db.execute(
+        select(models.Feedback, models.Complaint.ticket_no)
+        .join(models.Complaint, models.Complaint.id == models.Feedback.service_request_id)
+        .where(
+            models.Complaint.assigned_to == current_user.id,
+            models.Complaint.status == "COMPLETED"
+        )
+        .order_by(models.Feedback.created_at.desc())
+    )
     
-    # Join with job details
     result = []
-    for feedback in feedbacks:
-        job = db.query(models.Complaint).filter(
-            models.Complaint.id == feedback.service_request_id
-        ).first()
-        
+    for feedback, ticket_no in rows.all():
         result.append({
             "id": feedback.id,
-            "ticket_no": job.ticket_no if job else None,
+            "ticket_no": ticket_no,
             "customer_name": feedback.customer_name,
             "rating": feedback.rating,
             "comment": feedback.comment,
@@ -441,7 +455,7 @@ async def get_my_feedback(
 @router.post("/daily-report")
 async def submit_daily_report(
     report: schemas.ServiceEngineerDailyReportCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(require_service_engineer_attendance)
 ):
     """Submit end-of-day report - one per day"""
@@ -449,10 +463,11 @@ async def submit_daily_report(
     today = date.today()
     
     # Check if report already exists for today
-    existing = db.query(models.ServiceEngineerDailyReport).filter(
+    result = await db.execute(select(models.ServiceEngineerDailyReport).where(
         models.ServiceEngineerDailyReport.engineer_id == current_user.id,
         models.ServiceEngineerDailyReport.report_date == today
-    ).first()
+    ))
+    existing = result.scalars().first()
     
     if existing:
         raise HTTPException(
@@ -472,24 +487,25 @@ async def submit_daily_report(
     )
     
     db.add(db_report)
-    db.commit()
-    db.refresh(db_report)
+    await db.commit()
+    await db.refresh(db_report)
     
     return {"message": "Daily report submitted successfully", "report": db_report}
 
 @router.get("/daily-report/status")
 async def check_daily_report_status(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(require_service_engineer_attendance)
 ):
     """Check if engineer has submitted daily report today"""
     
     today = date.today()
     
-    report = db.query(models.ServiceEngineerDailyReport).filter(
+    result = await db.execute(select(models.ServiceEngineerDailyReport).where(
         models.ServiceEngineerDailyReport.engineer_id == current_user.id,
         models.ServiceEngineerDailyReport.report_date == today
-    ).first()
+    ))
+    report = result.scalars().first()
     
     return {
         "submitted_today": report is not None,
@@ -499,17 +515,18 @@ async def check_daily_report_status(
 @router.get("/daily-report")
 async def get_my_daily_reports(
     days: int = 7,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(require_service_engineer_attendance)
 ):
     """Get daily reports for current engineer"""
     
     cutoff_date = date.today() - timedelta(days=days)
     
-    reports = db.query(models.ServiceEngineerDailyReport).filter(
+    result = await db.execute(select(models.ServiceEngineerDailyReport).where(
         models.ServiceEngineerDailyReport.engineer_id == current_user.id,
         models.ServiceEngineerDailyReport.report_date >= cutoff_date
-    ).order_by(models.ServiceEngineerDailyReport.report_date.desc()).all()
+    ).order_by(models.ServiceEngineerDailyReport.report_date.desc()))
+    reports = result.scalars().all()
     
     return reports
 
@@ -519,15 +536,16 @@ async def get_my_daily_reports(
 
 @router.get("/sla-tracker")
 async def get_sla_tracker(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(require_service_engineer_attendance)
 ):
     """Get SLA status for all assigned jobs"""
     
-    jobs = db.query(models.Complaint).filter(
+    result = await db.execute(select(models.Complaint).where(
         models.Complaint.assigned_to == current_user.id,
         models.Complaint.status != "COMPLETED"
-    ).order_by(models.Complaint.sla_time.asc()).all()
+    ).order_by(models.Complaint.sla_time.asc()))
+    jobs = result.scalars().all()
     
     result = []
     for job in jobs:
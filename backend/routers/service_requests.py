@@ -13,6 +13,7 @@ import models
 import auth
 from database import get_db
 from notification_service import NotificationService
+from sla_timer import sla_timer
 
 router = APIRouter(prefix="/api/service-requests", tags=["Service Requests"])
 
@@ -99,6 +100,7 @@ async def create_service_request(
     db.add(db_complaint)
     db.commit()
     db.refresh(db_complaint)
+    sla_timer.track(db_complaint)
     
     # Send notifications
     if complaint.assigned_to:
@@ -141,6 +143,7 @@ async def assign_engineer_to_service(
     
     db.commit()
     db.refresh(service)
+    sla_timer.track(service)
     
     # Send notification to engineer
     background_tasks.add_task(
@@ -272,6 +275,7 @@ async def update_service_status(
     
     db.commit()
     db.refresh(service)
+    sla_timer.track(service)  # ON_HOLD pauses, resume reschedules, COMPLETED cancels
     
     return service
 
@@ -317,6 +321,7 @@ async def complete_service(
     
     db.commit()
     db.refresh(service)
+    sla_timer.cancel(service.id)
     
     # Notify admin and reception
     background_tasks.add_task(
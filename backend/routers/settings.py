@@ -2,10 +2,13 @@
 Settings API Router
 Admin system configuration
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
+from typing import Optional
 from database import get_db
 from auth import require_admin
+from rbac import rbac
+from scheduler_leader import elector, job_run_history
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/api/settings", tags=["settings"])
@@ -49,3 +52,28 @@ def update_settings(
     # For now, just return success
     # In production, update settings table
     return {"message": "Settings updated successfully", "settings": settings.dict()}
+
+@router.get("/rbac")
+def get_rbac_status(current_user = Depends(require_admin)):
+    """Compiled RBAC policy status - Admin only"""
+    return rbac.stats()
+
+@router.post("/rbac/reload")
+def reload_rbac(
+    current_user = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Recompile role permissions after editing roles/role_permissions - Admin only"""
+    rbac.invalidate()
+    rbac.reload(db)
+    return {"message": "RBAC policy reloaded", **rbac.stats()}
+
+@router.get("/scheduler")
+def get_scheduler_status(
+    job_id: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    current_user = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Scheduler leader (as seen by this worker) and job run history/durations - Admin only"""
+    return {"leader": elector.status(), **job_run_history(db, job_id, limit)}
@@ -5,6 +5,8 @@ import schemas
 import crud
 import auth
 from database import get_db
+from principal_cache import principal_cache
+from recipient_directory import recipient_directory
 from typing import List
 import os
 from pathlib import Path
@@ -12,6 +14,9 @@ import uuid
 
 router = APIRouter(prefix="/api/users", tags=["users"])
 
+# Fields whose change invalidates existing JWTs for the user
+REVOKING_FIELDS = {"role", "is_active", "username", "hashed_password"}
+
 @router.get("/me", response_model=schemas.User)
 def get_current_user_info(
     current_user: models.User = Depends(auth.get_current_user)
@@ -79,7 +84,10 @@ def create_user(
     if existing_email:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    return crud.create_user(db, user)
+    try:
+        return crud.create_user(db, user)
+    except auth.PasswordPoolBusy:
+        raise auth.password_pool_busy()
 
 @router.get("/{user_id}", response_model=schemas.User)
 def get_user(
@@ -122,13 +130,23 @@ def update_user(
     
     # Hash password if being updated
     if 'password' in update_data:
-        update_data['hashed_password'] = auth.get_password_hash(update_data.pop('password'))
+        try:
+            update_data['hashed_password'] = auth.get_password_hash(update_data.pop('password'))
+        except auth.PasswordPoolBusy:
+            raise auth.password_pool_busy()
+    
+    # Role / status / credential changes revoke tokens already issued to this user
+    if any(getattr(db_user, key) != update_data[key] for key in REVOKING_FIELDS.intersection(update_data)):
+        db_user.token_version = (db_user.token_version or 0) + 1
     
+    old_username = db_user.username
     for key, value in update_data.items():
         setattr(db_user, key, value)
     
     db.commit()
     db.refresh(db_user)
+    principal_cache.invalidate_user(user_id=db_user.id, username=old_username)
+    recipient_directory.invalidate()
     return db_user
 
 @router.delete("/{user_id}")
@@ -148,8 +166,11 @@ def delete_user(
     
     # Soft delete - just mark as inactive instead of deleting
     db_user.is_active = False
+    db_user.token_version = (db_user.token_version or 0) + 1
     db.commit()
     db.refresh(db_user)
+    principal_cache.invalidate_user(user_id=db_user.id, username=db_user.username)
+    recipient_directory.invalidate()
     
     return {"message": "User deactivated successfully"}
 
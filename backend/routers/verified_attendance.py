@@ -3,7 +3,9 @@ Verified Attendance Router
 Handles biometric + GPS verification for attendance
 """
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 from pydantic import BaseModel
 from typing import Optional
@@ -14,7 +16,7 @@ from pathlib import Path
 
 import models
 import auth
-from database import get_db
+from database import get_async_db
 
 router = APIRouter(prefix="/api/attendance", tags=["Verified Attendance"])
 
@@ -50,8 +52,8 @@ class FaceVerificationResponse(BaseModel):
 async def verified_checkin(
     request: Request,
     data: VerifiedCheckinRequest,
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: models.User = Depends(auth.get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Submit verified attendance with biometric + GPS proof
@@ -63,10 +65,11 @@ async def verified_checkin(
         
         # Check if already checked in today
         check_in_date = datetime.fromisoformat(data.check_in_time.replace('Z', '+00:00')).date()
-        existing_attendance = db.query(models.Attendance).filter(
+        result = await db.execute(select(models.Attendance.id).where(
             models.Attendance.employee_id == data.employee_id,
             models.Attendance.attendance_date == check_in_date
-        ).first()
+        ).limit(1))
+        existing_attendance = result.first()
         
         if existing_attendance:
             raise HTTPException(
@@ -88,7 +91,7 @@ async def verified_checkin(
         # Save face image
         face_image_path = None
         if data.face_image:
-            face_image_path = save_face_image(data.face_image, data.employee_id)
+            face_image_path = await run_in_threadpool(save_face_image, data.face_image, data.employee_id)
         
         # Create attendance record
         check_in_datetime = datetime.fromisoformat(data.check_in_time.replace('Z', '+00:00'))
@@ -108,8 +111,8 @@ async def verified_checkin(
         )
         
         db.add(attendance)
-        db.commit()
-        db.refresh(attendance)
+        await db.commit()
+        await db.refresh(attendance)
         
         return {
             "success": True,
@@ -131,8 +134,8 @@ async def verified_checkin(
 @router.post("/verify-face", response_model=FaceVerificationResponse)
 async def verify_face(
     data: FaceVerificationRequest,
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: models.User = Depends(auth.get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Verify captured face against employee master profile
@@ -140,7 +143,7 @@ async def verify_face(
     """
     try:
         # Get employee master photo
-        employee = db.query(models.User).filter(models.User.id == data.employee_id).first()
+        employee = await db.get(models.User, data.employee_id)
         
         if not employee:
             raise HTTPException(status_code=404, detail="Employee not found")
@@ -205,16 +208,16 @@ def simulate_face_matching(captured_face: str, master_photo: Optional[str]) -> f
 
 @router.get("/history")
 async def get_attendance_history(
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
     skip: int = 0,
     limit: int = 50
 ):
     """Get attendance history for current user"""
-    attendances = db.query(models.Attendance).filter(
-        models.Attendance.user_id == current_user.id
+    result = await db.execute(select(models.Attendance).where(
+        models.Attendance.employee_id == current_user.id
     ).order_by(
         models.Attendance.date.desc()
-    ).offset(skip).limit(limit).all()
+    ).offset(skip).limit(limit))
     
-    return attendances
+    return result.scalars().all()
@@ -5,22 +5,31 @@ Handles:
 2. Daily Report Submission Tracking
 3. Service SLA Warning System
 4. Monthly AMC Reminder Automation
+5. Monthly Audit Log Partitioning / Archival
 
 PHASE 4: Uses centralized NotificationService
 """
 
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from sqlalchemy import case, or_, update
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta, date
-from database import SessionLocal
+from typing import List
+from database import SchedulerSessionLocal
 from models import (
     Enquiry, DailyReport, Complaint, MIFRecord, 
-    Notification, ReminderSchedule, User, UserRole
+    Notification, ReminderSchedule, SchedulerCheckpoint, User, UserRole
 )
 from notification_service import NotificationService
+from recipient_directory import recipient_directory
 from sla_utils import check_and_send_sla_notifications
+from report_utils import get_missing_reports
+from sla_timer import sla_timer
+from audit_partitions import run_audit_maintenance
+from scheduler_leader import elector, leader_only
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
@@ -29,87 +38,138 @@ scheduler = BackgroundScheduler()
 
 
 def get_db():
-    """Get database session"""
-    db = SessionLocal()
+    """Get database session from the scheduler pool"""
+    db = SchedulerSessionLocal()
     try:
         return db
     finally:
         pass
 
 
-def create_notification(db: Session, user_id: int, title: str, message: str, 
-                       notification_type: str, priority: str = "medium", 
-                       module: str = None, action_url: str = None):
-    """Helper function to create notifications"""
-    notification = Notification(
-        user_id=user_id,
-        title=title,
-        message=message,
-        notification_type=notification_type,
-        priority=priority,
-        module=module,
-        action_url=action_url,
-        created_at=datetime.utcnow()
-    )
-    db.add(notification)
-    db.commit()
-
-
 # ============================================
 # 1. ENQUIRY FOLLOW-UP REMINDER SYSTEM
 # ============================================
 
+FOLLOW_UP_CHUNK_SIZE = int(os.getenv("FOLLOW_UP_CHUNK_SIZE", "500"))
+FOLLOW_UP_STATUSES = ("NEW", "IN_PROGRESS", "FOLLOW_UP")
+
+# Priority → (days until the next reminder, notification priority)
+FOLLOW_UP_RULES = {
+    "HOT": (7, "high"),      # weekly reminder
+    "WARM": (30, "medium"),  # monthly reminder
+}
+FOLLOW_UP_DEFAULT_RULE = (90, "medium")  # COLD → future follow-up
+
+
+def _open_checkpoint(db: Session, job_id: str) -> SchedulerCheckpoint:
+    """Resume an unfinished run of job_id, or start a new one from the beginning"""
+    checkpoint = db.get(SchedulerCheckpoint, job_id)
+    now = datetime.utcnow()
+    if checkpoint is None:
+        checkpoint = SchedulerCheckpoint(job_id=job_id)
+        db.add(checkpoint)
+    elif checkpoint.completed_at is None:
+        logger.warning(f"⚠️ Resuming {job_id} after id {checkpoint.last_id} ({checkpoint.processed} done)")
+        return checkpoint
+    checkpoint.last_id = 0
+    checkpoint.processed = 0
+    checkpoint.started_at = now
+    checkpoint.updated_at = now
+    checkpoint.completed_at = None
+    db.commit()
+    return checkpoint
+
+
+def _claim_follow_ups(db: Session, rows, cutoff: datetime, now: datetime) -> List[int]:
+    """Move next_follow_up forward for enquiries still due; returns the ids this run claimed"""
+    by_frequency = {}
+    for row in rows:
+        frequency, _ = FOLLOW_UP_RULES.get(row.priority, FOLLOW_UP_DEFAULT_RULE)
+        by_frequency.setdefault(frequency, []).append(row.id)
+
+    claimed = []
+    returning = db.get_bind().dialect.update_returning
+    for frequency, ids in by_frequency.items():
+        stmt = update(Enquiry).where(
+            Enquiry.id.in_(ids),
+            Enquiry.next_follow_up < cutoff  # Skip rows rescheduled since they were read
+        ).values(
+            next_follow_up=now + timedelta(days=frequency),
+            reminder_sent_date=now
+        )
+        if returning:
+            claimed.extend(db.execute(stmt.returning(Enquiry.id)).scalars().all())
+        else:
+            db.execute(stmt)
+            claimed.extend(ids)
+    return claimed
+
+
 def check_enquiry_follow_ups():
     """
     Check HOT/WARM/COLD enquiries and create reminders
     HOT → weekly reminder
     WARM → monthly reminder
     COLD → future follow-up
+    
+    Due enquiries (next_follow_up on or before today) are selected in SQL on
+    ix_enquiries_status_next_follow_up and walked in id order, FOLLOW_UP_CHUNK_SIZE
+    rows at a time. Each chunk's reminders, next_follow_up updates and checkpoint
+    commit in one transaction: after a crash the next run resumes from the
+    checkpoint, and committed rows are no longer due, so nothing is re-sent or skipped.
     """
     db = get_db()
     try:
         today = datetime.utcnow().date()
+        cutoff = datetime.combine(today + timedelta(days=1), datetime.min.time())
+        checkpoint = _open_checkpoint(db, "enquiry_followups")
+        last_id = checkpoint.last_id
+        sent = 0
         
-        # Get all active enquiries
-        enquiries = db.query(Enquiry).filter(
-            Enquiry.status.in_(["NEW", "IN_PROGRESS", "FOLLOW_UP"]),
-            Enquiry.assigned_to.isnot(None)
-        ).all()
-        
-        for enquiry in enquiries:
-            # Calculate next reminder based on priority
-            if enquiry.priority == "HOT":
-                frequency = 7  # 7 days (weekly)
-                reminder_type = "HOT_ENQUIRY"
-            elif enquiry.priority == "WARM":
-                frequency = 30  # 30 days (monthly)
-                reminder_type = "WARM_ENQUIRY"
-            else:  # COLD
-                frequency = 90  # 90 days (future)
-                reminder_type = "COLD_ENQUIRY"
+        while True:
+            rows = db.query(
+                Enquiry.id,
+                Enquiry.enquiry_id,
+                Enquiry.priority,
+                Enquiry.assigned_to,
+                Enquiry.customer_name,
+                Enquiry.product_interest
+            ).filter(
+                Enquiry.status.in_(FOLLOW_UP_STATUSES),
+                Enquiry.next_follow_up < cutoff,
+                Enquiry.assigned_to.isnot(None),
+                Enquiry.id > last_id
+            ).order_by(Enquiry.id).limit(FOLLOW_UP_CHUNK_SIZE).all()
+            if not rows:
+                break
+            
+            now = datetime.utcnow()
+            claimed = set(_claim_follow_ups(db, rows, cutoff, now))
+            notification_rows = []
+            for row in rows:
+                if row.id not in claimed:
+                    continue
+                _, notification_priority = FOLLOW_UP_RULES.get(row.priority, FOLLOW_UP_DEFAULT_RULE)
+                notification_rows.extend(NotificationService.build_rows([row.assigned_to], {
+                    "title": f"🔔 {row.priority} Enquiry Follow-up Due",
+                    "message": f"Follow-up required for {row.customer_name} - {row.product_interest}",
+                    "notification_type": "FOLLOW_UP_REMINDER",
+                    "priority": notification_priority,
+                    "module": "Enquiry",
+                    "action_url": f"/enquiry/{row.id}"
+                }))
+            NotificationService.insert_rows(db, notification_rows, commit=False)
             
-            # Check if reminder is due
-            if enquiry.next_follow_up and enquiry.next_follow_up.date() <= today:
-                # Create notification for assigned salesman
-                create_notification(
-                    db=db,
-                    user_id=enquiry.assigned_to,
-                    title=f"🔔 {enquiry.priority} Enquiry Follow-up Due",
-                    message=f"Follow-up required for {enquiry.customer_name} - {enquiry.product_interest}",
-                    notification_type="FOLLOW_UP_REMINDER",
-                    priority="high" if enquiry.priority == "HOT" else "medium",
-                    module="Enquiry",
-                    action_url=f"/enquiry/{enquiry.id}"
-                )
-                
-                # Update next follow-up date
-                enquiry.next_follow_up = datetime.utcnow() + timedelta(days=frequency)
-                enquiry.reminder_sent_date = datetime.utcnow()
-                
-                logger.info(f"Reminder sent for {enquiry.priority} enquiry: {enquiry.enquiry_id}")
+            last_id = rows[-1].id
+            checkpoint.last_id = last_id
+            checkpoint.processed += len(claimed)
+            checkpoint.updated_at = now
+            db.commit()
+            sent += len(notification_rows)
         
+        checkpoint.completed_at = datetime.utcnow()
         db.commit()
-        logger.info(f"✅ Follow-up reminders checked at {datetime.utcnow()}")
+        logger.info(f"✅ Follow-up reminders checked at {datetime.utcnow()}: {sent} sent")
         
     except Exception as e:
         logger.error(f"❌ Error in enquiry follow-up check: {str(e)}")
@@ -124,67 +184,49 @@ def check_enquiry_follow_ups():
 
 def check_daily_reports():
     """
-    Check if salesmen submitted daily reports
-    If NOT → Send notification to reception
+    Check if salesmen submitted yesterday's daily report
+    If NOT → Notify the salesman and reception
     Runs every day at 7 PM
+    
+    One anti-join query finds the missing reports; all notifications are
+    written with one bulk insert in the same transaction.
     """
     db = get_db()
     try:
-        today = date.today()
+        yesterday = date.today() - timedelta(days=1)
         
-        # Get all active salesmen
-        salesmen = db.query(User).filter(
-            User.role == UserRole.SALESMAN,
-            User.is_active == True
-        ).all()
+        missing_reports = get_missing_reports(db, yesterday)
         
-        # Get reception users to notify
-        reception_users = db.query(User).filter(
-            User.role == UserRole.RECEPTION,
-            User.is_active == True
-        ).all()
+        # Reception users to notify
+        reception_ids = recipient_directory.get(db, UserRole.RECEPTION)
         
-        missing_reports = []
-        
-        for salesman in salesmen:
-            # Check if daily report exists
-            report = db.query(DailyReport).filter(
-                DailyReport.salesman_id == salesman.id,
-                DailyReport.date == yesterday
-            ).first()
+        salesman_payload = NotificationService.daily_report_missing_payload(yesterday)
+        rows = []
+        for missing in missing_reports:
+            salesman_name = missing.full_name or missing.username
+            
+            rows += NotificationService.build_rows([missing.salesman_id], salesman_payload)
+            
+            # Notify reception staff
+            rows += NotificationService.build_rows(reception_ids, {
+                "title": "⚠️ Missing Daily Report",
+                "message": f"Salesman {salesman_name} has not submitted yesterday's report",
+                "notification_type": "MISSED_REPORT",
+                "priority": "high",
+                "module": "Daily Reports",
+                "action_url": "/reports/daily"
+            })
             
-            if not report:
-                missing_reports.append(salesman)
-                
-                # PHASE 4: Use NotificationService
-                NotificationService.notify_daily_report_missing(
-                    db=db,
-                    salesman=salesman,
-                    date=yesterday
-                )
-                
-                # Notify reception staff
-                for reception in reception_users:
-                    NotificationService.create_notification(
-                        db=db,
-                        user_id=reception.id,
-                        title="⚠️ Missing Daily Report",
-                        message=f"Salesman {salesman.full_name or salesman.username} has not submitted yesterday's report",
-                        notification_type="MISSED_REPORT",
-                        priority="high",
-                        module="Daily Reports",
-                        action_url="/reports/daily"
-                    )
-                
-                logger.warning(f"Missing report from salesman: {salesman.username}")
+            logger.warning(f"Missing report from salesman: {missing.username}")
+        
+        NotificationService.insert_rows(db, rows, commit=False)
+        db.commit()
         
         if missing_reports:
             logger.info(f"⚠️ {len(missing_reports)} salesmen missing daily reports")
         else:
             logger.info("✅ All salesmen submitted daily reports")
         
-        db.commit()
-        
     except Exception as e:
         logger.error(f"❌ Error in daily report check: {str(e)}")
         db.rollback()
@@ -199,7 +241,8 @@ def check_daily_reports():
 def check_service_sla():
     """
     Enhanced SLA escalation system
-    Checks every 15 minutes and sends role-filtered notifications
+    Warnings/breaches normally fire on time from sla_timer; this 15-minute
+    sweep is the reconciliation safety net and reseeds the timer
     """
     db = get_db()
     notif_service = NotificationService()
@@ -207,6 +250,8 @@ def check_service_sla():
     try:
         result = check_and_send_sla_notifications(db, notif_service)
         logger.info(f"✅ SLA Check: {result['warnings_sent']} warnings, {result['breaches_sent']} breaches")
+        # Reconcile the deadline timer with the database (other workers' writes)
+        sla_timer.seed(db)
     except Exception as e:
         logger.error(f"❌ SLA check failed: {str(e)}")
     finally:
@@ -217,74 +262,107 @@ def check_service_sla():
 # 4. MONTHLY AMC REMINDER AUTOMATION
 # ============================================
 
+# Reminder windows, most urgent first: (days before expiry, label)
+AMC_WINDOWS = [
+    (1, "TOMORROW"),
+    (7, "7 days"),
+    (15, "15 days"),
+    (30, "30 days")
+]
+AMC_DIGEST_ITEMS = 10  # Machines listed in the digest text (all are counted)
+AMC_UPDATE_CHUNK_SIZE = 1000
+
+
+def get_due_amc_reminders(db: Session, today: datetime):
+    """
+    Active MIF records expiring within 30 days that are due a reminder, in one query
+    
+    Each record is bucketed into the narrowest window containing its expiry
+    (CASE), and skipped if it was reminded less than that window's days ago.
+    Rows: (id, customer_name, machine_model, serial_number, amc_expiry, window), soonest first.
+    """
+    window = case(
+        *[(MIFRecord.amc_expiry <= today + timedelta(days=days), days) for days, _ in AMC_WINDOWS[:-1]],
+        else_=AMC_WINDOWS[-1][0]
+    )
+    resend_before = case(
+        *[(MIFRecord.amc_expiry <= today + timedelta(days=days), today - timedelta(days=days)) for days, _ in AMC_WINDOWS[:-1]],
+        else_=today - timedelta(days=AMC_WINDOWS[-1][0])
+    )
+    return db.query(
+        MIFRecord.id,
+        MIFRecord.customer_name,
+        MIFRecord.machine_model,
+        MIFRecord.serial_number,
+        MIFRecord.amc_expiry,
+        window.label("window")
+    ).filter(
+        MIFRecord.amc_expiry.isnot(None),
+        MIFRecord.amc_expiry >= today,
+        MIFRecord.amc_expiry <= today + timedelta(days=AMC_WINDOWS[-1][0]),
+        MIFRecord.status == "Active",
+        or_(
+            MIFRecord.amc_reminder_sent_date.is_(None),
+            MIFRecord.amc_reminder_sent_date <= resend_before
+        )
+    ).order_by(MIFRecord.amc_expiry, MIFRecord.id).all()
+
+
+def build_amc_digest(rows) -> dict:
+    """One notification payload summarising all due AMC reminders"""
+    labels = dict(AMC_WINDOWS)
+    counts = {}
+    for row in rows:
+        counts[row.window] = counts.get(row.window, 0) + 1
+    summary = " | ".join(f"{labels[days]}: {counts[days]}" for days, _ in AMC_WINDOWS if days in counts)
+    lines = [
+        f"• {row.customer_name} - {row.machine_model} (S/N: {row.serial_number}) expires {row.amc_expiry:%d %b %Y}"
+        for row in rows[:AMC_DIGEST_ITEMS]
+    ]
+    if len(rows) > AMC_DIGEST_ITEMS:
+        lines.append(f"… and {len(rows) - AMC_DIGEST_ITEMS} more")
+    return {
+        "title": f"🔔 {len(rows)} AMC{'s' if len(rows) != 1 else ''} Expiring Soon",
+        "message": f"{summary}\n" + "\n".join(lines),
+        "notification_type": "AMC_EXPIRY",
+        "priority": "critical" if min(counts) <= 7 else "high",
+        "module": "MIF",
+        "action_url": "/mif"
+    }
+
+
 def check_amc_expiry():
     """
-    Check for AMC expiring in 30/15/7 days
+    Check for AMC expiring in 30/15/7/1 days
     Send monthly reminders
     Runs on 1st of every month
+    
+    One pass: a single bucketed query, one bulk UPDATE of amc_reminder_sent_date
+    and one digest notification per reception user, all in one transaction.
     """
     db = get_db()
     try:
         today = datetime.utcnow()
         
-        # Check for AMC expiring in next 30 days
-        expiry_dates = [
-            (30, "30 days"),
-            (15, "15 days"),
-            (7, "7 days"),
-            (1, "TOMORROW")
-        ]
-        
-        # Get reception and office staff for notifications
-        reception_users = db.query(User).filter(
-            User.role == UserRole.RECEPTION,
-            User.is_active == True
-        ).all()
+        rows = get_due_amc_reminders(db, today)
+        if not rows:
+            logger.info(f"✅ AMC expiry checks completed at {datetime.utcnow()}: nothing due")
+            return
         
-        office_staff = db.query(User).filter(
-            User.role == UserRole.OFFICE_STAFF,
-            User.is_active == True
-        ).all()
+        ids = [row.id for row in rows]
+        for start in range(0, len(ids), AMC_UPDATE_CHUNK_SIZE):
+            db.execute(
+                update(MIFRecord)
+                .where(MIFRecord.id.in_(ids[start:start + AMC_UPDATE_CHUNK_SIZE]))
+                .values(amc_reminder_sent_date=today)
+            )
         
-        for days, label in expiry_dates:
-            target_date = today + timedelta(days=days)
-            
-            # Find MIF records with AMC expiring
-            mif_records = db.query(MIFRecord).filter(
-                MIFRecord.amc_expiry.isnot(None),
-                MIFRecord.amc_expiry >= today,
-                MIFRecord.amc_expiry <= target_date,
-                MIFRecord.status == "Active"
-            ).all()
-            
-            for mif in mif_records:
-                # Check if reminder already sent for this period
-                last_reminder = mif.amc_reminder_sent_date
-                if last_reminder and (today - last_reminder).days < days:
-                    continue  # Already sent reminder for this period
-                
-                priority = "critical" if days <= 7 else "high"
-                
-                # Notify reception and office staff
-                for user in reception_users + office_staff:
-                    create_notification(
-                        db=db,
-                        user_id=user.id,
-                        title=f"🔔 AMC Expiring in {label}",
-                        message=f"Customer: {mif.customer_name} | Machine: {mif.machine_model} (S/N: {mif.serial_number})",
-                        notification_type="AMC_EXPIRY",
-                        priority=priority,
-                        module="MIF",
-                        action_url=f"/mif/{mif.id}"
-                    )
-                
-                # Update reminder sent date
-                mif.amc_reminder_sent_date = today
-                
-                logger.info(f"📧 AMC reminder sent: {mif.customer_name} - expires in {label}")
+        # Reception staff get the digest (office staff were merged into RECEPTION)
+        recipient_ids = recipient_directory.get(db, UserRole.RECEPTION)
+        NotificationService.notify_many(db, recipient_ids, build_amc_digest(rows), commit=False)
         
         db.commit()
-        logger.info(f"✅ AMC expiry checks completed at {datetime.utcnow()}")
+        logger.info(f"✅ AMC expiry checks completed at {datetime.utcnow()}: {len(rows)} reminders, {len(recipient_ids)} recipients")
         
     except Exception as e:
         logger.error(f"❌ Error in AMC check: {str(e)}")
@@ -297,12 +375,17 @@ def check_amc_expiry():
 # SCHEDULER CONFIGURATION
 # ============================================
 
+def _start_sla_timer():
+    sla_timer.seed()
+    sla_timer.start()
+
+
 def start_scheduler():
     """Start the background scheduler"""
     
     # 1. Check enquiry follow-ups every hour
     scheduler.add_job(
-        check_enquiry_follow_ups,
+        leader_only('enquiry_followups', check_enquiry_follow_ups),
         CronTrigger(minute=0),  # Every hour at minute 0
         id='enquiry_followups',
         name='Check Enquiry Follow-ups',
@@ -311,7 +394,7 @@ def start_scheduler():
     
     # 2. Check daily reports at 7 PM every day
     scheduler.add_job(
-        check_daily_reports,
+        leader_only('daily_reports', check_daily_reports),
         CronTrigger(hour=19, minute=0),  # 7:00 PM daily
         id='daily_reports',
         name='Check Daily Report Submissions',
@@ -320,7 +403,7 @@ def start_scheduler():
     
     # 3. Check service SLA every 15 minutes (enhanced)
     scheduler.add_job(
-        check_service_sla,
+        leader_only('service_sla_escalation', check_service_sla),
         CronTrigger(minute='*/15'),  # Every 15 minutes
         id='service_sla_escalation',
         name='SLA Escalation Check',
@@ -329,23 +412,42 @@ def start_scheduler():
     
     # 4. Check AMC expiry on 1st of every month at 9 AM
     scheduler.add_job(
-        check_amc_expiry,
+        leader_only('amc_expiry', check_amc_expiry),
         CronTrigger(day=1, hour=9, minute=0),  # 1st of month, 9:00 AM
         id='amc_expiry',
         name='Check AMC Expiry',
         replace_existing=True
     )
     
+    # 5. Audit log partitions/archival on 1st of every month at 2 AM
+    scheduler.add_job(
+        leader_only('audit_maintenance', run_audit_maintenance),
+        CronTrigger(day=1, hour=2, minute=0),  # 1st of month, 2:00 AM
+        id='audit_maintenance',
+        name='Audit Log Partitions & Archival',
+        replace_existing=True
+    )
+    
     scheduler.start()
+    
+    # Every worker schedules the jobs; only the elected leader runs them.
+    # The exact-time SLA timer (reconciled by the sweep above) follows leadership.
+    elector.on_elected(_start_sla_timer)
+    elector.on_demoted(sla_timer.stop)
+    elector.start()
+    
     logger.info("🚀 Scheduler started successfully!")
     logger.info("📋 Active jobs:")
     logger.info("  - Enquiry Follow-ups: Every hour")
     logger.info("  - Daily Reports Check: 7 PM daily")
-    logger.info("  - Service SLA Check: Every hour")
+    logger.info("  - Service SLA Check: Every 15 minutes (reconciles the SLA deadline timer)")
     logger.info("  - AMC Expiry Check: 1st of month, 9 AM")
+    logger.info("  - Audit Log Partitions & Archival: 1st of month, 2 AM")
+    logger.info(f"  - Leader election: {elector.backend} (leader: {elector.is_leader})")
 
 
 def stop_scheduler():
     """Stop the background scheduler"""
+    elector.stop()
     scheduler.shutdown()
     logger.info("⏸️ Scheduler stopped")
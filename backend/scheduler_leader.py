@@ -0,0 +1,300 @@
+"""
+Scheduler Leader Election
+Makes sure only one process runs the APScheduler jobs when uvicorn runs with
+several workers.
+
+- PostgreSQL: a session-level pg_try_advisory_lock held on a dedicated
+  connection. If the leader dies its connection closes and the lock is freed.
+- SQLite / local dev: an exclusive fcntl lock on SCHEDULER_LOCK_FILE, released
+  by the OS when the process exits.
+- Every worker keeps retrying every LEADER_CHECK_INTERVAL seconds, so a
+  follower takes over automatically after the leader goes away.
+- leader_only(job_id, func) wraps a job: followers skip it, the leader runs it
+  and records the run (duration, status, error) in scheduler_job_runs.
+"""
+
+from datetime import datetime, timedelta
+from functools import wraps
+from threading import Event, Lock, Thread
+from typing import Callable, List, Optional
+import logging
+import os
+import socket
+import time
+import traceback
+
+from sqlalchemy import case, create_engine, func, text
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+from database import SchedulerSessionLocal, scheduler_engine
+import models
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LEADER_CHECK_INTERVAL = int(os.getenv("LEADER_CHECK_INTERVAL", "15"))  # seconds
+SCHEDULER_LOCK_KEY = int(os.getenv("SCHEDULER_LOCK_KEY", "7240615"))
+SCHEDULER_LOCK_FILE = os.getenv(
+    "SCHEDULER_LOCK_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".scheduler.lock")
+)
+JOB_HISTORY_DAYS = int(os.getenv("JOB_HISTORY_DAYS", "30"))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class PostgresAdvisoryLock:
+    """Session-level advisory lock on its own (non-pooled) connection"""
+
+    backend = "postgres_advisory_lock"
+
+    def __init__(self, url, key: int):
+        self._engine = create_engine(url, poolclass=NullPool)
+        self._key = key
+        self._conn = None
+
+    def try_acquire(self) -> bool:
+        if self._conn is None:
+            self._conn = self._engine.connect()
+        acquired = self._conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self._key}).scalar()
+        self._conn.commit()
+        return bool(acquired)
+
+    def still_held(self) -> bool:
+        """Connection alive means the session lock is still ours"""
+        try:
+            self._conn.execute(text("SELECT 1"))
+            self._conn.commit()
+            return True
+        except Exception:
+            self.release()
+            return False
+
+    def release(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()  # Closing the session frees the lock
+            except Exception:
+                pass
+            self._conn = None
+
+
+class FileLock:
+    """Exclusive non-blocking flock on a lock file"""
+
+    backend = "file_lock"
+
+    def __init__(self, path: str):
+        self._path = path
+        self._handle = None
+
+    def try_acquire(self) -> bool:
+        if fcntl is None:
+            # No flock available: single-process dev setup, always lead
+            return True
+        handle = open(self._path, "a+")
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        handle.seek(0)
+        handle.truncate()
+        handle.write(WORKER_ID)
+        handle.flush()
+        self._handle = handle
+        return True
+
+    def still_held(self) -> bool:
+        return fcntl is None or self._handle is not None
+
+    def release(self):
+        if self._handle is not None:
+            try:
+                fcntl.flock(self._handle.fileno(), fcntl.LOCK_UN)
+                self._handle.close()
+            except Exception:
+                pass
+            self._handle = None
+
+
+class LeaderElector:
+    """Background thread that acquires / monitors the scheduler leadership lock"""
+
+    def __init__(self, lock, interval: float = LEADER_CHECK_INTERVAL):
+        self._lock = lock
+        self.interval = interval
+        self.is_leader = False
+        self.leader_since: Optional[datetime] = None
+        self.elections = 0
+        self._stop = Event()
+        self._state_lock = Lock()
+        self._thread: Optional[Thread] = None
+        self._on_elected: List[Callable[[], None]] = []
+        self._on_demoted: List[Callable[[], None]] = []
+
+    @property
+    def backend(self) -> str:
+        return self._lock.backend
+
+    def on_elected(self, callback: Callable[[], None]):
+        self._on_elected.append(callback)
+
+    def on_demoted(self, callback: Callable[[], None]):
+        self._on_demoted.append(callback)
+
+    def _set_leader(self, leader: bool):
+        with self._state_lock:
+            if leader == self.is_leader:
+                return
+            self.is_leader = leader
+            self.leader_since = datetime.utcnow() if leader else None
+            if leader:
+                self.elections += 1
+        callbacks = self._on_elected if leader else self._on_demoted
+        logger.info(f"{'👑 Became' if leader else '⏸️ Lost'} scheduler leadership ({WORKER_ID}, {self.backend})")
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"❌ Leadership callback failed: {e}")
+
+    def check(self):
+        """One election round (also called synchronously at start)"""
+        try:
+            if self.is_leader:
+                if not self._lock.still_held():
+                    self._set_leader(False)
+            elif self._lock.try_acquire():
+                self._set_leader(True)
+        except Exception as e:
+            logger.error(f"❌ Leader election error: {e}")
+            self._lock.release()
+            self._set_leader(False)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self):
+        self._stop.clear()
+        self.check()
+        self._thread = Thread(target=self._run, name="scheduler-leader-election", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self.is_leader:
+            self._set_leader(False)
+        self._lock.release()
+
+    def status(self) -> dict:
+        return {
+            "worker": WORKER_ID,
+            "backend": self.backend,
+            "is_leader": self.is_leader,
+            "leader_since": self.leader_since,
+            "elections": self.elections,
+            "check_interval_seconds": self.interval,
+        }
+
+
+def _build_lock():
+    if scheduler_engine.dialect.name == "postgresql":
+        return PostgresAdvisoryLock(scheduler_engine.url, SCHEDULER_LOCK_KEY)
+    return FileLock(SCHEDULER_LOCK_FILE)
+
+
+elector = LeaderElector(_build_lock())
+
+
+def _record_run(job_id: str, started_at: datetime, duration_ms: float, status: str, error: Optional[str]):
+    db = SchedulerSessionLocal()
+    try:
+        db.add(models.SchedulerJobRun(
+            job_id=job_id,
+            worker=WORKER_ID,
+            started_at=started_at,
+            finished_at=datetime.utcnow(),
+            duration_ms=round(duration_ms, 3),
+            status=status,
+            error=error,
+        ))
+        db.query(models.SchedulerJobRun).filter(
+            models.SchedulerJobRun.job_id == job_id,
+            models.SchedulerJobRun.started_at < started_at - timedelta(days=JOB_HISTORY_DAYS)
+        ).delete(synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Could not record run of {job_id}: {e}")
+    finally:
+        db.close()
+
+
+def leader_only(job_id: str, func: Callable) -> Callable:
+    """Wrap a scheduler job so it only runs on the leader and its runs are recorded"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not elector.is_leader:
+            return None
+        started_at = datetime.utcnow()
+        started = time.perf_counter()
+        status, error = "success", None
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            status, error = "error", traceback.format_exc(limit=5)
+            raise
+        finally:
+            _record_run(job_id, started_at, (time.perf_counter() - started) * 1000, status, error)
+    return wrapper
+
+
+def job_run_history(db: Session, job_id: Optional[str] = None, limit: int = 50) -> dict:
+    """Per-job run counts / durations plus the most recent runs"""
+    runs = models.SchedulerJobRun
+    summary_query = db.query(
+        runs.job_id,
+        func.count(runs.id),
+        func.sum(case((runs.status == "error", 1), else_=0)),
+        func.avg(runs.duration_ms),
+        func.max(runs.duration_ms),
+        func.max(runs.started_at),
+    ).group_by(runs.job_id)
+    recent_query = db.query(runs).order_by(runs.started_at.desc(), runs.id.desc())
+    if job_id:
+        summary_query = summary_query.filter(runs.job_id == job_id)
+        recent_query = recent_query.filter(runs.job_id == job_id)
+
+    return {
+        "jobs": [
+            {
+                "job_id": name,
+                "runs": total,
+                "errors": int(errors or 0),
+                "avg_duration_ms": round(avg_ms or 0, 3),
+                "max_duration_ms": round(max_ms or 0, 3),
+                "last_started_at": last_started,
+            }
+            for name, total, errors, avg_ms, max_ms, last_started in summary_query.all()
+        ],
+        "recent": [
+            {
+                "id": run.id,
+                "job_id": run.job_id,
+                "worker": run.worker,
+                "started_at": run.started_at,
+                "finished_at": run.finished_at,
+                "duration_ms": run.duration_ms,
+                "status": run.status,
+                "error": run.error,
+            }
+            for run in recent_query.limit(limit).all()
+        ],
+    }
@@ -5,7 +5,13 @@ Production-ready implementation for Yamini Infotech ERP
 
 import os
 import json
+import hashlib
 import re
+import shutil
+import tempfile
+import threading
+import time
+import importlib.util
 from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 import numpy as np
@@ -20,22 +26,89 @@ except ImportError:
     MISTRAL_AVAILABLE = False
     print("⚠️  Mistral AI SDK not installed. Run: pip install mistralai")
 
-# FAISS for vector search
-try:
-    import faiss
-    FAISS_AVAILABLE = True
-except ImportError:
-    FAISS_AVAILABLE = False
+# FAISS and Sentence Transformers (which pulls in torch) take seconds to
+# import, so only check they are installed here and import them on first use
+faiss = None
+FAISS_AVAILABLE = importlib.util.find_spec("faiss") is not None
+if not FAISS_AVAILABLE:
     print("⚠️  FAISS not installed. Run: pip install faiss-cpu")
 
-# Sentence transformers for embeddings
-try:
-    from sentence_transformers import SentenceTransformer
-    SENTENCE_TRANSFORMER_AVAILABLE = True
-except ImportError:
-    SENTENCE_TRANSFORMER_AVAILABLE = False
+SentenceTransformer = None
+SENTENCE_TRANSFORMER_AVAILABLE = importlib.util.find_spec("sentence_transformers") is not None
+if not SENTENCE_TRANSFORMER_AVAILABLE:
     print("⚠️  Sentence Transformers not installed. Run: pip install sentence-transformers")
 
+_load_lock = threading.RLock()
+
+
+def _import_faiss():
+    global faiss
+    if faiss is None:
+        import faiss as faiss_module
+        faiss = faiss_module
+    return faiss
+
+
+def _import_sentence_transformer():
+    global SentenceTransformer
+    if SentenceTransformer is None:
+        from sentence_transformers import SentenceTransformer as model_class
+        SentenceTransformer = model_class
+    return SentenceTransformer
+
+# Texts per encode_batch call / FAISS add during index rebuilds
+EMBED_BATCH_SIZE = int(os.getenv("CHATBOT_EMBED_BATCH_SIZE", "64"))
+
+DEFAULT_EMBEDDING_MODEL = os.getenv(
+    "CHATBOT_EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+)
+
+# Embedding backend: "torch" (Sentence Transformers) or "onnx" (ONNX Runtime,
+# model exported by scripts/setup/export_embedding_onnx.py)
+EMBEDDING_BACKEND = os.getenv("CHATBOT_EMBEDDING_BACKEND", "torch").strip().lower()
+ONNX_MODEL_DIR = os.getenv(
+    "CHATBOT_ONNX_MODEL_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "embedding_onnx")
+)
+ONNX_MODEL_FILE = os.getenv("CHATBOT_ONNX_MODEL_FILE", "model_int8.onnx")  # model.onnx = fp32
+ONNX_THREADS = int(os.getenv("CHATBOT_ONNX_THREADS", "0"))  # 0 = ONNX Runtime default
+ONNX_CPU_AFFINITY = os.getenv("CHATBOT_ONNX_CPU_AFFINITY", "")  # e.g. "0-3": pin one intra-op thread per CPU
+
+# On-disk index snapshots, one directory per knowledge-base version
+INDEX_SNAPSHOT_DIR = os.getenv(
+    "CHATBOT_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "chatbot_index")
+)
+INDEX_SNAPSHOTS_KEPT = int(os.getenv("CHATBOT_INDEX_SNAPSHOTS_KEPT", "3"))
+
+# Index type per language: auto | flat | hnsw | ivfpq. auto picks by corpus size:
+# flat below CHATBOT_ANN_MIN_DOCS, HNSW below CHATBOT_IVFPQ_MIN_DOCS, IVF-PQ above
+INDEX_TYPE = os.getenv("CHATBOT_INDEX_TYPE", "auto").strip().lower()
+ANN_MIN_DOCS = int(os.getenv("CHATBOT_ANN_MIN_DOCS", "10000"))
+IVFPQ_MIN_DOCS = int(os.getenv("CHATBOT_IVFPQ_MIN_DOCS", "250000"))
+HNSW_M = int(os.getenv("CHATBOT_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("CHATBOT_HNSW_EF_CONSTRUCTION", "80"))
+HNSW_EF_SEARCH = int(os.getenv("CHATBOT_HNSW_EF_SEARCH", "64"))
+IVF_NLIST = int(os.getenv("CHATBOT_IVF_NLIST", "0"))  # 0 = 4 * sqrt(documents)
+IVF_NPROBE = int(os.getenv("CHATBOT_IVF_NPROBE", "16"))
+IVF_PQ_M = int(os.getenv("CHATBOT_IVF_PQ_M", "48"))  # Sub-quantisers; must divide the dimension
+IVF_REFINE_K_FACTOR = int(os.getenv("CHATBOT_IVF_REFINE_K_FACTOR", "0"))  # >0: re-rank k * factor PQ hits exactly
+IVF_TRAIN_SIZE = int(os.getenv("CHATBOT_IVF_TRAIN_SIZE", "100000"))  # Max vectors sampled for training
+IVFPQ_MIN_TRAIN = 10000  # PQ codebooks (256 centroids each) need ~39 points per centroid
+
+# Search scoring. Vectors are unit length and indexes use inner product, so
+# FAISS returns cosine similarity. relevance_score maps [floor, ceiling] of
+# that onto 0..1 (see scripts/benchmarks/chatbot_handoff_eval.py).
+SCORE_FLOOR = float(os.getenv("CHATBOT_SCORE_FLOOR", "0.25"))
+SCORE_CEILING = float(os.getenv("CHATBOT_SCORE_CEILING", "0.75"))
+SEARCH_MIN_SIMILARITY = float(os.getenv("CHATBOT_SEARCH_MIN_SIMILARITY", "-1"))  # -1 = keep everything
+MMR_LAMBDA = float(os.getenv("CHATBOT_MMR_LAMBDA", "0.7"))  # 1 = pure relevance (MMR off)
+DUPLICATE_SIMILARITY = float(os.getenv("CHATBOT_DUPLICATE_SIMILARITY", "0.95"))  # MMR drops closer copies
+HANDOFF_CONFIDENCE_THRESHOLD = float(os.getenv("CHATBOT_HANDOFF_THRESHOLD", "0.5"))
+
+# Load the model in the background right after startup instead of on first chatbot request
+CHATBOT_PRELOAD = os.getenv("CHATBOT_PRELOAD", "").strip().lower() in ("1", "true", "yes", "on")
+
 
 class LanguageDetector:
     """Detect language (English/Tamil) with fallback"""
@@ -66,21 +139,108 @@ class LanguageDetector:
         return tamil_chars > len(text) * 0.2
 
 
+def parse_cpu_list(spec: str) -> List[int]:
+    """'0-3,6' -> [0, 1, 2, 3, 6]"""
+    cpus = []
+    for part in spec.replace(" ", "").split(","):
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            cpus.extend(range(int(first), int(last) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+class OnnxEmbeddingModel:
+    """
+    Exported transformer run with ONNX Runtime, mean-pooled in numpy
+    
+    Same encode() signature as SentenceTransformer but needs neither torch
+    nor sentence-transformers at runtime, only onnxruntime and tokenizers.
+    """
+    
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, file_name: str = ONNX_MODEL_FILE,
+                 threads: int = ONNX_THREADS, cpu_affinity: str = ONNX_CPU_AFFINITY):
+        import onnxruntime
+        from tokenizers import Tokenizer
+        
+        with open(os.path.join(model_dir, "embedding_config.json"), encoding="utf-8") as config_file:
+            self.config = json.load(config_file)
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(self.config["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.config["pad_token_id"], pad_token=self.config["pad_token"])
+        
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.inter_op_num_threads = 1
+        cpus = parse_cpu_list(cpu_affinity)
+        if cpus:
+            # The calling thread is intra-op thread 0; pin the pool's threads to
+            # the remaining CPUs (ONNX Runtime numbers logical processors from 1)
+            options.intra_op_num_threads = len(cpus)
+            if len(cpus) > 1:
+                options.add_session_config_entry(
+                    "session.intra_op_thread_affinities", ";".join(str(cpu + 1) for cpu in cpus[1:])
+                )
+        elif threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, file_name), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+    
+    def _run(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        mask = np.array([encoding.attention_mask for encoding in encodings], dtype="int64")
+        feeds = {
+            'input_ids': np.array([encoding.ids for encoding in encodings], dtype="int64"),
+            'attention_mask': mask,
+            'token_type_ids': np.array([encoding.type_ids for encoding in encodings], dtype="int64"),
+        }
+        token_embeddings = self.session.run(None, {name: feeds[name] for name in self.input_names})[0]
+        weights = mask[:, :, None].astype("float32")
+        return (token_embeddings * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+    
+    def encode(self, texts, batch_size: int = 32, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        # Longest first so each batch pads to similar lengths (as SentenceTransformer does)
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        vectors = np.zeros((len(texts), self.config["dimension"]), dtype="float32")
+        for start in range(0, len(texts), batch_size):
+            chunk = order[start:start + batch_size]
+            vectors[chunk] = self._run([texts[i] for i in chunk])
+        return vectors[0] if single else vectors
+
+
+def embedding_model_key(model_name: str = DEFAULT_EMBEDDING_MODEL, backend: str = EMBEDDING_BACKEND) -> str:
+    """Model identity used in embedding content hashes and index versions"""
+    if backend == "onnx":
+        return f"{model_name}#onnx:{ONNX_MODEL_FILE}"
+    return model_name
+
+
 class EmbeddingService:
-    """Generate embeddings for text using Sentence Transformers"""
+    """Generate embeddings for text using Sentence Transformers (or its ONNX export)"""
     
-    def __init__(self, model_name: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"):
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL, backend: str = EMBEDDING_BACKEND):
         """
         Initialize embedding model
         Using multilingual model for English + Tamil support
         """
-        if not SENTENCE_TRANSFORMER_AVAILABLE:
+        if backend == "torch" and not SENTENCE_TRANSFORMER_AVAILABLE:
             raise ImportError("sentence-transformers not installed")
         
+        self.backend = backend
+        self.model_name = embedding_model_key(model_name, backend)
         try:
-            # Initialize with device='cpu' to avoid meta tensor issues
-            import torch
-            self.model = SentenceTransformer(model_name, device='cpu')
+            if backend == "onnx":
+                self.model = OnnxEmbeddingModel()
+            else:
+                # Initialize with device='cpu' to avoid meta tensor issues
+                self.model = _import_sentence_transformer()(model_name, device='cpu')
             self.dimension = 384  # MiniLM embedding dimension
         except Exception as e:
             print(f"⚠️  Warning: Could not load embedding model: {e}")
@@ -88,6 +248,11 @@ class EmbeddingService:
             self.model = None
             self.dimension = 384
     
+    @property
+    def available(self) -> bool:
+        """False when the model failed to load and encode() returns zero vectors"""
+        return self.model is not None
+    
     def encode(self, text: str) -> np.ndarray:
         """Generate embedding vector for text"""
         if self.model is None:
@@ -99,29 +264,217 @@ class EmbeddingService:
             print(f"⚠️  Encoding failed: {e}")
             return np.zeros(self.dimension)
     
-    def encode_batch(self, texts: List[str]) -> np.ndarray:
+    def encode_batch(self, texts: List[str], batch_size: int = EMBED_BATCH_SIZE) -> np.ndarray:
         """Generate embeddings for multiple texts"""
         if self.model is None:
             # Return zero vectors if model failed to load
             return np.zeros((len(texts), self.dimension))
-        return self.model.encode(texts, convert_to_numpy=True)
+        return self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+
+
+def content_hash(text: str, model_name: str) -> str:
+    """Cache key for a stored embedding: the model plus the exact text encoded"""
+    return hashlib.sha256(f"{model_name}\n{text}".encode("utf-8")).hexdigest()
+
+
+def load_embedding(stored: Optional[str], digest: str) -> Optional[np.ndarray]:
+    """Vector from ChatbotKnowledge.embedding_en/_ta if it was computed for this content hash"""
+    if not stored:
+        return None
+    try:
+        data = json.loads(stored)
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or data.get("hash") != digest:
+        return None
+    return np.asarray(data["vector"], dtype="float32")
+
+
+def dump_embedding(digest: str, vector: np.ndarray) -> str:
+    return json.dumps({"hash": digest, "vector": np.round(np.asarray(vector, dtype="float64"), 7).tolist()})
+
+
+def calibrate_score(similarity: float) -> float:
+    """Cosine similarity -> 0..1 relevance: SCORE_FLOOR and below is 0, SCORE_CEILING and above is 1"""
+    return float(min(max((similarity - SCORE_FLOOR) / (SCORE_CEILING - SCORE_FLOOR), 0.0), 1.0))
 
 
 class FAISSVectorStore:
-    """FAISS-based vector search for knowledge retrieval"""
+    """
+    FAISS-based vector search for knowledge retrieval
+    
+    Vectors are stored under their ChatbotKnowledge id (IndexIDMap), so one
+    article can be added, replaced or removed without rebuilding the index.
+    Embeddings are persisted in embedding_en / embedding_ta keyed by content
+    hash and reused until the text (or model) changes. All vectors, and
+    queries, are L2-normalised and indexed by inner product, so search
+    scores are cosine similarities.
+    
+    Each language gets a Flat, HNSW or IVF-PQ index (INDEX_TYPE, or by
+    corpus size), built and trained on rebuild_index. HNSW (and IVF-PQ with
+    exact re-ranking) cannot remove vectors, so there every add gets a fresh
+    label (generation << 32 | id) and replaced / deleted vectors stay behind
+    as tombstones that search skips, until the next rebuild.
+    """
     
     def __init__(self, dimension: int = 384):
+        _import_faiss()
         self.dimension = dimension
-        self.index_en = faiss.IndexFlatL2(dimension)  # English index
-        self.index_ta = faiss.IndexFlatL2(dimension)  # Tamil index
-        self.documents_en: List[Dict] = []
-        self.documents_ta: List[Dict] = []
-        self.embedding_service = EmbeddingService()
+        self.index_en = self._new_index()  # English index
+        self.index_ta = self._new_index()  # Tamil index
+        self.documents_en: Dict[int, Dict] = {}
+        self.documents_ta: Dict[int, Dict] = {}
+        self._embedding_service: Optional[EmbeddingService] = None
+        self.built = False
+        self.version: Optional[str] = None  # Knowledge-base version the index reflects
+        self.generation = 0  # Label generation for indexes without remove_ids
+        self.tombstones = {'en': 0, 'ta': 0}  # Dead vectors per language
+        self._mapped = False  # Indexes are read-only mmap views of a snapshot
+        self.encoded = 0
+        self.cache_hits = 0
+    
+    @property
+    def embedding_service(self) -> EmbeddingService:
+        """Loaded on first encode, so a snapshot warm start does not pay for the model"""
+        if self._embedding_service is None:
+            with _load_lock:
+                if self._embedding_service is None:
+                    self._embedding_service = EmbeddingService()
+        return self._embedding_service
+    
+    def _new_index(self, count: int = 0, index_type: Optional[str] = None):
+        """Empty (untrained) index of the given type, or the one INDEX_TYPE picks for count documents"""
+        index_type = index_type or INDEX_TYPE
+        if index_type == "auto":
+            index_type = "flat" if count < ANN_MIN_DOCS else "hnsw" if count < IVFPQ_MIN_DOCS else "ivfpq"
+        if index_type == "ivfpq" and count < IVFPQ_MIN_TRAIN:
+            index_type = "flat"  # Too few vectors to train the PQ codebooks
+        
+        if index_type == "hnsw":
+            hnsw = faiss.IndexHNSWFlat(self.dimension, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            hnsw.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            hnsw.hnsw.efSearch = HNSW_EF_SEARCH
+            return faiss.IndexIDMap2(hnsw)
+        if index_type == "ivfpq":
+            nlist = IVF_NLIST or max(1, min(int(4 * np.sqrt(count)), count // 39))
+            index = faiss.IndexIVFPQ(
+                faiss.IndexFlatIP(self.dimension), self.dimension, nlist, IVF_PQ_M, 8, faiss.METRIC_INNER_PRODUCT
+            )
+            index.nprobe = IVF_NPROBE
+            if IVF_REFINE_K_FACTOR:
+                refine = faiss.IndexRefineFlat(index)
+                refine.k_factor = IVF_REFINE_K_FACTOR
+                return faiss.IndexIDMap2(refine)
+            # IVF keeps ids itself (and supports remove_ids); the hashtable lets reconstruct() find them
+            index.set_direct_map_type(faiss.DirectMap.Hashtable)
+            return index
+        # IDMap2 (not IDMap) so reconstruct(id) works for MMR
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(self.dimension))
+    
+    @staticmethod
+    def _unwrap(index):
+        """(innermost index, IndexRefine wrapper or None)"""
+        if isinstance(index, faiss.IndexIDMap):
+            index = faiss.downcast_index(index.index)
+        refine = index if isinstance(index, faiss.IndexRefine) else None
+        if refine is not None:
+            index = faiss.downcast_index(refine.base_index)
+        return index, refine
+    
+    @classmethod
+    def index_type(cls, index) -> str:
+        inner, _ = cls._unwrap(index)
+        if isinstance(inner, faiss.IndexHNSW):
+            return "hnsw"
+        if isinstance(inner, faiss.IndexIVF):
+            return "ivfpq"
+        return "flat"
+    
+    @classmethod
+    def _uses_tombstones(cls, index) -> bool:
+        """HNSW and re-ranked IVF-PQ cannot remove_ids"""
+        inner, refine = cls._unwrap(index)
+        return refine is not None or isinstance(inner, faiss.IndexHNSW)
+    
+    def set_search_params(self, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                          k_factor: Optional[int] = None):
+        """Tune IVF nprobe / re-rank k_factor and HNSW efSearch on both indexes (recall vs. latency)"""
+        for index in (self.index_en, self.index_ta):
+            inner, refine = self._unwrap(index)
+            if isinstance(inner, faiss.IndexIVF) and nprobe:
+                inner.nprobe = nprobe
+            elif isinstance(inner, faiss.IndexHNSW) and ef_search:
+                inner.hnsw.efSearch = ef_search
+            if refine is not None and k_factor:
+                refine.k_factor = k_factor
+    
+    def _build_index(self, language: str, ids: List[int], vectors: np.ndarray, docs: List[Dict],
+                     index_type: Optional[str] = None):
+        """Replace one language's index with a new one holding these (normalised) vectors"""
+        index = self._new_index(len(ids), index_type)
+        if not index.is_trained:
+            sample = vectors
+            if len(vectors) > IVF_TRAIN_SIZE:
+                sample = vectors[np.random.default_rng(0).choice(len(vectors), IVF_TRAIN_SIZE, replace=False)]
+            index.train(np.ascontiguousarray(sample, dtype="float32"))
+        if language == 'en':
+            self.index_en, self.documents_en = index, {}
+        else:
+            self.index_ta, self.documents_ta = index, {}
+        self.tombstones[language] = 0
+        if ids:
+            self._add_vectors(language, ids, vectors, docs)
+    
+    def _ensure_owned(self):
+        """Copy mmap'd snapshot indexes into owned memory before the first add/remove"""
+        if self._mapped:
+            self.index_en = faiss.deserialize_index(faiss.serialize_index(self.index_en))
+            self.index_ta = faiss.deserialize_index(faiss.serialize_index(self.index_ta))
+            self._mapped = False
+    
+    def _index_for(self, language: str):
+        if language == 'en':
+            return self.index_en, self.documents_en
+        return self.index_ta, self.documents_ta
+    
+    def _add_vectors(self, language: str, ids: List[int], vectors: np.ndarray, docs: List[Dict]):
+        """Normalise and add a batch of vectors in one FAISS call"""
+        self._ensure_owned()
+        index, documents = self._index_for(language)
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        faiss.normalize_L2(vectors)
+        labels = np.asarray(ids, dtype="int64")
+        if self._uses_tombstones(index):
+            self.generation += 1
+            labels = labels | (self.generation << 32)
+        index.add_with_ids(vectors, labels)
+        for doc_id, label, doc_data in zip(ids, labels, docs):
+            documents[doc_id] = dict(doc_data, label=int(label))
+        return vectors
+    
+    @staticmethod
+    def _doc_data(kb, text: str) -> Dict:
+        return {
+            'id': kb.id,
+            'title': kb.title,
+            'content': text,
+            'category': kb.category,
+            'metadata': {'keywords': kb.keywords}
+        }
+    
+    @staticmethod
+    def _texts(kb) -> List[Tuple[str, str, str]]:
+        """(language, text, embedding column) for each language version of an article"""
+        texts = [('en', kb.content_en or kb.content, 'embedding_en')]
+        if kb.content_ta:
+            texts.append(('ta', kb.content_ta, 'embedding_ta'))
+        return texts
     
     def add_document(self, doc_id: int, title: str, content: str, language: str, 
                      category: str, metadata: Dict = None):
         """Add document to vector store"""
         embedding = self.embedding_service.encode(content)
+        self.encoded += 1
         
         doc_data = {
             'id': doc_id,
@@ -130,66 +483,289 @@ class FAISSVectorStore:
             'category': category,
             'metadata': metadata or {}
         }
+        self.remove_document(doc_id, language)
+        self._add_vectors(language, [doc_id], np.asarray([embedding]), [doc_data])
+    
+    def remove_document(self, doc_id: int, language: Optional[str] = None):
+        """Drop a document's vector(s) from one or both indexes"""
+        self._ensure_owned()
+        for lang in ([language] if language else ['en', 'ta']):
+            index, documents = self._index_for(lang)
+            if documents.pop(doc_id, None) is None:
+                continue
+            if self._uses_tombstones(index):
+                self.tombstones[lang] += 1  # Vector stays; its label no longer matches documents
+            else:
+                index.remove_ids(np.asarray([doc_id], dtype="int64"))
+    
+    def _encode_items(self, items: List[Tuple], batch_size: int) -> Tuple[np.ndarray, Dict[int, Dict[str, str]]]:
+        """
+        Normalised vectors for (kb, text, column) items, encoding batch_size at a time
         
-        if language == 'en':
-            self.index_en.add(np.array([embedding]))
-            self.documents_en.append(doc_data)
-        else:
-            self.index_ta.add(np.array([embedding]))
-            self.documents_ta.append(doc_data)
+        Cached vectors are reused; the rest of each batch goes through one
+        encode_batch call. Also returns {kb_id: {column: stored embedding}} for new vectors.
+        """
+        model_name = self.embedding_service.model_name
+        vectors = np.zeros((len(items), self.dimension), dtype="float32")
+        updates: Dict[int, Dict[str, str]] = {}
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            digests = [content_hash(text, model_name) for _, text, _ in batch]
+            misses = []
+            for i, ((kb, _, column), digest) in enumerate(zip(batch, digests)):
+                cached = load_embedding(getattr(kb, column), digest)
+                if cached is not None and cached.shape == (self.dimension,):
+                    vectors[start + i] = cached
+                else:
+                    misses.append(i)
+            if misses:
+                encoded = np.ascontiguousarray(self.embedding_service.encode_batch(
+                    [batch[i][1] for i in misses], batch_size=batch_size
+                ), dtype="float32")
+                faiss.normalize_L2(encoded)
+                vectors[[start + i for i in misses]] = encoded
+            self.encoded += len(misses)
+            self.cache_hits += len(batch) - len(misses)
+            
+            if self.embedding_service.available:  # Never persist the zero-vector fallback
+                for i in misses:
+                    kb, _, column = batch[i]
+                    updates.setdefault(kb.id, {})[column] = dump_embedding(digests[i], vectors[start + i])
+        return vectors, updates
+    
+    def _index_items(self, language: str, items: List[Tuple], batch_size: int) -> Dict[int, Dict[str, str]]:
+        """Encode and add (kb, text, column) items to the existing index for one language"""
+        vectors, updates = self._encode_items(items, batch_size)
+        if items:
+            self._add_vectors(
+                language,
+                [kb.id for kb, _, _ in items],
+                vectors,
+                [self._doc_data(kb, text) for kb, text, _ in items]
+            )
+        return updates
     
-    def search(self, query: str, language: str, top_k: int = 5) -> List[Dict]:
+    def upsert_knowledge(self, kb) -> Dict[str, str]:
+        """
+        Index (or re-index / drop) one ChatbotKnowledge row in place
+        
+        Reuses kb.embedding_en / embedding_ta when the content hash matches.
+        Returns the embedding columns that need saving ({} if none).
+        """
+        self.remove_document(kb.id)
+        if not kb.is_active:
+            return {}
+        
+        updates = {}
+        for language, text, column in self._texts(kb):
+            updates.update(self._index_items(language, [(kb, text, column)], 1).get(kb.id, {}))
+        return updates
+    
+    def search(self, query: str, language: str, top_k: int = 5, min_similarity: float = SEARCH_MIN_SIMILARITY,
+               mmr_lambda: float = MMR_LAMBDA) -> List[Dict]:
         """Search for most relevant documents"""
-        query_embedding = self.embedding_service.encode(query)
+        query_embedding = np.asarray([self.embedding_service.encode(query)], dtype="float32")
+        return self.search_vector(query_embedding, language, top_k, min_similarity, mmr_lambda)
+    
+    def search_vector(self, query_embedding: np.ndarray, language: str, top_k: int = 5,
+                      min_similarity: float = SEARCH_MIN_SIMILARITY, mmr_lambda: float = 1.0) -> List[Dict]:
+        """
+        Search with an already-encoded (1, dimension) query vector
+        
+        Each result carries 'similarity' (cosine) and 'relevance_score'
+        (similarity rescaled from [SCORE_FLOOR, SCORE_CEILING] to 0..1).
+        Results below min_similarity are dropped. mmr_lambda < 1 re-ranks
+        4 * top_k candidates with maximal marginal relevance and drops
+        candidates within DUPLICATE_SIMILARITY of one already picked, so
+        near-duplicate articles do not fill the context.
+        """
+        query_embedding = np.ascontiguousarray(query_embedding, dtype="float32")
+        faiss.normalize_L2(query_embedding)
         
         # Select appropriate index
-        index = self.index_en if language == 'en' else self.index_ta
-        documents = self.documents_en if language == 'en' else self.documents_ta
+        index, documents = self._index_for(language)
         
         if index.ntotal == 0:
             return []
         
-        # Search
-        distances, indices = index.search(np.array([query_embedding]), min(top_k, index.ntotal))
+        # Search (over-fetch for MMR, and when tombstones may take some of the slots)
+        use_mmr = mmr_lambda < 1.0 and top_k > 1
+        fetch = top_k * 4 if use_mmr or self.tombstones[language] else top_k
+        similarities, labels = index.search(query_embedding, min(fetch, index.ntotal))
+        
+        candidates = []
+        for label, similarity in zip(labels[0], similarities[0]):
+            if label < 0 or similarity < min_similarity:
+                continue  # IVF returns -1 when the probed lists hold fewer than k vectors
+            doc = documents.get(int(label) & 0xFFFFFFFF)
+            if doc is not None and doc.get('label', doc['id']) == label:
+                candidates.append((doc, int(label), float(similarity)))
+        
+        if use_mmr and len(candidates) > 1:
+            candidates = self._mmr(index, candidates, top_k, mmr_lambda)
         
         results = []
-        for idx, distance in zip(indices[0], distances[0]):
-            if idx < len(documents):
-                doc = documents[idx].copy()
-                doc['relevance_score'] = float(1 / (1 + distance))  # Convert distance to similarity
-                results.append(doc)
+        for doc, _, similarity in candidates[:top_k]:
+            doc = doc.copy()
+            doc.pop('label', None)
+            doc['similarity'] = similarity
+            doc['relevance_score'] = calibrate_score(similarity)
+            results.append(doc)
         
         return results
     
-    def rebuild_index(self, documents: List[Dict]):
-        """Rebuild FAISS index from database documents"""
-        # Clear existing indices
-        self.index_en = faiss.IndexFlatL2(self.dimension)
-        self.index_ta = faiss.IndexFlatL2(self.dimension)
-        self.documents_en = []
-        self.documents_ta = []
-        
-        # Add all documents
-        for doc in documents:
-            if doc.get('is_active', True):
-                self.add_document(
-                    doc_id=doc['id'],
-                    title=doc['title'],
-                    content=doc.get('content_en') or doc['content'],
-                    language='en',
-                    category=doc['category'],
-                    metadata={'keywords': doc.get('keywords')}
-                )
-                
-                if doc.get('content_ta'):
-                    self.add_document(
-                        doc_id=doc['id'],
-                        title=doc['title'],
-                        content=doc['content_ta'],
-                        language='ta',
-                        category=doc['category'],
-                        metadata={'keywords': doc.get('keywords')}
-                    )
+    @staticmethod
+    def _mmr(index, candidates: List[Tuple], top_k: int, mmr_lambda: float) -> List[Tuple]:
+        """Greedy maximal marginal relevance over (doc, label, similarity) candidates"""
+        try:
+            vectors = np.stack([index.reconstruct(label) for _, label, _ in candidates]).astype("float32")
+        except RuntimeError:
+            return candidates  # Index without reconstruct (e.g. a snapshot from an older build)
+        faiss.normalize_L2(vectors)
+        relevance = np.array([similarity for _, _, similarity in candidates], dtype="float32")
+        
+        selected = [0]  # Candidates arrive sorted, the best match always goes first
+        remaining = list(range(1, len(candidates)))
+        while remaining and len(selected) < top_k:
+            redundancy = (vectors[remaining] @ vectors[selected].T).max(axis=1)
+            distinct = redundancy < DUPLICATE_SIMILARITY
+            remaining = [i for i, keep in zip(remaining, distinct) if keep]
+            redundancy = redundancy[distinct]
+            if not remaining:
+                break
+            scores = mmr_lambda * relevance[remaining] - (1 - mmr_lambda) * redundancy
+            selected.append(remaining.pop(int(np.argmax(scores))))
+        return [candidates[i] for i in selected]
+    
+    def rebuild_index(self, knowledge: List, batch_size: int = EMBED_BATCH_SIZE) -> Dict[int, Dict[str, str]]:
+        """
+        Rebuild FAISS index from ChatbotKnowledge rows
+        
+        Documents are grouped by language and encoded batch_size at a time;
+        only documents whose content hash changed are re-encoded. Each
+        language's index type is picked from its document count.
+        Returns {kb_id: embedding columns to save} for those.
+        """
+        self._mapped = False
+        by_language: Dict[str, List[Tuple]] = {'en': [], 'ta': []}
+        for kb in knowledge:
+            if kb.is_active:
+                for language, text, column in self._texts(kb):
+                    by_language[language].append((kb, text, column))
+        
+        updates: Dict[int, Dict[str, str]] = {}
+        for language, items in by_language.items():
+            # All vectors first: IVF-PQ trains on them before anything is added
+            vectors, encoded = self._encode_items(items, batch_size)
+            self._build_index(
+                language,
+                [kb.id for kb, _, _ in items],
+                vectors,
+                [self._doc_data(kb, text) for kb, text, _ in items]
+            )
+            for kb_id, columns in encoded.items():
+                updates.setdefault(kb_id, {}).update(columns)
+        self.built = True
+        return updates
+    
+    # ---- snapshots ---------------------------------------------------------
+    
+    def save_snapshot(self, version: str) -> str:
+        """
+        Write both indexes plus a documents.json sidecar to INDEX_SNAPSHOT_DIR/<version>
+        
+        Written to a temporary directory and renamed into place, so readers
+        never see a partial snapshot. Older snapshots beyond
+        INDEX_SNAPSHOTS_KEPT are removed.
+        """
+        target = os.path.join(INDEX_SNAPSHOT_DIR, version)
+        self.version = version
+        if os.path.isdir(target):
+            return target  # Same knowledge-base version already written (e.g. by another worker)
+        os.makedirs(INDEX_SNAPSHOT_DIR, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=f".{version}-", dir=INDEX_SNAPSHOT_DIR)
+        try:
+            faiss.write_index(self.index_en, os.path.join(staging, "index_en.faiss"))
+            faiss.write_index(self.index_ta, os.path.join(staging, "index_ta.faiss"))
+            with open(os.path.join(staging, "documents.json"), "w", encoding="utf-8") as sidecar:
+                json.dump({
+                    'version': version,
+                    'dimension': self.dimension,
+                    'created_at': datetime.utcnow().isoformat(),
+                    'generation': self.generation,
+                    'tombstones': self.tombstones,
+                    'documents_en': self.documents_en,
+                    'documents_ta': self.documents_ta,
+                }, sidecar, ensure_ascii=False)
+            os.rename(staging, target)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            if not os.path.isdir(target):
+                raise
+        self._prune_snapshots()
+        return target
+    
+    @staticmethod
+    def _prune_snapshots():
+        snapshots = sorted(
+            (entry for entry in os.scandir(INDEX_SNAPSHOT_DIR) if entry.is_dir() and not entry.name.startswith(".")),
+            key=lambda entry: entry.stat().st_mtime,
+            reverse=True
+        )
+        for entry in snapshots[INDEX_SNAPSHOTS_KEPT:]:
+            shutil.rmtree(entry.path, ignore_errors=True)
+    
+    def load_snapshot(self, version: str) -> bool:
+        """
+        Load the snapshot for this knowledge-base version, memory-mapped when FAISS supports it
+        
+        Mapped pages are shared by every worker on the host; the first
+        add/remove copies the indexes into process memory.
+        """
+        source = os.path.join(INDEX_SNAPSHOT_DIR, version)
+        sidecar_path = os.path.join(source, "documents.json")
+        if not os.path.isfile(sidecar_path):
+            return False
+        with open(sidecar_path, encoding="utf-8") as sidecar:
+            meta = json.load(sidecar)
+        if meta.get('dimension') != self.dimension:
+            return False
+        
+        flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+        mapped = flag is not None
+        if flag is None:
+            flag = getattr(faiss, "IO_FLAG_MMAP", 0)
+        indexes = []
+        for language in ('en', 'ta'):
+            path = os.path.join(source, f"index_{language}.faiss")
+            try:
+                indexes.append(faiss.read_index(path, flag))
+            except RuntimeError:
+                indexes.append(faiss.read_index(path))  # Index types that cannot be mapped
+        self.index_en, self.index_ta = indexes
+        self.documents_en = {int(doc_id): doc for doc_id, doc in meta['documents_en'].items()}
+        self.documents_ta = {int(doc_id): doc for doc_id, doc in meta['documents_ta'].items()}
+        self.generation = meta.get('generation', 0)
+        self.tombstones = meta.get('tombstones', {'en': 0, 'ta': 0})
+        self._mapped = mapped
+        self.version = version
+        self.built = True
+        return True
+    
+    def stats(self) -> Dict:
+        return {
+            'built': self.built,
+            'version': self.version,
+            'memory_mapped': self._mapped,
+            'documents_en': len(self.documents_en),
+            'documents_ta': len(self.documents_ta),
+            'index_type_en': self.index_type(self.index_en),
+            'index_type_ta': self.index_type(self.index_ta),
+            'tombstones': self.tombstones,
+            'encoded': self.encoded,
+            'embedding_cache_hits': self.cache_hits,
+            'model_loaded': self._embedding_service is not None and self._embedding_service.available,
+        }
 
 
 class MistralService:
@@ -432,7 +1008,8 @@ class IntentDetector:
         return 'general'
     
     @staticmethod
-    def should_handoff(message: str, confidence: float) -> Tuple[bool, str]:
+    def should_handoff(message: str, confidence: float,
+                       threshold: float = HANDOFF_CONFIDENCE_THRESHOLD) -> Tuple[bool, str]:
         """
         Determine if conversation should be handed off to human
         Returns: (should_handoff, reason)
@@ -442,7 +1019,7 @@ class IntentDetector:
             return True, 'customer_request'
         
         # Low confidence
-        if confidence < 0.5:
+        if confidence < threshold:
             return True, 'low_confidence'
         
         return False, ''
@@ -459,10 +1036,118 @@ def get_vector_store() -> FAISSVectorStore:
     """Get or create vector store instance"""
     global _vector_store
     if _vector_store is None:
-        _vector_store = FAISSVectorStore()
+        with _load_lock:
+            if _vector_store is None:
+                _vector_store = FAISSVectorStore()
     return _vector_store
 
 
+def knowledge_version(db, model_name: Optional[str] = None, dimension: int = 384) -> str:
+    """
+    Stamp for the current knowledge base: changes on every insert, update or delete
+    
+    Embedding write-backs and usage stats keep updated_at unchanged, so they
+    do not move it; any other write to chatbot_knowledge must do the same.
+    """
+    from sqlalchemy import case, func
+    import models
+    
+    knowledge = models.ChatbotKnowledge
+    total, active, max_id, last_updated = db.query(
+        func.count(knowledge.id),
+        func.sum(case((knowledge.is_active == True, 1), else_=0)),
+        func.max(knowledge.id),
+        func.max(knowledge.updated_at),
+    ).one()
+    model_name = model_name or embedding_model_key()
+    stamp = f"{total}:{active or 0}:{max_id or 0}:{last_updated}:{model_name}:{dimension}:ip"
+    return hashlib.sha1(stamp.encode("utf-8")).hexdigest()[:16]
+
+
+def warm_start_vector_store(db) -> bool:
+    """
+    Map the snapshot for the current knowledge-base version, if one exists
+    
+    Never loads the embedding model; a missing snapshot leaves the store
+    unbuilt and the first knowledge write / rebuild-index builds it.
+    """
+    if not FAISS_AVAILABLE:
+        return False
+    store = get_vector_store()
+    return store.built or store.load_snapshot(knowledge_version(db))
+
+
+class ChatbotWarmup:
+    """
+    Loads FAISS, the index snapshot and the embedding model on a background thread
+    
+    Started after startup when CHATBOT_PRELOAD is set, otherwise by the first
+    chatbot request (e.g. the /api/chatbot/ready probe), so only processes
+    that serve chatbot traffic pay for the model.
+    """
+    
+    def __init__(self):
+        self.state = "idle"  # idle -> loading -> ready | failed
+        self.error: Optional[str] = None
+        self.started_at: Optional[datetime] = None
+        self.load_seconds: Optional[float] = None
+        self.snapshot_loaded = False
+        self._thread: Optional[threading.Thread] = None
+    
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+    
+    def start(self) -> bool:
+        """Begin loading unless already loading / loaded; returns readiness"""
+        with _load_lock:
+            if self._thread is None or self.state == "failed":
+                self.state = "loading"
+                self.error = None
+                self.started_at = datetime.utcnow()
+                self._thread = threading.Thread(target=self._load, name="chatbot-warmup", daemon=True)
+                self._thread.start()
+        return self.ready
+    
+    def _load(self):
+        from database import SessionLocal
+        
+        started = time.perf_counter()
+        try:
+            if not FAISS_AVAILABLE:
+                raise ImportError("faiss-cpu is required")
+            db = SessionLocal()
+            try:
+                self.snapshot_loaded = warm_start_vector_store(db)
+            finally:
+                db.close()
+            embedding_service = get_vector_store().embedding_service
+            if not embedding_service.available:
+                raise RuntimeError("embedding model could not be loaded")
+            embedding_service.encode("warm up")
+            self.state = "ready"
+            print(f"✅ Chatbot model ready in {time.perf_counter() - started:.1f}s")
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            print(f"⚠️ Chatbot warm-up failed: {e}")
+        finally:
+            self.load_seconds = round(time.perf_counter() - started, 3)
+    
+    def status(self) -> Dict:
+        return {
+            'ready': self.ready,
+            'state': self.state,
+            'error': self.error,
+            'started_at': self.started_at,
+            'load_seconds': self.load_seconds,
+            'snapshot_loaded': self.snapshot_loaded,
+        }
+
+
+chatbot_warmup = ChatbotWarmup()
+
+
 def get_mistral_service() -> MistralService:
     """Get or create Mistral service instance"""
     global _mistral_service
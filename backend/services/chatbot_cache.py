@@ -0,0 +1,203 @@
+"""
+Chatbot Response Cache
+Two-level cache in front of the vector search + Mistral call in
+/api/chatbot/chat, so repeat questions (price, AMC, service booking) are
+answered without an LLM round trip.
+
+- Level 1: exact match on the normalised message text (case, punctuation
+  and whitespace folded) plus the requested language; an LRU of
+  CHATBOT_CACHE_SIZE entries. Checked before language detection.
+- Level 2: semantic match; the query embedding is compared with up to
+  CHATBOT_SEMANTIC_CACHE_SIZE cached query embeddings of the same language
+  and reused above CHATBOT_CACHE_SIMILARITY cosine. Only used once the
+  embedding model is loaded on this worker.
+- Entries expire after CHATBOT_CACHE_TTL seconds. All entries belong to one
+  knowledge-base version (services.chatbot_ai.knowledge_version); a lookup
+  under a new version empties the cache, and knowledge writes call
+  invalidate().
+- Only a session's first turn is looked up or stored: later replies are
+  generated with the conversation history, which the key does not cover.
+- Replies that triggered a handoff are never stored.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+import os
+import re
+import time
+
+import numpy as np
+
+CHATBOT_CACHE_SIZE = int(os.getenv("CHATBOT_CACHE_SIZE", "2000"))
+CHATBOT_SEMANTIC_CACHE_SIZE = int(os.getenv("CHATBOT_SEMANTIC_CACHE_SIZE", "500"))  # per language
+CHATBOT_CACHE_TTL = int(os.getenv("CHATBOT_CACHE_TTL", "3600"))  # seconds
+CHATBOT_CACHE_SIMILARITY = float(os.getenv("CHATBOT_CACHE_SIMILARITY", "0.95"))
+
+# Keep letters, digits, whitespace and the Tamil block (its vowel signs are not \w)
+_NOT_TEXT = re.compile(r"[^\w\s஀-௿]+")
+_SPACES = re.compile(r"\s+")
+
+
+@dataclass
+class CachedReply:
+    reply: str
+    confidence: float
+    language: str
+    doc_ids: List[int] = field(default_factory=list)
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class ChatResponseCache:
+    """Exact LRU + per-language semantic cache of chatbot replies"""
+
+    def __init__(self, size: int = CHATBOT_CACHE_SIZE, semantic_size: int = CHATBOT_SEMANTIC_CACHE_SIZE,
+                 ttl: float = CHATBOT_CACHE_TTL, similarity: float = CHATBOT_CACHE_SIMILARITY):
+        self.size = size
+        self.semantic_size = semantic_size
+        self.ttl = ttl
+        self.similarity = similarity
+        self.version: Optional[str] = None
+        self._exact: "OrderedDict[Tuple[str, str], CachedReply]" = OrderedDict()
+        # language -> OrderedDict[normalised text, (unit vector, reply)]
+        self._semantic: Dict[str, "OrderedDict[str, Tuple[np.ndarray, CachedReply]]"] = {}
+        self._matrices: Dict[str, Tuple[np.ndarray, List[str]]] = {}
+        self._lock = Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def normalise(text: str) -> str:
+        return _SPACES.sub(" ", _NOT_TEXT.sub(" ", text.lower())).strip()
+
+    def _expired(self, entry: CachedReply) -> bool:
+        return time.monotonic() - entry.created_at > self.ttl
+
+    def _check_version(self, version: str):
+        """Drop everything answered under an older knowledge-base version"""
+        if version != self.version:
+            if self.version is not None:
+                self._clear()
+                self.invalidations += 1
+            self.version = version
+
+    def _clear(self):
+        self._exact.clear()
+        self._semantic.clear()
+        self._matrices.clear()
+
+    # ---- lookups ----------------------------------------------------------
+
+    def get(self, text: str, language: Optional[str], version: str) -> Optional[CachedReply]:
+        """Level 1: exact normalised text for the requested language (None = auto-detect)"""
+        key = (self.normalise(text), language or "")
+        with self._lock:
+            self._check_version(version)
+            entry = self._exact.get(key)
+            if entry is not None and self._expired(entry):
+                del self._exact[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                return None
+            self._exact.move_to_end(key)
+            self.exact_hits += 1
+            return entry
+
+    def _matrix(self, language: str) -> Tuple[np.ndarray, List[str]]:
+        if language not in self._matrices:
+            entries = self._semantic.get(language) or {}
+            keys = list(entries)
+            vectors = np.stack([entries[key][0] for key in keys]) if keys else np.zeros((0, 0), dtype="float32")
+            self._matrices[language] = (vectors, keys)
+        return self._matrices[language]
+
+    def get_semantic(self, embedding: np.ndarray, language: str, version: str) -> Optional[CachedReply]:
+        """Level 2: nearest cached query of the same language above the similarity threshold"""
+        query = self._unit(embedding)
+        with self._lock:
+            self._check_version(version)
+            vectors, keys = self._matrix(language)
+            if keys:
+                scores = vectors @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity:
+                    entries = self._semantic[language]
+                    _, entry = entries[keys[best]]
+                    if not self._expired(entry):
+                        entries.move_to_end(keys[best])
+                        self.semantic_hits += 1
+                        return entry
+                    del entries[keys[best]]
+                    self._matrices.pop(language, None)
+                    self.expirations += 1
+            self.misses += 1
+            return None
+
+    def miss(self):
+        """Count a miss when the semantic level was skipped (model not loaded yet)"""
+        with self._lock:
+            self.misses += 1
+
+    # ---- writes -----------------------------------------------------------
+
+    @staticmethod
+    def _unit(embedding: np.ndarray) -> np.ndarray:
+        vector = np.asarray(embedding, dtype="float32").reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def put(self, text: str, requested_language: Optional[str], entry: CachedReply, version: str,
+            embedding: Optional[np.ndarray] = None):
+        """Store a reply under its exact key and, with an embedding, in the semantic level"""
+        normalised = self.normalise(text)
+        with self._lock:
+            self._check_version(version)
+            self._exact[(normalised, requested_language or "")] = entry
+            self._exact.move_to_end((normalised, requested_language or ""))
+            while len(self._exact) > self.size:
+                self._exact.popitem(last=False)
+                self.evictions += 1
+
+            if embedding is not None:
+                entries = self._semantic.setdefault(entry.language, OrderedDict())
+                entries[normalised] = (self._unit(embedding), entry)
+                entries.move_to_end(normalised)
+                while len(entries) > self.semantic_size:
+                    entries.popitem(last=False)
+                    self.evictions += 1
+                self._matrices.pop(entry.language, None)
+            self.stores += 1
+
+    def invalidate(self):
+        """Call after knowledge-base writes"""
+        with self._lock:
+            self._clear()
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "exact_entries": len(self._exact),
+            "semantic_entries": {language: len(entries) for language, entries in self._semantic.items()},
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.exact_hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "knowledge_version": self.version,
+            "ttl_seconds": self.ttl,
+            "similarity_threshold": self.similarity,
+        }
+
+
+chat_response_cache = ChatResponseCache()
@@ -0,0 +1,191 @@
+"""
+SLA Deadline Timer
+Heap-based deadline scheduler that fires SLA warnings/breaches at the exact
+threshold instant instead of waiting for the next 15-minute sweep.
+
+- seed() loads open tickets once at startup (one query).
+- track(complaint) is called by routers/service_requests.py and
+  service_engineer.update_job_status after create / reassign / hold /
+  resume / complete; it replaces the ticket's pending deadlines.
+- Superseded heap entries are skipped lazily via a per-ticket generation.
+- The periodic sweep in scheduler.check_service_sla stays as reconciliation:
+  it catches anything missed (e.g. writes from another worker) and reseeds.
+- Only the elected scheduler leader runs the timer (scheduler_leader); on
+  other workers track() is a no-op.
+"""
+
+from datetime import datetime
+from threading import Condition, Thread
+from typing import Dict, List, Optional, Tuple
+import heapq
+import itertools
+import logging
+import time
+
+import models
+from database import SchedulerSessionLocal
+from notification_service import NotificationService
+from sla_utils import SLA_OPEN_STATUSES, process_sla_deadline, sla_thresholds
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Fire slightly after the threshold so calculate_sla_status agrees it has passed
+FIRE_GRACE_SECONDS = 0.05
+
+
+def _to_epoch(moment: datetime) -> float:
+    """Naive UTC datetime -> epoch seconds"""
+    return (moment - _EPOCH).total_seconds()
+
+
+class SLADeadlineTimer:
+    """Min-heap of (fire_at, seq, complaint_id, generation, kind) served by one daemon thread"""
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, int, int, str]] = []
+        self._generation: Dict[int, int] = {}
+        self._seq = itertools.count()
+        self._generations = itertools.count(1)
+        self._cond = Condition()
+        self._thread: Optional[Thread] = None
+        self._running = False
+        self.scheduled = 0
+        self.fired = 0
+        self.sent = 0
+        self.stale = 0
+        self.max_lag_ms = 0.0
+
+    # ---- schedule maintenance ---------------------------------------------
+
+    def _deadlines(self, complaint) -> List[Tuple[float, str]]:
+        if complaint.status not in SLA_OPEN_STATUSES or complaint.sla_breach_sent or not complaint.created_at:
+            return []
+        thresholds = sla_thresholds(complaint.priority, complaint.created_at)
+        deadlines = [(_to_epoch(thresholds['breach']), 'breach')]
+        if not complaint.sla_warning_sent:
+            deadlines.append((_to_epoch(thresholds['warning']), 'warning'))
+        return deadlines
+
+    def _push_locked(self, complaint_id: int, deadlines: List[Tuple[float, str]]):
+        generation = next(self._generations)
+        self._generation[complaint_id] = generation
+        for fire_at, kind in deadlines:
+            heapq.heappush(self._heap, (fire_at + FIRE_GRACE_SECONDS, next(self._seq), complaint_id, generation, kind))
+            self.scheduled += 1
+        if not deadlines:
+            self._generation.pop(complaint_id, None)
+
+    def track(self, complaint):
+        """(Re)schedule a ticket's deadlines from its current state; cancels them if it is closed/on hold"""
+        if not self._running:
+            return  # Not the scheduler leader: the leader's sweep picks the change up
+        deadlines = self._deadlines(complaint)
+        with self._cond:
+            self._push_locked(complaint.id, deadlines)
+            self._cond.notify()
+
+    def cancel(self, complaint_id: int):
+        with self._cond:
+            self._generation.pop(complaint_id, None)
+
+    def seed(self, db=None) -> int:
+        """Rebuild the heap from open tickets (startup and reconciliation)"""
+        own_session = db is None
+        db = db or SchedulerSessionLocal()
+        try:
+            rows = db.query(
+                models.Complaint.id,
+                models.Complaint.status,
+                models.Complaint.priority,
+                models.Complaint.created_at,
+                models.Complaint.sla_warning_sent,
+                models.Complaint.sla_breach_sent,
+            ).filter(
+                models.Complaint.status.in_(SLA_OPEN_STATUSES),
+                models.Complaint.sla_breach_sent == False
+            ).all()
+        finally:
+            if own_session:
+                db.close()
+
+        with self._cond:
+            self._heap = []
+            self._generation = {}
+            for row in rows:
+                self._push_locked(row.id, self._deadlines(row))
+            self._cond.notify()
+        return len(rows)
+
+    # ---- firing -----------------------------------------------------------
+
+    def _fire(self, complaint_id: int, kind: str, fire_at: float):
+        self.fired += 1
+        self.max_lag_ms = max(self.max_lag_ms, (time.time() - fire_at) * 1000)
+        db = SchedulerSessionLocal()
+        try:
+            if process_sla_deadline(db, NotificationService, complaint_id, kind):
+                self.sent += 1
+        except Exception as e:
+            db.rollback()
+            logger.error(f"❌ SLA {kind} for complaint {complaint_id} failed: {e}")
+        finally:
+            db.close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    fire_at, _, complaint_id, generation, kind = self._heap[0]
+                    delay = fire_at - time.time()
+                    if delay > 0:
+                        self._cond.wait(delay)
+                        continue
+                    heapq.heappop(self._heap)
+                    if self._generation.get(complaint_id) != generation:
+                        self.stale += 1
+                        continue
+                    break
+                if not self._running:
+                    return
+            self._fire(complaint_id, kind, fire_at)
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = Thread(target=self._run, name="sla-deadline-timer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._heap = []
+            self._generation = {}
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self) -> dict:
+        with self._cond:
+            next_fire = self._heap[0][0] if self._heap else None
+            return {
+                "running": self._running,
+                "pending": len(self._heap),
+                "tracked_tickets": len(self._generation),
+                "next_fire_in_seconds": round(next_fire - time.time(), 3) if next_fire else None,
+                "scheduled": self.scheduled,
+                "fired": self.fired,
+                "sent": self.sent,
+                "stale_skipped": self.stale,
+                "max_lag_ms": round(self.max_lag_ms, 3),
+            }
+
+
+sla_timer = SLADeadlineTimer()
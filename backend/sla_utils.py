@@ -3,9 +3,12 @@ SLA Calculation and Escalation Utilities
 Handles SLA status computation and notification triggers
 """
 from datetime import datetime, timedelta
-from typing import Dict, Optional
+from typing import Dict, List, Optional
+import os
+import time
+from sqlalchemy import and_, func, or_, update
 from sqlalchemy.orm import Session
-from models import Complaint, User, UserRole
+from models import Complaint, SLASweepRun, User, UserRole
 from notification_service import NotificationService
 
 # SLA Time Limits (in hours)
@@ -14,6 +17,17 @@ SLA_LIMITS = {
     "URGENT": 12,    # WARM
     "NORMAL": 24     # COLD
 }
+DEFAULT_SLA_HOURS = 24
+
+# Warn when this share of the SLA window remains
+SLA_WARNING_REMAINING = 0.30
+
+# Statuses on which the SLA clock runs
+SLA_OPEN_STATUSES = ['ASSIGNED', 'ON_THE_WAY', 'IN_PROGRESS']
+
+# Sweep without the watermark lower bound at least this often (hours)
+SLA_FULL_SWEEP_HOURS = int(os.getenv("SLA_FULL_SWEEP_HOURS", "6"))
+SLA_SWEEP_HISTORY_DAYS = 30
 
 def calculate_sla_status(complaint: Complaint) -> Dict:
     """
@@ -47,7 +61,7 @@ def calculate_sla_status(complaint: Complaint) -> Dict:
     
     # Get SLA hours based on priority
     priority = complaint.priority or "NORMAL"
-    sla_hours = SLA_LIMITS.get(priority, 24)
+    sla_hours = SLA_LIMITS.get(priority, DEFAULT_SLA_HOURS)
     
     # Calculate SLA due time
     sla_due_time = complaint.created_at + timedelta(hours=sla_hours)
@@ -79,46 +93,165 @@ def calculate_sla_status(complaint: Complaint) -> Dict:
     }
 
 
+def _threshold_clause(now: datetime, fraction: float, upper_fraction: Optional[float] = None,
+                      since: Optional[datetime] = None):
+    """
+    SQL condition "the `fraction` point of this ticket's SLA window has passed",
+    i.e. created_at + fraction * SLA_LIMITS[priority] <= now, written per priority
+    as created_at <= now - window so it stays an index range scan.
+    
+    upper_fraction: also require that point `upper_fraction` has NOT passed yet
+    since: only tickets whose threshold fell after this watermark, or whose
+           status / priority / created_at changed after it (sla_touched_at),
+           e.g. reopened or backdated past the threshold
+    """
+    def window(hours):
+        conditions = [Complaint.created_at <= now - timedelta(hours=hours * fraction)]
+        if upper_fraction is not None:
+            conditions.append(Complaint.created_at > now - timedelta(hours=hours * upper_fraction))
+        if since is not None:
+            conditions.append(or_(
+                Complaint.created_at > since - timedelta(hours=hours * fraction),
+                Complaint.sla_touched_at > since
+            ))
+        return and_(*conditions)
+    
+    clauses = [
+        and_(Complaint.priority == priority, window(hours))
+        for priority, hours in SLA_LIMITS.items()
+    ]
+    # Unknown / missing priority uses the NORMAL window (see calculate_sla_status)
+    clauses.append(and_(
+        or_(Complaint.priority.is_(None), Complaint.priority.notin_(list(SLA_LIMITS))),
+        window(DEFAULT_SLA_HOURS)
+    ))
+    return or_(*clauses)
+
+
+def _claim(db: Session, ids: List[int], flag) -> List[int]:
+    """Set an SLA flag for ids where it is still unset; returns the ids this run claimed"""
+    if not ids:
+        return []
+    stmt = update(Complaint).where(Complaint.id.in_(ids), flag == False).values({flag: True})
+    if db.get_bind().dialect.update_returning:
+        return list(db.execute(stmt.returning(Complaint.id)).scalars().all())
+    db.execute(stmt)
+    return ids
+
+
 def check_and_send_sla_notifications(db: Session, notif_service: NotificationService):
     """
-    Check all open service requests and send SLA notifications
+    Send SLA warnings/breaches for tickets that crossed a threshold since the last run
     Runs every 15 minutes via scheduler
+    
+    Thresholds are evaluated in SQL (ix_complaints_sla_sweep), bounded below by the
+    previous run's watermark, so cost follows the number of transitions rather than
+    the number of open tickets. Tickets whose status, priority or created_at
+    changed since the watermark (sla_touched_at) are checked too, so a ticket
+    reopened or backdated past its threshold is caught on the next run. Every
+    SLA_FULL_SWEEP_HOURS (and on the first run) the lower bound is dropped as a
+    reconciliation for changes made outside the ORM.
     """
+    started = time.perf_counter()
+    now = datetime.utcnow()
     print(f"\n🔔 [{datetime.now()}] Running SLA escalation check...")
     
-    # Get all open service requests
-    open_complaints = db.query(Complaint).filter(
-        Complaint.status.in_(['ASSIGNED', 'ON_THE_WAY', 'IN_PROGRESS'])
+    last_run = db.query(SLASweepRun).order_by(SLASweepRun.watermark.desc()).first()
+    last_full = db.query(func.max(SLASweepRun.watermark)).filter(SLASweepRun.full_sweep == True).scalar()
+    full_sweep = (
+        last_run is None or last_full is None
+        or now - last_full >= timedelta(hours=SLA_FULL_SWEEP_HOURS)
+    )
+    since = None if full_sweep else last_run.watermark
+    
+    open_filter = and_(
+        Complaint.status.in_(SLA_OPEN_STATUSES),
+        Complaint.sla_breach_sent == False
+    )
+    
+    # Breached: 100% of the window elapsed
+    breached = db.query(Complaint).filter(
+        open_filter,
+        _threshold_clause(now, 1.0, since=since)
+    ).all()
+    
+    # Warning: 70% elapsed (30% remaining) but not yet breached
+    warned = db.query(Complaint).filter(
+        open_filter,
+        Complaint.sla_warning_sent == False,
+        _threshold_clause(now, 1.0 - SLA_WARNING_REMAINING, upper_fraction=1.0, since=since)
     ).all()
     
-    warning_count = 0
-    breach_count = 0
-    
-    for complaint in open_complaints:
-        sla_status = calculate_sla_status(complaint)
-        
-        # Handle SLA Warning (30% time left)
-        if sla_status['status'] == 'warning' and not complaint.sla_warning_sent:
-            send_sla_warning(db, notif_service, complaint, sla_status)
-            complaint.sla_warning_sent = True
-            warning_count += 1
-        
-        # Handle SLA Breach
-        elif sla_status['status'] == 'breached' and not complaint.sla_breach_sent:
-            send_sla_breach(db, notif_service, complaint, sla_status)
-            complaint.sla_breach_sent = True
-            breach_count += 1
+    breach_ids = set(_claim(db, [c.id for c in breached], Complaint.sla_breach_sent))
+    warning_ids = set(_claim(db, [c.id for c in warned], Complaint.sla_warning_sent))
     
+    for complaint in breached:
+        if complaint.id in breach_ids:
+            send_sla_breach(db, notif_service, complaint, calculate_sla_status(complaint))
+    for complaint in warned:
+        if complaint.id in warning_ids:
+            send_sla_warning(db, notif_service, complaint, calculate_sla_status(complaint))
+    
+    db.add(SLASweepRun(
+        watermark=now,
+        full_sweep=full_sweep,
+        candidates=len(breached) + len(warned),
+        warnings_sent=len(warning_ids),
+        breaches_sent=len(breach_ids),
+        duration_ms=round((time.perf_counter() - started) * 1000, 3),
+    ))
+    if full_sweep:
+        db.query(SLASweepRun).filter(
+            SLASweepRun.watermark < now - timedelta(days=SLA_SWEEP_HISTORY_DAYS)
+        ).delete(synchronize_session=False)
     db.commit()
     
-    print(f"✅ SLA Check Complete: {warning_count} warnings, {breach_count} breaches")
+    print(f"✅ SLA Check Complete: {len(warning_ids)} warnings, {len(breach_ids)} breaches"
+          f"{' (full sweep)' if full_sweep else ''}")
+    return {
+        'warnings_sent': len(warning_ids),
+        'breaches_sent': len(breach_ids),
+        'total_checked': len(breached) + len(warned),
+        'full_sweep': full_sweep,
+        'watermark': now
+    }
+
+
+def sla_thresholds(priority: Optional[str], created_at: datetime) -> Dict[str, datetime]:
+    """Instants at which a ticket enters 'warning' and 'breach' (same rule as the sweep)"""
+    hours = SLA_LIMITS.get(priority or "NORMAL", DEFAULT_SLA_HOURS)
     return {
-        'warnings_sent': warning_count,
-        'breaches_sent': breach_count,
-        'total_checked': len(open_complaints)
+        'warning': created_at + timedelta(hours=hours * (1.0 - SLA_WARNING_REMAINING)),
+        'breach': created_at + timedelta(hours=hours),
     }
 
 
+def process_sla_deadline(db: Session, notif_service: NotificationService,
+                         complaint_id: int, kind: str) -> bool:
+    """
+    Send the warning/breach notification for one ticket whose threshold just passed
+    Used by the SLA timer (sla_timer.py); returns True if a notification was sent
+    """
+    complaint = db.query(Complaint).filter(Complaint.id == complaint_id).first()
+    if complaint is None or complaint.status not in SLA_OPEN_STATUSES or complaint.sla_breach_sent:
+        return False
+    
+    sla_status = calculate_sla_status(complaint)
+    if kind == 'breach' and sla_status['status'] == 'breached':
+        if not _claim(db, [complaint.id], Complaint.sla_breach_sent):
+            return False
+        send_sla_breach(db, notif_service, complaint, sla_status)
+    elif kind == 'warning' and sla_status['status'] == 'warning' and not complaint.sla_warning_sent:
+        if not _claim(db, [complaint.id], Complaint.sla_warning_sent):
+            return False
+        send_sla_warning(db, notif_service, complaint, sla_status)
+    else:
+        return False
+    
+    db.commit()
+    return True
+
+
 def send_sla_warning(db: Session, notif_service: NotificationService, 
                      complaint: Complaint, sla_status: Dict):
     """
@@ -127,32 +260,30 @@ def send_sla_warning(db: Session, notif_service: NotificationService,
     """
     remaining_hours = abs(sla_status['remaining_hours'])
     
+    audience = notif_service.resolve_recipients(db, [UserRole.ADMIN])
+    
     # Notify assigned engineer
-    if complaint.assigned_to:
-        notif_service.create_notification(
-            db=db,
-            user_id=complaint.assigned_to,
-            title=f"⚠️ SLA Warning - Ticket #{complaint.ticket_no}",
-            message=f"Only {remaining_hours:.1f} hours left to complete service. Customer: {complaint.customer_name}",
-            notification_type="sla_warning",
-            priority="high",
-            module="service",
-            action_url=f"/service-engineer/jobs"
-        )
+    rows = notif_service.build_rows([complaint.assigned_to], {
+        "title": f"⚠️ SLA Warning - Ticket #{complaint.ticket_no}",
+        "message": f"Only {remaining_hours:.1f} hours left to complete service. Customer: {complaint.customer_name}",
+        "notification_type": "sla_warning",
+        "priority": "high",
+        "module": "service",
+        "action_url": f"/service-engineer/jobs"
+    })
     
     # Notify all admins
-    admins = db.query(User).filter(User.role == UserRole.ADMIN).all()
-    for admin in admins:
-        notif_service.create_notification(
-            db=db,
-            user_id=admin.id,
-            title=f"⚠️ SLA Warning - Ticket #{complaint.ticket_no}",
-            message=f"Service request nearing SLA breach. Engineer: {complaint.assigned_engineer.full_name if complaint.assigned_engineer else 'Unassigned'}. {remaining_hours:.1f}h remaining.",
-            notification_type="sla_warning",
-            priority="high",
-            module="service",
-            action_url=f"/admin/service-requests/{complaint.id}"
-        )
+    rows += notif_service.build_rows(audience[UserRole.ADMIN], {
+        "title": f"⚠️ SLA Warning - Ticket #{complaint.ticket_no}",
+        "message": f"Service request nearing SLA breach. Engineer: {complaint.assigned_engineer.full_name if complaint.assigned_engineer else 'Unassigned'}. {remaining_hours:.1f}h remaining.",
+        "notification_type": "sla_warning",
+        "priority": "high",
+        "module": "service",
+        "action_url": f"/admin/service-requests/{complaint.id}"
+    })
+    
+    # Committed together with the sla_warning_sent flag by the caller
+    notif_service.insert_rows(db, rows, commit=False)
     
     print(f"  ⚠️ SLA Warning sent for Ticket #{complaint.ticket_no}")
 
@@ -165,46 +296,40 @@ def send_sla_breach(db: Session, notif_service: NotificationService,
     """
     overdue_hours = abs(sla_status['remaining_hours'])
     
+    audience = notif_service.resolve_recipients(db, [UserRole.RECEPTION, UserRole.ADMIN])
+    
     # Notify assigned engineer
-    if complaint.assigned_to:
-        notif_service.create_notification(
-            db=db,
-            user_id=complaint.assigned_to,
-            title=f"🔴 SLA BREACHED - Ticket #{complaint.ticket_no}",
-            message=f"URGENT: Service request is {overdue_hours:.1f} hours overdue! Customer: {complaint.customer_name}. Take immediate action.",
-            notification_type="sla_breach",
-            priority="critical",
-            module="service",
-            action_url=f"/service-engineer/jobs"
-        )
+    rows = notif_service.build_rows([complaint.assigned_to], {
+        "title": f"🔴 SLA BREACHED - Ticket #{complaint.ticket_no}",
+        "message": f"URGENT: Service request is {overdue_hours:.1f} hours overdue! Customer: {complaint.customer_name}. Take immediate action.",
+        "notification_type": "sla_breach",
+        "priority": "critical",
+        "module": "service",
+        "action_url": f"/service-engineer/jobs"
+    })
     
     # Notify all reception staff
-    reception_users = db.query(User).filter(User.role == UserRole.RECEPTION).all()
-    for reception in reception_users:
-        notif_service.create_notification(
-            db=db,
-            user_id=reception.id,
-            title=f"🔴 SLA BREACHED - Ticket #{complaint.ticket_no}",
-            message=f"Service request overdue by {overdue_hours:.1f} hours. Customer: {complaint.customer_name}, Phone: {complaint.phone}",
-            notification_type="sla_breach",
-            priority="critical",
-            module="service",
-            action_url=f"/reception/service-complaints"
-        )
+    rows += notif_service.build_rows(audience[UserRole.RECEPTION], {
+        "title": f"🔴 SLA BREACHED - Ticket #{complaint.ticket_no}",
+        "message": f"Service request overdue by {overdue_hours:.1f} hours. Customer: {complaint.customer_name}, Phone: {complaint.phone}",
+        "notification_type": "sla_breach",
+        "priority": "critical",
+        "module": "service",
+        "action_url": f"/reception/service-complaints"
+    })
     
     # Notify all admins
-    admins = db.query(User).filter(User.role == UserRole.ADMIN).all()
-    for admin in admins:
-        notif_service.create_notification(
-            db=db,
-            user_id=admin.id,
-            title=f"🔴 SLA BREACHED - Ticket #{complaint.ticket_no}",
-            message=f"CRITICAL: Service overdue by {overdue_hours:.1f}h. Engineer: {complaint.assigned_engineer.full_name if complaint.assigned_engineer else 'Unassigned'}. Priority: {complaint.priority}",
-            notification_type="sla_breach",
-            priority="critical",
-            module="service",
-            action_url=f"/admin/service-requests/{complaint.id}"
-        )
+    rows += notif_service.build_rows(audience[UserRole.ADMIN], {
+        "title": f"🔴 SLA BREACHED - Ticket #{complaint.ticket_no}",
+        "message": f"CRITICAL: Service overdue by {overdue_hours:.1f}h. Engineer: {complaint.assigned_engineer.full_name if complaint.assigned_engineer else 'Unassigned'}. Priority: {complaint.priority}",
+        "notification_type": "sla_breach",
+        "priority": "critical",
+        "module": "service",
+        "action_url": f"/admin/service-requests/{complaint.id}"
+    })
+    
+    # Committed together with the sla_breach_sent flag by the caller
+    notif_service.insert_rows(db, rows, commit=False)
     
     print(f"  🔴 SLA Breach notification sent for Ticket #{complaint.ticket_no}")
 
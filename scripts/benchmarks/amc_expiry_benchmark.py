@@ -0,0 +1,138 @@
+"""
+AMC expiry benchmark
+Old per-window loop vs. the one-pass pipeline in scheduler.check_amc_expiry,
+on a throwaway SQLite database seeded with MIF records and reception users.
+
+Usage: python scripts/benchmarks/amc_expiry_benchmark.py [mif_records] [reception_users]
+"""
+
+import sys
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Throwaway database, set before the backend modules create their engines
+_db_dir = tempfile.mkdtemp(prefix="amc_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+
+# Add the backend directory to the path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+from sqlalchemy import event, update
+
+import models
+import scheduler
+from database import SessionLocal, engine
+from models import MIFRecord, Notification, User, UserRole
+from notification_service import NotificationService
+from recipient_directory import recipient_directory
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+
+def seed(db, mif_records, reception_users):
+    random.seed(7)
+    today = datetime.utcnow()
+    db.execute(User.__table__.insert(), [
+        dict(username=f"reception{i}", email=f"reception{i}@example.com", hashed_password="x",
+             full_name=f"Reception {i}", role=UserRole.RECEPTION, is_active=True)
+        for i in range(reception_users)
+    ])
+    rows = []
+    for i in range(mif_records):
+        rows.append(dict(
+            mif_id=f"MIF{i:06d}",
+            customer_name=f"Customer {i}",
+            machine_model=random.choice(["MP 2014", "IM 2702", "MP 3055", "IM C300"]),
+            serial_number=f"SN{i:08d}",
+            amc_expiry=today + timedelta(days=random.uniform(-60, 365)),
+            amc_reminder_sent_date=today - timedelta(days=random.choice([2, 10, 40])) if i % 5 == 0 else None,
+            status="Active" if i % 10 else "Inactive",
+        ))
+    db.execute(MIFRecord.__table__.insert(), rows)
+    db.commit()
+
+
+def reset(db, sent_dates):
+    db.query(Notification).delete()
+    for record_id, sent in sent_dates:
+        db.execute(update(MIFRecord).where(MIFRecord.id == record_id).values(amc_reminder_sent_date=sent))
+    db.commit()
+
+
+def legacy_check_amc_expiry(db):
+    # What scheduler.check_amc_expiry used to do: one range query per window,
+    # re-matching overlapping records, one notification per record per recipient
+    today = datetime.utcnow()
+    recipient_ids = recipient_directory.get(db, UserRole.RECEPTION)
+    for days, label in [(30, "30 days"), (15, "15 days"), (7, "7 days"), (1, "TOMORROW")]:
+        target_date = today + timedelta(days=days)
+        mif_records = db.query(MIFRecord).filter(
+            MIFRecord.amc_expiry.isnot(None),
+            MIFRecord.amc_expiry >= today,
+            MIFRecord.amc_expiry <= target_date,
+            MIFRecord.status == "Active"
+        ).all()
+        for mif in mif_records:
+            last_reminder = mif.amc_reminder_sent_date
+            if last_reminder and (today - last_reminder).days < days:
+                continue
+            NotificationService.notify_many(db, recipient_ids, {
+                "title": f"🔔 AMC Expiring in {label}",
+                "message": f"Customer: {mif.customer_name} | Machine: {mif.machine_model} (S/N: {mif.serial_number})",
+                "notification_type": "AMC_EXPIRY",
+                "priority": "critical" if days <= 7 else "high",
+                "module": "MIF",
+                "action_url": f"/mif/{mif.id}"
+            }, commit=False)
+            mif.amc_reminder_sent_date = today
+    db.commit()
+
+
+def measure(name, run, db, counter):
+    counter.count = 0
+    started = time.perf_counter()
+    run()
+    elapsed = (time.perf_counter() - started) * 1000
+    db.expire_all()
+    reminded = db.query(MIFRecord).filter(
+        MIFRecord.amc_reminder_sent_date >= datetime.utcnow() - timedelta(minutes=5)
+    ).count()
+    notifications = db.query(Notification).count()
+    print(f"{name:<10} {elapsed:>10.1f} ms {counter.count:>10} {reminded:>10} {notifications:>14}")
+
+
+def main():
+    mif_records = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    reception_users = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    seed(db, mif_records, reception_users)
+    sent_dates = db.query(MIFRecord.id, MIFRecord.amc_reminder_sent_date).filter(
+        MIFRecord.amc_reminder_sent_date.isnot(None)
+    ).all()
+
+    counter = QueryCounter()
+    event.listen(engine, "before_cursor_execute", counter)
+    print(f"{mif_records} MIF records, {reception_users} reception users")
+    print(f"{'pipeline':<10} {'time':>13} {'queries':>10} {'reminded':>10} {'notifications':>14}")
+
+    recipient_directory.invalidate()
+    measure("legacy", lambda: legacy_check_amc_expiry(db), db, counter)
+    reset(db, sent_dates)
+    recipient_directory.invalidate()
+    measure("one-pass", scheduler.check_amc_expiry, db, counter)
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
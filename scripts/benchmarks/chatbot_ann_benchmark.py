@@ -0,0 +1,105 @@
+"""
+Chatbot ANN index benchmark
+Recall@k vs. query latency of the FAISSVectorStore index types (Flat, HNSW,
+IVF-PQ, IVF-PQ with exact re-ranking) on a synthetic corpus, sweeping HNSW
+efSearch and IVF nprobe.
+
+The corpus is clustered like real KB text (documents scattered around topic
+centroids); queries are perturbed copies of random documents. Ground truth
+is exact brute-force search. No embedding model is needed.
+
+Requires faiss-cpu.
+
+Usage: python scripts/benchmarks/chatbot_ann_benchmark.py [documents] [queries] [k]
+       e.g. python scripts/benchmarks/chatbot_ann_benchmark.py 100000 500 10
+"""
+
+import sys
+import os
+import time
+
+# Add the backend directory to the path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+import numpy as np
+
+from services import chatbot_ai
+
+EF_SEARCH = [16, 32, 64, 128, 256]
+NPROBE = [1, 4, 8, 16, 32, 64, 128]
+REFINE_K_FACTOR = 4
+
+# (name, index type, re-rank k_factor, tuned parameter, values)
+VARIANTS = [
+    ("flat", "flat", 0, None, [None]),
+    ("hnsw", "hnsw", 0, "efSearch", EF_SEARCH),
+    ("ivfpq", "ivfpq", 0, "nprobe", NPROBE),
+    ("ivfpq+rr", "ivfpq", REFINE_K_FACTOR, "nprobe", NPROBE),
+]
+
+
+def make_corpus(documents: int, queries: int, dimension: int, topics: int = 2000):
+    rng = np.random.default_rng(42)
+    centroids = rng.standard_normal((topics, dimension)).astype("float32")
+    vectors = centroids[rng.integers(0, topics, documents)] + 0.6 * rng.standard_normal((documents, dimension)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    picked = rng.integers(0, documents, queries)
+    query_vectors = vectors[picked] + 0.05 * rng.standard_normal((queries, dimension)).astype("float32")
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    return vectors, query_vectors
+
+
+def ground_truth(vectors, query_vectors, k):
+    exact = chatbot_ai.faiss.IndexFlatIP(vectors.shape[1])
+    exact.add(vectors)
+    _, ids = exact.search(query_vectors, k)
+    return [set((ids[i] + 1).tolist()) for i in range(len(ids))]  # Document ids start at 1
+
+
+def measure(store, query_vectors, truth, k):
+    latencies, hits = [], 0
+    for query, expected in zip(query_vectors, truth):
+        started = time.perf_counter()
+        results = store.search_vector(query[None, :], 'en', k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += len(expected & {doc['id'] for doc in results})
+    return hits / (len(truth) * k), np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+def main():
+    documents = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    k = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+    if not chatbot_ai.FAISS_AVAILABLE:
+        print("faiss-cpu is required for this benchmark")
+        sys.exit(1)
+    chatbot_ai._import_faiss()
+
+    store = chatbot_ai.FAISSVectorStore()
+    vectors, query_vectors = make_corpus(documents, queries, store.dimension)
+    truth = ground_truth(vectors, query_vectors, k)
+    ids = list(range(1, documents + 1))
+    docs = [{'id': doc_id, 'title': f"Doc {doc_id}", 'content': "", 'category': "faq", 'metadata': {}} for doc_id in ids]
+
+    print(f"{documents} documents, {queries} queries, recall@{k}, "
+          f"auto picks {store.index_type(store._new_index(documents))}")
+    print(f"{'index':<9} {'param':<13} {'build s':>8} {'size MB':>8} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, index_type, k_factor, param, values in VARIANTS:
+        chatbot_ai.IVF_REFINE_K_FACTOR = k_factor
+        started = time.perf_counter()
+        store._build_index('en', ids, vectors.copy(), docs, index_type)
+        build = time.perf_counter() - started
+        size = len(chatbot_ai.faiss.serialize_index(store.index_en)) / 1024 / 1024
+        for value in values:
+            if param == "efSearch":
+                store.set_search_params(ef_search=value)
+            elif param == "nprobe":
+                store.set_search_params(nprobe=value)
+            recall, p50, p95 = measure(store, query_vectors, truth, k)
+            label = f"{param}={value}" if param else "exact"
+            print(f"{name:<9} {label:<13} {build:>8.1f} {size:>8.1f} {recall:>7.3f} {p50:>8.3f} {p95:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
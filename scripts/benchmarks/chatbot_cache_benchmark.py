@@ -0,0 +1,94 @@
+"""
+Chatbot response cache benchmark
+Lookup latency of the exact and semantic levels of the chatbot response
+cache, and the cosine similarity of paraphrased vs. different questions
+under the configured embedding model, to pick CHATBOT_CACHE_SIMILARITY.
+
+Paraphrases should score above the threshold (cache hit, same answer) and
+different questions below it (the LLM is asked). The cosine part loads the
+embedding model (CHATBOT_EMBEDDING_BACKEND); the latency part does not.
+
+Usage: python scripts/benchmarks/chatbot_cache_benchmark.py [entries] [lookups]
+       e.g. python scripts/benchmarks/chatbot_cache_benchmark.py 500 2000
+"""
+
+import sys
+import os
+import time
+
+# Add the backend directory to the path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+import numpy as np
+
+from services import chatbot_ai
+from services.chatbot_cache import CHATBOT_CACHE_SIMILARITY, CachedReply, ChatResponseCache
+
+# (question, paraphrase) - should be answered alike
+PARAPHRASES = [
+    ("How do I replace the toner cartridge?", "how to change the toner cartridge"),
+    ("What is the price of the Canon copier?", "How much does the Canon copier cost?"),
+    ("Book a service engineer visit", "I need a service engineer to visit"),
+    ("When does my AMC expire?", "What is the expiry date of my AMC?"),
+    ("The printer shows a paper jam", "paper is jammed in the printer"),
+    ("டோனர் கார்ட்ரிட்ஜை எப்படி மாற்றுவது?", "டோனர் கார்ட்ரிட்ஜ் மாற்றுவது எப்படி?"),
+    ("எனது AMC எப்போது முடிவடையும்?", "என் AMC காலாவதி தேதி என்ன?"),
+]
+# (question, different question) - must not share an answer
+DIFFERENT = [
+    ("How do I replace the toner cartridge?", "How do I replace the drum unit?"),
+    ("What is the price of the Canon copier?", "What is the price of the Ricoh copier?"),
+    ("Book a service engineer visit", "Cancel my service engineer visit"),
+    ("When does my AMC expire?", "What does my AMC cover?"),
+    ("The printer shows a paper jam", "The printer shows a toner low warning"),
+    ("டோனர் கார்ட்ரிட்ஜை எப்படி மாற்றுவது?", "டிரம் யூனிட்டை எப்படி மாற்றுவது?"),
+]
+
+
+def latency(entries: int, lookups: int):
+    rng = np.random.default_rng(0)
+    cache = ChatResponseCache(size=entries, semantic_size=entries)
+    dimension = chatbot_ai.FAISSVectorStore().dimension
+    for i in range(entries):
+        reply = CachedReply(reply=f"answer {i}", confidence=0.8, language="en")
+        cache.put(f"Question number {i}?", None, reply, "v1", rng.standard_normal(dimension))
+    queries = rng.standard_normal((lookups, dimension)).astype("float32")
+
+    for name, lookup in (
+        ("exact hit", lambda i: cache.get(f"question number {i % entries}", None, "v1")),
+        ("exact miss", lambda i: cache.get(f"another question {i}", None, "v1")),
+        ("semantic", lambda i: cache.get_semantic(queries[i], "en", "v1")),
+    ):
+        timings = []
+        for i in range(lookups):
+            started = time.perf_counter()
+            lookup(i)
+            timings.append((time.perf_counter() - started) * 1000)
+        print(f"{name:<11} p50 {np.percentile(timings, 50):.4f} ms  p95 {np.percentile(timings, 95):.4f} ms")
+
+
+def cosines(threshold: float):
+    embedding = chatbot_ai.EmbeddingService()
+    for title, pairs, should_hit in (("paraphrases", PARAPHRASES, True), ("different", DIFFERENT, False)):
+        print(f"\n{title} (should {'hit' if should_hit else 'miss'} at {threshold}):")
+        for question, other in pairs:
+            a, b = (ChatResponseCache._unit(embedding.encode(text)) for text in (question, other))
+            similarity = float(a @ b)
+            ok = (similarity >= threshold) == should_hit
+            print(f"  {similarity:.3f} {'✅' if ok else '❌'}  {question} | {other}")
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    print(f"{entries} cached questions, {lookups} lookups")
+    latency(entries, lookups)
+    if chatbot_ai.SENTENCE_TRANSFORMER_AVAILABLE or chatbot_ai.EMBEDDING_BACKEND == "onnx":
+        cosines(CHATBOT_CACHE_SIMILARITY)
+    else:
+        print("\nNo embedding backend installed; skipping the similarity check")
+
+
+if __name__ == "__main__":
+    main()
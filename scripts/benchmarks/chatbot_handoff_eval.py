@@ -0,0 +1,156 @@
+"""
+Chatbot handoff evaluation
+Offline precision / recall of the low-confidence handoff decision, replayed
+over historical chat_messages with the current vector search and scoring.
+
+For every bot reply the customer message before it is searched again
+(FAISSVectorStore.search -> MistralService._calculate_confidence ->
+IntentDetector.should_handoff) for a range of handoff thresholds, and
+compared with what the reply actually needed:
+
+- needed a human: staff (sender 'receptionist') replied later in the
+  session, or the customer asked for a human in this or a later message
+- otherwise: the bot was enough
+
+Staff only reply after a handoff, so the heuristic favours the historical
+decisions; pass --labels with a hand-labelled CSV (message_id,needs_handoff)
+to override it for the messages it covers. The historical decision
+(chat_messages.triggered_handoff) is printed as the baseline row, and the
+top similarity per class helps pick CHATBOT_SCORE_FLOOR / CEILING.
+
+Usage: python scripts/benchmarks/chatbot_handoff_eval.py [--since 2025-01-01] [--labels labels.csv]
+                                                        [--thresholds 0.3,0.4,0.5,0.6,0.7]
+"""
+
+import sys
+import os
+import argparse
+import csv
+from collections import defaultdict
+from datetime import datetime
+
+# Add the backend directory to the path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+import numpy as np
+
+from database import SessionLocal
+from services import chatbot_ai
+import models
+
+
+def load_labels(path):
+    if not path:
+        return {}
+    with open(path, newline="", encoding="utf-8") as labels_file:
+        return {
+            int(row["message_id"]): row["needs_handoff"].strip().lower() in ("1", "true", "yes")
+            for row in csv.DictReader(labels_file)
+        }
+
+
+def load_cases(db, since, labels):
+    """(message id, customer query, language, historical decision, needs handoff) per bot reply"""
+    query = db.query(models.ChatMessage).order_by(
+        models.ChatMessage.session_id, models.ChatMessage.sent_at, models.ChatMessage.id
+    )
+    if since:
+        query = query.filter(models.ChatMessage.sent_at >= since)
+    sessions = defaultdict(list)
+    for message in query.yield_per(2000):
+        sessions[message.session_id].append(
+            (message.id, message.sender, message.message, message.language, bool(message.triggered_handoff))
+        )
+
+    detect_intent = chatbot_ai.IntentDetector.detect_intent
+    cases = []
+    for messages in sessions.values():
+        asked_for_human = [
+            sender == "customer" and detect_intent(text) == "talk_to_human"
+            for _, sender, text, _, _ in messages
+        ]
+        staff = [sender == "receptionist" for _, sender, _, _, _ in messages]
+        customer_text = None
+        for position, (message_id, sender, text, language, triggered) in enumerate(messages):
+            if sender == "customer":
+                customer_text = text
+                continue
+            if sender != "bot" or customer_text is None:
+                continue
+            needed = any(staff[position + 1:]) or any(asked_for_human[position - 1:])
+            cases.append((message_id, customer_text, language or "en", triggered, labels.get(message_id, needed)))
+    return cases
+
+
+def vector_store(db):
+    store = chatbot_ai.get_vector_store()
+    if not chatbot_ai.warm_start_vector_store(db):
+        store.rebuild_index(
+            db.query(models.ChatbotKnowledge).filter(models.ChatbotKnowledge.is_active == True).all()
+        )
+    return store
+
+
+def scores(predicted, actual):
+    predicted, actual = np.asarray(predicted), np.asarray(actual)
+    true_positive = int((predicted & actual).sum())
+    precision = true_positive / predicted.sum() if predicted.sum() else 0.0
+    recall = true_positive / actual.sum() if actual.sum() else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return precision, recall, f1, predicted.mean()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--since", type=lambda value: datetime.fromisoformat(value))
+    parser.add_argument("--labels", help="CSV with message_id,needs_handoff columns")
+    parser.add_argument("--thresholds", default="0.3,0.4,0.5,0.6,0.7")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--min-similarity", type=float, default=chatbot_ai.SEARCH_MIN_SIMILARITY)
+    parser.add_argument("--mmr-lambda", type=float, default=chatbot_ai.MMR_LAMBDA)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        cases = load_cases(db, args.since, load_labels(args.labels))
+        if not cases:
+            print("No bot replies with a preceding customer message found")
+            return
+        store = vector_store(db)
+    finally:
+        db.close()
+
+    mistral = chatbot_ai.get_mistral_service()
+    embeddings = store.embedding_service.encode_batch([query for _, query, _, _, _ in cases])
+    confidences, top_similarity = [], []
+    for (_, query, language, _, _), embedding in zip(cases, embeddings):
+        docs = store.search_vector(
+            np.asarray([embedding]), language, args.top_k, args.min_similarity, args.mmr_lambda
+        )
+        confidences.append(mistral._calculate_confidence(docs, query))
+        top_similarity.append(docs[0]["similarity"] if docs else -1.0)
+
+    actual = [needed for _, _, _, _, needed in cases]
+    queries = [query for _, query, _, _, _ in cases]
+    print(f"{len(cases)} bot replies, {sum(actual)} needed a human "
+          f"(top_k={args.top_k}, min_similarity={args.min_similarity}, mmr_lambda={args.mmr_lambda})")
+    similarity = np.asarray(top_similarity)
+    for name, mask in (("needed human", np.asarray(actual)), ("bot enough", ~np.asarray(actual))):
+        if mask.any():
+            print(f"  top similarity, {name:<12}: mean {similarity[mask].mean():.3f}  "
+                  f"p10 {np.percentile(similarity[mask], 10):.3f}  p90 {np.percentile(similarity[mask], 90):.3f}")
+
+    print(f"\n{'decision':<22} {'precision':>9} {'recall':>7} {'f1':>6} {'handoff rate':>13}")
+    precision, recall, f1, rate = scores([triggered for _, _, _, triggered, _ in cases], actual)
+    print(f"{'historical':<22} {precision:>9.3f} {recall:>7.3f} {f1:>6.3f} {rate:>13.3f}")
+    for threshold in (float(value) for value in args.thresholds.split(",")):
+        predicted = [
+            chatbot_ai.IntentDetector.should_handoff(query, confidence, threshold)[0]
+            for query, confidence in zip(queries, confidences)
+        ]
+        precision, recall, f1, rate = scores(predicted, actual)
+        print(f"{'threshold ' + str(threshold):<22} {precision:>9.3f} {recall:>7.3f} {f1:>6.3f} {rate:>13.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Chatbot index rebuild benchmark
+Rebuild throughput of FAISSVectorStore at 100 / 1k / 10k knowledge documents:
+the old per-document path (encode one string, add one row) vs. the batched
+rebuild_index (grouped by language, encode_batch, one FAISS add per batch).
+Stored embeddings are cleared so both paths encode every document.
+
+Requires faiss-cpu and sentence-transformers.
+
+Usage: python scripts/benchmarks/chatbot_rebuild_benchmark.py [sizes] [batch_size]
+       e.g. python scripts/benchmarks/chatbot_rebuild_benchmark.py 100,1000,10000 64
+"""
+
+import sys
+import os
+import random
+import time
+from types import SimpleNamespace
+
+# Add the backend directory to the path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+import numpy as np
+
+from services import chatbot_ai
+
+TOPICS = [
+    "toner cartridge replacement for the office copier",
+    "how to clear a paper jam in the rear tray",
+    "annual maintenance contract renewal and coverage",
+    "warranty claim process for new machines",
+    "booking a service engineer visit",
+    "scanner driver installation on windows",
+]
+TAMIL = "இயந்திர சேவை மற்றும் பராமரிப்பு விவரங்கள்"
+
+
+def make_knowledge(count: int):
+    random.seed(count)
+    docs = []
+    for i in range(count):
+        topic = random.choice(TOPICS)
+        docs.append(SimpleNamespace(
+            id=i + 1,
+            title=f"Article {i + 1}",
+            content=f"{topic}. Reference {i} covers model {random.randint(1000, 9999)} and common questions.",
+            content_en=None,
+            content_ta=f"{TAMIL} {i}" if i % 4 == 0 else None,
+            category="faq",
+            keywords=None,
+            is_active=True,
+            embedding_en=None,
+            embedding_ta=None,
+        ))
+    return docs
+
+
+def legacy_rebuild(store, docs):
+    # What rebuild_index used to do: one encode and one 1-row FAISS add per document
+    index_en = chatbot_ai.faiss.IndexFlatL2(store.dimension)
+    index_ta = chatbot_ai.faiss.IndexFlatL2(store.dimension)
+    for doc in docs:
+        index_en.add(np.array([store.embedding_service.encode(doc.content)], dtype="float32"))
+        if doc.content_ta:
+            index_ta.add(np.array([store.embedding_service.encode(doc.content_ta)], dtype="float32"))
+    return index_en.ntotal + index_ta.ntotal
+
+
+def batched_rebuild(store, docs, batch_size):
+    store.rebuild_index(docs, batch_size=batch_size)
+    return store.index_en.ntotal + store.index_ta.ntotal
+
+
+def main():
+    sizes = [int(size) for size in (sys.argv[1] if len(sys.argv) > 1 else "100,1000,10000").split(",")]
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else chatbot_ai.EMBED_BATCH_SIZE
+
+    if not (chatbot_ai.FAISS_AVAILABLE and chatbot_ai.SENTENCE_TRANSFORMER_AVAILABLE):
+        print("faiss-cpu and sentence-transformers are required for this benchmark")
+        sys.exit(1)
+
+    store = chatbot_ai.FAISSVectorStore()
+    if not store.embedding_service.available:
+        print("Embedding model could not be loaded")
+        sys.exit(1)
+    store.embedding_service.encode_batch(["warm up"])
+
+    print(f"batch size {batch_size}")
+    print(f"{'docs':>7} {'vectors':>8} {'legacy s':>10} {'docs/s':>9} {'batched s':>10} {'docs/s':>9} {'speedup':>8}")
+    for size in sizes:
+        docs = make_knowledge(size)
+
+        started = time.perf_counter()
+        vectors = legacy_rebuild(store, docs)
+        legacy = time.perf_counter() - started
+
+        started = time.perf_counter()
+        batched_vectors = batched_rebuild(store, docs, batch_size)
+        batched = time.perf_counter() - started
+        assert batched_vectors == vectors
+
+        print(f"{size:>7} {vectors:>8} {legacy:>10.2f} {size / legacy:>9.0f} "
+              f"{batched:>10.2f} {size / batched:>9.0f} {legacy / batched:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
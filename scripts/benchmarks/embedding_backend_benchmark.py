@@ -0,0 +1,171 @@
+"""
+Embedding backend benchmark
+PyTorch (Sentence Transformers) vs. the ONNX Runtime exports (fp32 and int8)
+of the chatbot embedding model: load time, single-query latency, batch
+throughput, resident memory and cosine similarity to the PyTorch vectors.
+
+Each backend runs in its own subprocess so RSS only counts that backend.
+Texts are the active English/Tamil chatbot_knowledge rows (DATABASE_URL);
+with fewer than 50 rows a built-in English/Tamil set is used instead.
+
+Run scripts/setup/export_embedding_onnx.py first, from the same
+CHATBOT_EMBEDDING_MODEL: the header prints the model each backend loads, and
+the ONNX rows are skipped if the export came from a different model.
+Only report figures measured on the production model.
+
+Usage: python scripts/benchmarks/embedding_backend_benchmark.py [queries] [threads] [cpu_affinity]
+       e.g. python scripts/benchmarks/embedding_backend_benchmark.py 200 4 0-3
+"""
+
+import sys
+import os
+import json
+import subprocess
+import time
+
+# Add the backend directory to the path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+import numpy as np
+
+from services import chatbot_ai
+
+BACKENDS = [("torch", None), ("onnx", "model.onnx"), ("onnx", "model_int8.onnx")]
+
+ENGLISH = [
+    "How do I replace the toner cartridge on the office copier?",
+    "The machine shows a paper jam in the rear tray, how do I clear it?",
+    "When does my annual maintenance contract expire and what does renewal cover?",
+    "Book a service engineer visit for a scanner that is not working",
+    "What is covered under the warranty for new multifunction printers?",
+    "Install the scanner driver on Windows",
+]
+TAMIL = [
+    "டோனர் கார்ட்ரிட்ஜை எப்படி மாற்றுவது?",
+    "இயந்திரத்தில் காகிதம் சிக்கியுள்ளது, எப்படி சரிசெய்வது?",
+    "எனது AMC ஒப்பந்தம் எப்போது முடிவடையும்?",
+    "சேவை பொறியாளர் வருகையை பதிவு செய்யவும்",
+    "உத்தரவாதத்தில் என்ன அடங்கும்?",
+]
+
+
+def knowledge_texts():
+    try:
+        from database import SessionLocal
+        import models
+
+        db = SessionLocal()
+        try:
+            rows = db.query(models.ChatbotKnowledge).filter(models.ChatbotKnowledge.is_active == True).all()
+            texts = [text for kb in rows for _, text, _ in chatbot_ai.FAISSVectorStore._texts(kb)]
+        finally:
+            db.close()
+    except Exception:
+        texts = []
+    if len(texts) >= 50:
+        return texts, "chatbot_knowledge"
+    texts = [f"{text} (ref {i})" for i in range(40) for text in ENGLISH + TAMIL]
+    return texts, "built-in EN/TA set"
+
+
+def export_source():
+    """Model the ONNX export was made from (embedding_config.json), if any"""
+    try:
+        with open(os.path.join(chatbot_ai.ONNX_MODEL_DIR, "embedding_config.json"), encoding="utf-8") as config_file:
+            return json.load(config_file).get("source_model")
+    except (OSError, ValueError):
+        return None
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def worker(backend: str, file_name: str, queries: int, threads: int, affinity: str):
+    """Runs in the subprocess: load one backend, time it, print JSON"""
+    texts, _ = knowledge_texts()
+    baseline = rss_mb()
+    started = time.perf_counter()
+    if backend == "torch":
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        model = chatbot_ai._import_sentence_transformer()(chatbot_ai.DEFAULT_EMBEDDING_MODEL, device="cpu")
+    else:
+        model = chatbot_ai.OnnxEmbeddingModel(file_name=file_name, threads=threads, cpu_affinity=affinity)
+    load = time.perf_counter() - started
+    model.encode("warm up", convert_to_numpy=True)
+
+    latencies = []
+    for i in range(queries):
+        query = texts[i % len(texts)]
+        started = time.perf_counter()
+        model.encode(query, convert_to_numpy=True)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    vectors = model.encode(texts, batch_size=chatbot_ai.EMBED_BATCH_SIZE, convert_to_numpy=True)
+    batch = time.perf_counter() - started
+
+    np.save(f"/tmp/embedding_bench_{os.getpid()}.npy", np.asarray(vectors, dtype="float32"))
+    print(json.dumps({
+        "load_s": load,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "docs_per_s": len(texts) / batch,
+        "rss_mb": rss_mb(),
+        "model_rss_mb": rss_mb() - baseline,
+        "vectors": f"/tmp/embedding_bench_{os.getpid()}.npy",
+    }))
+
+
+def main():
+    queries = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    affinity = sys.argv[3] if len(sys.argv) > 3 else ""
+
+    texts, source = knowledge_texts()
+    print(f"{len(texts)} texts ({source}), {queries} single queries, batch size {chatbot_ai.EMBED_BATCH_SIZE}, "
+          f"threads {threads or 'default'}{', cpus ' + affinity if affinity else ''}")
+    exported_from = export_source()
+    print(f"torch model: {chatbot_ai.DEFAULT_EMBEDDING_MODEL}")
+    print(f"onnx export: {chatbot_ai.ONNX_MODEL_DIR} (from {exported_from or 'unknown model'})")
+    print(f"{'backend':<22} {'load s':>7} {'p50 ms':>8} {'p95 ms':>8} {'docs/s':>8} {'RSS MB':>8} "
+          f"{'model MB':>9} {'min cos':>8}")
+
+    reference = None
+    for backend, file_name in BACKENDS:
+        if backend == "onnx" and not os.path.exists(os.path.join(chatbot_ai.ONNX_MODEL_DIR, file_name)):
+            print(f"{backend + ':' + file_name:<22} not exported (run scripts/setup/export_embedding_onnx.py)")
+            continue
+        if backend == "onnx" and exported_from != chatbot_ai.DEFAULT_EMBEDDING_MODEL:
+            print(f"{backend + ':' + file_name:<22} exported from a different model (re-run the export)")
+            continue
+        output = subprocess.run(
+            [sys.executable, __file__, "--worker", backend, file_name or "", str(queries), str(threads), affinity],
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        vectors = np.load(result["vectors"])
+        os.remove(result["vectors"])
+        vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        if reference is None:
+            reference = vectors
+        similarity = (reference * vectors).sum(axis=1).min()
+
+        name = backend if file_name is None else f"{backend}:{file_name}"
+        print(f"{name:<22} {result['load_s']:>7.2f} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+              f"{result['docs_per_s']:>8.0f} {result['rss_mb']:>8.0f} {result['model_rss_mb']:>9.0f} "
+              f"{similarity:>8.4f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        worker(sys.argv[2], sys.argv[3] or None, int(sys.argv[4]), int(sys.argv[5]), sys.argv[6])
+    else:
+        main()
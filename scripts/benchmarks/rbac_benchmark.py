@@ -0,0 +1,72 @@
+"""
+RBAC micro-benchmark
+Per-check cost of the compiled bitset policy vs. the old approach of rebuilding
+the nested PERMISSION_MATRIX dict on every call.
+
+Usage: python scripts/benchmarks/rbac_benchmark.py [iterations]
+"""
+
+import sys
+import os
+import timeit
+from types import SimpleNamespace
+
+# Add the backend directory to the path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+import rbac
+from models import UserRole
+
+
+def legacy_check(user, resource, action):
+    # What auth.check_resource_permission used to do: build the matrix, then look up
+    matrix = {
+        role: {res: list(actions) for res, actions in resources.items()}
+        for role, resources in rbac.PERMISSION_MATRIX.items()
+    }
+    return action in matrix.get(user.role.value, {}).get(resource, [])
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+    engine = rbac.RBACEngine(reload_seconds=0)
+    engine._policy = rbac.compile_policy({
+        "RECEPTION": ["VIEW_INTERNAL_DATA"],
+        "SALESMAN": ["VIEW_PRODUCT"],
+    })
+
+    users = [SimpleNamespace(role=role) for role in UserRole]
+    checks = [
+        ("order", "approve"), ("enquiry", "write"), ("mif", "read"),
+        ("permission", "EDIT_PRODUCT"), ("stock", "write"), ("unknown", "read"),
+    ]
+
+    # Sanity: both paths agree on the static matrix
+    for user in users:
+        for resource, action in checks:
+            if resource == "permission":
+                continue
+            assert engine.authorize(user, resource, action) == legacy_check(user, resource, action)
+
+    cases = [(user, resource, action) for user in users for resource, action in checks]
+
+    def run(fn):
+        for user, resource, action in cases:
+            fn(user, resource, action)
+
+    rounds = max(iterations // len(cases), 1)
+    total_checks = rounds * len(cases)
+
+    print(f"Policy: {len(engine.policy.index)} bits across {len(engine.policy.role_bits)} roles")
+    print(f"Checks per run: {total_checks:,}")
+    for label, fn in [("legacy dict rebuild", legacy_check), ("compiled authorize()", engine.authorize)]:
+        best = min(timeit.repeat(lambda: run(fn), number=rounds, repeat=5))
+        print(f"  {label:<22} {best / total_checks * 1e9:8.1f} ns/check")
+
+    compile_time = min(timeit.repeat(lambda: rbac.compile_policy({}), number=100, repeat=3)) / 100
+    print(f"  {'compile_policy()':<22} {compile_time * 1e6:8.1f} us (once per reload)")
+
+
+if __name__ == "__main__":
+    main()
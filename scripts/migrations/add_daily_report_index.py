@@ -0,0 +1,36 @@
+"""
+Migration script to add the daily_reports (salesman_id, report_date) index
+Used by the missing-reports anti-join (scheduler + /api/reports/daily/missing)
+"""
+
+import sys
+import os
+
+# Add the backend directory to the path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+from sqlalchemy import text
+from database import engine
+
+def migrate():
+    """Add composite index on daily_reports"""
+    
+    migrations = [
+        "CREATE INDEX IF NOT EXISTS ix_daily_reports_salesman_date ON daily_reports (salesman_id, report_date)",
+    ]
+    
+    with engine.connect() as conn:
+        try:
+            for migration in migrations:
+                print(f"Executing: {migration}")
+                conn.execute(text(migration))
+                conn.commit()
+            print("\n✅ Migration completed successfully!")
+        except Exception as e:
+            print(f"\n❌ Migration failed: {str(e)}")
+            conn.rollback()
+            raise
+
+if __name__ == "__main__":
+    print("Starting migration to add daily_reports index...\n")
+    migrate()
@@ -0,0 +1,36 @@
+"""
+Migration script to add the enquiries (status, next_follow_up) index
+Serves the due filter of scheduler.check_enquiry_follow_ups
+"""
+
+import sys
+import os
+
+# Add the backend directory to the path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+from sqlalchemy import text
+from database import engine
+
+def migrate():
+    """Add composite index on enquiries"""
+    
+    migrations = [
+        "CREATE INDEX IF NOT EXISTS ix_enquiries_status_next_follow_up ON enquiries (status, next_follow_up)",
+    ]
+    
+    with engine.connect() as conn:
+        try:
+            for migration in migrations:
+                print(f"Executing: {migration}")
+                conn.execute(text(migration))
+                conn.commit()
+            print("\n✅ Migration completed successfully!")
+        except Exception as e:
+            print(f"\n❌ Migration failed: {str(e)}")
+            conn.rollback()
+            raise
+
+if __name__ == "__main__":
+    print("Starting migration to add enquiries follow-up index...\n")
+    migrate()
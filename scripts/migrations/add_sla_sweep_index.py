@@ -0,0 +1,43 @@
+"""
+Migration script for the incremental SLA sweep
+Adds the complaints SLA sweep index and the sla_touched_at marker column;
+sla_sweep_runs is created by create_all on startup
+"""
+
+import sys
+import os
+
+# Add the backend directory to the path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+from sqlalchemy import text
+from database import engine
+
+def migrate():
+    """Add composite index and sla_touched_at column on complaints for the SLA sweep"""
+    
+    migrations = [
+        # Sweep/timer filter on "= false"; legacy NULL flags mean "not sent"
+        "UPDATE complaints SET sla_warning_sent = false WHERE sla_warning_sent IS NULL",
+        "UPDATE complaints SET sla_breach_sent = false WHERE sla_breach_sent IS NULL",
+        "CREATE INDEX IF NOT EXISTS ix_complaints_sla_sweep ON complaints (status, sla_warning_sent, sla_breach_sent, created_at)",
+        # Set on status / priority / created_at changes; the sweep re-checks tickets touched since its watermark
+        "ALTER TABLE complaints ADD COLUMN IF NOT EXISTS sla_touched_at TIMESTAMP",
+        "CREATE INDEX IF NOT EXISTS ix_complaints_sla_touched_at ON complaints (sla_touched_at)",
+    ]
+    
+    with engine.connect() as conn:
+        try:
+            for migration in migrations:
+                print(f"Executing: {migration}")
+                conn.execute(text(migration))
+                conn.commit()
+            print("\n✅ Migration completed successfully!")
+        except Exception as e:
+            print(f"\n❌ Migration failed: {str(e)}")
+            conn.rollback()
+            raise
+
+if __name__ == "__main__":
+    print("Starting migration to add complaints SLA sweep index...\n")
+    migrate()
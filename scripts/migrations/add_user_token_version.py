@@ -0,0 +1,36 @@
+"""
+Migration script to add token_version to users table
+Used by the principal cache to revoke JWTs after role/status/password changes
+"""
+
+import sys
+import os
+
+# Add the backend directory to the path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+from sqlalchemy import text
+from database import engine
+
+def migrate():
+    """Add token_version column to users table"""
+    
+    migrations = [
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0",
+    ]
+    
+    with engine.connect() as conn:
+        try:
+            for migration in migrations:
+                print(f"Executing: {migration}")
+                conn.execute(text(migration))
+                conn.commit()
+            print("\n✅ Migration completed successfully!")
+        except Exception as e:
+            print(f"\n❌ Migration failed: {str(e)}")
+            conn.rollback()
+            raise
+
+if __name__ == "__main__":
+    print("Starting migration to add users.token_version...\n")
+    migrate()
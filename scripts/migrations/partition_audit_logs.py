@@ -0,0 +1,89 @@
+"""
+Migration script to partition audit_logs by month (PostgreSQL)
+Rebuilds audit_logs as PARTITION BY RANGE (timestamp) with monthly partitions
+and a default partition, copies the existing rows and adds the composite
+indexes used by /api/audit/logs. On other databases only the indexes are added.
+"""
+
+import sys
+import os
+from datetime import datetime
+
+# Add the backend directory to the path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+from sqlalchemy import text
+from database import engine
+from audit_partitions import AUDIT_PARTITION_MONTHS_AHEAD, create_partition_sql, is_partitioned, month_start
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_audit_logs_timestamp_id ON audit_logs (timestamp, id)",
+    "CREATE INDEX IF NOT EXISTS ix_audit_logs_module_timestamp ON audit_logs (module, timestamp)",
+    "CREATE INDEX IF NOT EXISTS ix_audit_logs_user_timestamp ON audit_logs (user_id, timestamp)",
+    "CREATE INDEX IF NOT EXISTS ix_audit_logs_module_record_timestamp ON audit_logs (module, record_id, timestamp)",
+]
+
+COLUMNS = "id, user_id, username, action, module, record_id, record_type, changes, ip_address, timestamp"
+
+
+def partition_migrations(conn):
+    # The partition key must be part of the primary key and NOT NULL;
+    # undated legacy rows are parked at the epoch (default partition)
+    first = conn.execute(text("SELECT min(timestamp) FROM audit_logs")).scalar() or datetime.utcnow()
+    migrations = [
+        "UPDATE audit_logs SET timestamp = '1970-01-01' WHERE timestamp IS NULL",
+        "ALTER TABLE audit_logs RENAME TO audit_logs_legacy",
+        "ALTER TABLE audit_logs_legacy RENAME CONSTRAINT audit_logs_pkey TO audit_logs_legacy_pkey",
+        "DROP INDEX IF EXISTS ix_audit_logs_id",
+        """CREATE TABLE audit_logs (
+            id integer NOT NULL DEFAULT nextval('audit_logs_id_seq'),
+            user_id integer REFERENCES users(id),
+            username varchar,
+            action varchar,
+            module varchar,
+            record_id varchar,
+            record_type varchar,
+            changes text,
+            ip_address varchar,
+            timestamp timestamp NOT NULL DEFAULT (now() at time zone 'utc'),
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)""",
+        "ALTER SEQUENCE audit_logs_id_seq OWNED BY audit_logs.id",
+        "CREATE TABLE IF NOT EXISTS audit_logs_default PARTITION OF audit_logs DEFAULT",
+    ]
+    month = month_start(first.date())
+    last = month_start(datetime.utcnow().date(), AUDIT_PARTITION_MONTHS_AHEAD)
+    while month <= last:
+        migrations.append(create_partition_sql(month))
+        month = month_start(month, 1)
+    migrations += [
+        f"INSERT INTO audit_logs ({COLUMNS}) SELECT {COLUMNS} FROM audit_logs_legacy",
+        "DROP TABLE audit_logs_legacy",
+        "CREATE INDEX IF NOT EXISTS ix_audit_logs_id ON audit_logs (id)",
+    ]
+    return migrations
+
+
+def migrate():
+    """Partition audit_logs (PostgreSQL) and add composite indexes"""
+    
+    with engine.connect() as conn:
+        try:
+            migrations = []
+            if conn.dialect.name == "postgresql" and not is_partitioned(conn):
+                migrations = partition_migrations(conn)
+            migrations += INDEXES
+            # One transaction: the table is either fully converted or untouched
+            for migration in migrations:
+                print(f"Executing: {migration.splitlines()[0]}")
+                conn.execute(text(migration))
+            conn.commit()
+            print("\n✅ Migration completed successfully!")
+        except Exception as e:
+            print(f"\n❌ Migration failed: {str(e)}")
+            conn.rollback()
+            raise
+
+if __name__ == "__main__":
+    print("Starting migration to partition audit_logs...\n")
+    migrate()
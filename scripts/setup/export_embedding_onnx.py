@@ -0,0 +1,154 @@
+"""
+Export the chatbot embedding model to ONNX for CHATBOT_EMBEDDING_BACKEND=onnx
+
+Writes to CHATBOT_ONNX_MODEL_DIR (default backend/data/embedding_onnx):
+- model.onnx        fp32 export of the transformer
+- model_int8.onnx   int8 dynamic quantisation of model.onnx
+- tokenizer.json    fast tokenizer, loaded with the `tokenizers` package
+- embedding_config.json  source model, max_seq_length, padding, dimension
+
+Then checks both exports against the PyTorch embeddings on English and Tamil
+sample texts (plus the active chatbot_knowledge rows with --kb) and exits
+non-zero if the cosine similarity of any text drops below the threshold.
+
+Requires torch, sentence-transformers, onnx and onnxruntime (export only;
+the API workers only need onnxruntime and tokenizers).
+
+Usage: python scripts/setup/export_embedding_onnx.py [--check-only] [--kb]
+"""
+
+import sys
+import os
+import argparse
+import inspect
+import json
+
+# Add the backend directory to the path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+import numpy as np
+
+from services import chatbot_ai
+
+# Minimum per-text cosine similarity to the PyTorch embedding
+THRESHOLDS = {"model.onnx": 0.9999, "model_int8.onnx": 0.98}
+
+SAMPLE_TEXTS = [
+    "How do I replace the toner cartridge?",
+    "The copier shows a paper jam in the rear tray",
+    "When does my annual maintenance contract expire?",
+    "Book a service engineer visit for tomorrow",
+    "What is covered under the warranty?",
+    "டோனர் கார்ட்ரிட்ஜை எப்படி மாற்றுவது?",
+    "இயந்திரத்தில் காகிதம் சிக்கியுள்ளது",
+    "எனது AMC ஒப்பந்தம் எப்போது முடிவடையும்?",
+    "நாளை சேவை பொறியாளர் வருகையை பதிவு செய்யவும்",
+    "உத்தரவாதத்தில் என்ன அடங்கும்?",
+]
+
+
+def export(model, out_dir: str):
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    pooling = model[1].get_config_dict() if len(model) > 1 else {}
+    if pooling.get("pooling_mode", "mean") != "mean" and not pooling.get("pooling_mode_mean_tokens"):
+        raise ValueError(f"Only mean pooling is supported, got {pooling}")
+
+    os.makedirs(out_dir, exist_ok=True)
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+    sample = tokenizer(["warm up", "longer sample sentence"], padding=True, return_tensors="pt")
+    # ONNX graph inputs follow the forward() signature, not the tokenizer's key order
+    parameters = inspect.signature(transformer.forward).parameters
+    input_names = [name for name in parameters if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    fp32_path = os.path.join(out_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            args=(),
+            kwargs={name: sample[name] for name in input_names},
+            f=fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=17,
+            dynamo=False,
+        )
+    print(f"✓ Exported {fp32_path}")
+
+    int8_path = os.path.join(out_dir, "model_int8.onnx")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    print(f"✓ Quantised {int8_path}")
+
+    tokenizer.save_pretrained(out_dir)
+    with open(os.path.join(out_dir, "embedding_config.json"), "w", encoding="utf-8") as config_file:
+        json.dump({
+            "source_model": chatbot_ai.DEFAULT_EMBEDDING_MODEL,
+            "max_seq_length": model.max_seq_length,
+            "pad_token": tokenizer.pad_token,
+            "pad_token_id": tokenizer.pad_token_id,
+            "dimension": model.get_sentence_embedding_dimension(),
+            "pooling": "mean",
+        }, config_file, indent=2)
+    print(f"✓ Tokenizer and embedding_config.json saved to {out_dir}")
+
+
+def knowledge_texts():
+    from database import SessionLocal
+    import models
+
+    db = SessionLocal()
+    try:
+        texts = []
+        for kb in db.query(models.ChatbotKnowledge).filter(models.ChatbotKnowledge.is_active == True).all():
+            texts.extend(text for _, text, _ in chatbot_ai.FAISSVectorStore._texts(kb))
+        return texts
+    finally:
+        db.close()
+
+
+def cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.clip(np.linalg.norm(a, axis=1, keepdims=True), 1e-12, None)
+    b = b / np.clip(np.linalg.norm(b, axis=1, keepdims=True), 1e-12, None)
+    return (a * b).sum(axis=1)
+
+
+def check_equivalence(model, out_dir: str, texts) -> bool:
+    """Compare each ONNX export with the PyTorch embeddings of the same texts"""
+    reference = model.encode(texts, batch_size=32, convert_to_numpy=True)
+    passed = True
+    print(f"\n{'model':<18} {'texts':>6} {'min cos':>9} {'mean cos':>9} {'threshold':>10}")
+    for file_name, threshold in THRESHOLDS.items():
+        onnx_model = chatbot_ai.OnnxEmbeddingModel(out_dir, file_name)
+        similarity = cosine(reference, onnx_model.encode(texts, batch_size=32))
+        ok = similarity.min() >= threshold
+        passed = passed and ok
+        print(f"{file_name:<18} {len(texts):>6} {similarity.min():>9.5f} {similarity.mean():>9.5f} "
+              f"{threshold:>10} {'✅' if ok else '❌'}")
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--out", default=chatbot_ai.ONNX_MODEL_DIR)
+    parser.add_argument("--check-only", action="store_true", help="skip the export, only compare embeddings")
+    parser.add_argument("--kb", action="store_true", help="also compare the active chatbot_knowledge texts")
+    args = parser.parse_args()
+
+    model = chatbot_ai._import_sentence_transformer()(chatbot_ai.DEFAULT_EMBEDDING_MODEL, device="cpu")
+    if not args.check_only:
+        export(model, args.out)
+
+    texts = SAMPLE_TEXTS + (knowledge_texts() if args.kb else [])
+    if not check_equivalence(model, args.out, texts):
+        print("\n❌ ONNX embeddings differ from PyTorch beyond the threshold")
+        sys.exit(1)
+    print("\n✅ ONNX embeddings match PyTorch")
+
+
+if __name__ == "__main__":
+    main()